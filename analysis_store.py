@@ -0,0 +1,188 @@
+"""
+Persistent store of search results, shared by all games, jobs and processes using the same file.
+
+Unlike the :py:data:`engine.transposition_table`, which starts empty in every process, the store keeps results in
+an SQLite database on disk. Results are keyed by the Zobrist hash of the position (including the color to move),
+the search depth and everything else which changes the result (see :py:func:`settings_of`). Only results of
+at least :py:data:`MIN_DEPTH` plies are stored, the shallow ones are cheaper to search again than to look up.
+
+The number of entries is capped. When the cap is exceeded, the least recently used entries are removed. The cap
+is checked after every :py:data:`EVICT_INTERVAL` stores of a process, so in between it may be exceeded. SQLite
+takes care of concurrent access: every process opens its own connection, the database runs in WAL mode so readers
+do not block the writer, and writers wait for each other.
+
+Usage::
+
+    engine.analysis_store = AnalysisStore("analysis.sqlite")
+    move = engine.suggest_move(board, MinMaxArg(depth=5))    # a lookup, if searched before
+
+    python analyze.py positions.fen --store analysis.sqlite
+"""
+import os
+import sqlite3
+import time
+
+# Maximum number of stored results
+MAX_ENTRIES = 100000
+
+# Results of a smaller search depth are not stored
+MIN_DEPTH = 3
+
+# The cap is checked after every this many stores, and the store is then cut down to this share of the cap
+EVICT_INTERVAL = 64
+EVICT_TO = 0.9
+
+# Seconds a process waits for the lock of another writing process
+TIMEOUT = 30.0
+
+# Part of every key. Increase it whenever a change of the evaluation or the search changes the results,
+# so results of the old version are no longer found (and eventually evicted)
+EVAL_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    key INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    settings TEXT NOT NULL,
+    score REAL NOT NULL,
+    move INTEGER,
+    used REAL NOT NULL,
+    PRIMARY KEY (key, depth, settings)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS analysis_used ON analysis (used);
+"""
+
+
+def settings_of(search, board):
+    """
+    Returns everything which changes the results of a :py:class:`engine.Search` on the board, as short string:
+    the :py:data:`EVAL_VERSION`, the evaluation of the board, the search options and the quiescence limits
+    """
+    # Imported here, as the engine itself uses the store
+    import engine
+
+    return (f"v{EVAL_VERSION} rich{int(board.rich_evaluation)} ab{int(search.alphaBeta)} beam{search.beamWidth or 0}"
+            f" lmr{int(search.lateMoveReductions)} null{int(search.nullMovePruning)} q{int(search.quiescence)}"
+            f" qn{engine.QUIESCENCE_NODES} delta{engine.DELTA_MARGIN}")
+
+
+class AnalysisStore:
+    """
+    Persistent mapping of (position hash, depth, settings) to the score and best move of a search
+    """
+    def __init__(self, fname, maxEntries=MAX_ENTRIES, minDepth=MIN_DEPTH):
+        """
+        Opens the store, creating the file if it does not exist
+
+        :param fname: The SQLite database file
+        :param maxEntries: Maximum number of stored results, the least recently used ones are removed first
+        :param minDepth: Results of a smaller search depth are neither stored nor looked up
+        """
+        self.fname = fname
+        self.maxEntries = maxEntries
+        self.minDepth = minDepth
+        self._connection = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+        with self.connection() as connection:
+            connection.executescript(_SCHEMA)
+
+    def connection(self):
+        """
+        Returns the connection of this process. A process created by fork must not use the connection of its parent,
+        so a new one is opened whenever the process changes.
+        """
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.fname, timeout=TIMEOUT)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def lookup(self, key, depth, settings):
+        """
+        Looks up a search result and marks it as used
+
+        :param key: Zobrist key of the position (see :py:meth:`board.BoardBase.hash`)
+        :return: A tuple (score, (from_square, to_square) or None), or None if the result is not stored
+        """
+        if depth < self.minDepth:
+            return None
+
+        connection = self.connection()
+        row = connection.execute("SELECT score, move FROM analysis WHERE key = ? AND depth = ? AND settings = ?",
+                                 (_signed(key), depth, settings)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        with connection:
+            connection.execute("UPDATE analysis SET used = ? WHERE key = ? AND depth = ? AND settings = ?",
+                               (time.time(), _signed(key), depth, settings))
+
+        score, move = row
+        return score, None if move is None else (move >> 6, move & 63)
+
+    def store(self, key, depth, settings, score, move=None):
+        """
+        Stores a search result, unless its depth is below the minimum depth
+
+        :param score: The score, always from WHITEs perspective
+        :param move: Best move as (from_square, to_square) tuple or None
+        """
+        if depth < self.minDepth:
+            return
+
+        connection = self.connection()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO analysis VALUES (?, ?, ?, ?, ?, ?)",
+                               (_signed(key), depth, settings, score,
+                                None if move is None else (move[0] << 6) | move[1], time.time()))
+
+        self.stores += 1
+        if self.stores % EVICT_INTERVAL == 0:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used results if there are more than allowed
+        """
+        connection = self.connection()
+        with connection:
+            count = connection.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+            if count > self.maxEntries:
+                connection.execute(
+                    "DELETE FROM analysis WHERE (key, depth, settings) IN "
+                    "(SELECT key, depth, settings FROM analysis ORDER BY used LIMIT ?)",
+                    (count - int(self.maxEntries * EVICT_TO),))
+
+    def __len__(self):
+        return self.connection().execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+
+    def clear(self):
+        """
+        Removes all stored results
+        """
+        with self.connection() as connection:
+            connection.execute("DELETE FROM analysis")
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def __getstate__(self):
+        # Only the settings go to another process, it opens its own connection
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        return state
+
+
+def _signed(key):
+    # SQLite stores signed 64 bit integers
+    return key - (1 << 64) if key >= 1 << 63 else key
@@ -0,0 +1,215 @@
+"""
+Batch analysis of many positions over a pool of worker processes.
+
+Positions are read from ``.board`` files (as written by :py:meth:`save_to_disk <board.BoardBase.save_to_disk>`),
+directories of them, corpus files (see :py:mod:`corpus`), or text files with one position per line in the notation of
+:py:meth:`to_fen <board.BoardBase.to_fen>`, like "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b". Empty lines
+and lines starting with "#" are skipped. Invalid lines and ``.board`` files are reported and skipped. The positions are handed to the
+workers packed (see :py:meth:`to_packed <board.BoardBase.to_packed>`).
+
+Each position is searched with :py:func:`engine.suggest_move` and one JSON record per position is written as soon
+as it is available, in the order of the input. Only a bounded number of positions is in flight at any time, so the
+memory stays the same for any input size. With ``--resume`` the records already in the output file are skipped,
+so an interrupted run continues after the last completely written record. With ``--store`` the workers share a
+persistent :py:class:`analysis_store.AnalysisStore`, so positions analyzed by an earlier run are only looked up.
+
+Usage::
+
+    python analyze.py positions.fen --depth 4 --output results.jsonl
+    python analyze.py dumps/ more.board --workers 8 --output results.jsonl --resume
+    python analyze.py positions.corpus --store analysis.sqlite
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+import engine
+import uci
+from analysis_store import AnalysisStore
+from board import Board
+from corpus import Corpus
+from engine import MinMaxArg
+from transposition import TranspositionTable
+
+DEPTH = 3
+
+# Memory budget of the transposition table of each worker process
+WORKER_TRANSPOSITION_TABLE_MB = 4
+
+# Positions in flight per worker, enough to keep every worker busy while the oldest one is written
+QUEUED_PER_WORKER = 4
+
+
+def read_positions(paths):
+    """
+    Reads the positions of all given files and directories lazily, one at a time.
+
+    :return: A generator of (name, packed position) tuples. The name is the file name,
+             plus ":<line number>" for files with one position per line.
+    """
+    board = Board()
+    for path in paths:
+        if os.path.isdir(path):
+            yield from read_positions(sorted(glob.glob(os.path.join(path, "*.board"))))
+        elif path.endswith(".board"):
+            try:
+                board.load_from_disk(path)
+            except (OSError, ValueError) as error:
+                print(f"{path}: {error}, skipped", file=sys.stderr)
+                continue
+            yield path, board.to_packed(True)
+        elif path.endswith(".corpus"):
+            with Corpus(path) as corpus:
+                yield from corpus
+        else:
+            with open(path, "rt") as f:
+                for number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    try:
+                        white = board.load_fen(line)
+                    except ValueError as error:
+                        print(f"{path}:{number}: {error}, skipped", file=sys.stderr)
+                        continue
+                    yield f"{path}:{number}", board.to_packed(white)
+
+
+def _init_worker(megabytes, store):
+    engine.transposition_table = TranspositionTable(megabytes)
+    engine.analysis_store = store
+
+
+def analyze_position(task):
+    """
+    Runs in a worker: searches one position with an empty transposition table.
+
+    :param task: A tuple (name, packed position, depth)
+    :return: The record of the position as dictionary, with an "error" instead of the move if the search failed
+    """
+    name, packed, depth = task
+    engine.transposition_table.clear()
+
+    start = time.perf_counter()
+    white = bool(packed[-1])
+    try:
+        board = Board()
+        board.load_packed(packed)
+        minMaxArg = MinMaxArg(depth, white)
+        move = engine.suggest_move(board, minMaxArg)
+    except Exception as error:
+        return {"name": name, "white": white, "depth": depth, "error": repr(error)}
+
+    return {
+        "name": name,
+        "white": white,
+        "depth": depth,
+        "move": uci.move_to_string(move) if move.piece is not None else None,
+        "score": move.score,
+        "nodes": minMaxArg.search.nodes,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def analyze(positions, out, depth=DEPTH, workers=multiprocessing.cpu_count(), store=None):
+    """
+    Analyzes the positions over a pool of worker processes and writes one JSON line per position to out,
+    in the order of the positions.
+
+    :param positions: An iterable of (name, packed position) tuples, read lazily
+    :param out: A text stream, flushed after every record
+    :param store: An :py:class:`analysis_store.AnalysisStore` shared by all workers, or None
+    :return: Number of records written
+    """
+    written = 0
+    pending = deque()
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(WORKER_TRANSPOSITION_TABLE_MB, store)) as pool:
+        for name, packed in positions:
+            pending.append(pool.apply_async(analyze_position, ((name, packed, depth),)))
+            if len(pending) >= workers * QUEUED_PER_WORKER:
+                write_record(out, pending.popleft().get())
+                written += 1
+
+        while pending:
+            write_record(out, pending.popleft().get())
+            written += 1
+
+    return written
+
+
+def write_record(out, record):
+    out.write(json.dumps(record) + "\n")
+    out.flush()
+
+
+def resume(fname):
+    """
+    Prepares an output file for resuming: a last record which was only partly written is cut off.
+
+    :return: A tuple (number of complete records, name of the last one or None)
+    """
+    if not os.path.exists(fname):
+        return 0, None
+
+    records = 0
+    last = None
+    end = 0
+    with open(fname, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                last = json.loads(line)["name"]
+            except (ValueError, KeyError):
+                break
+            records += 1
+            end += len(line)
+
+    with open(fname, "r+b") as f:
+        f.truncate(end)
+
+    return records, last
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyzes many positions and writes the results as JSON lines")
+    parser.add_argument("paths", nargs="+", help=".board files, directories of them, corpus files or files with one position per line")
+    parser.add_argument("--depth", type=int, default=DEPTH, help="search depth")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="number of worker processes")
+    parser.add_argument("--output", help="JSON lines file to write, standard output if not given")
+    parser.add_argument("--resume", action="store_true", help="skip the positions already in the output file")
+    parser.add_argument("--store", help="SQLite file of earlier results to reuse and extend, see analysis_store.py")
+    args = parser.parse_args(argv)
+
+    if args.resume and args.output is None:
+        parser.error("--resume needs --output")
+
+    positions = read_positions(args.paths)
+    skip, last = resume(args.output) if args.resume else (0, None)
+    if skip:
+        # The input must be the same as in the interrupted run, up to the last record written
+        name = None
+        for _ in range(skip):
+            name, _ = next(positions, (None, None))
+        if name != last:
+            print(f"The output file does not belong to this input, its last record is {last}", file=sys.stderr)
+            return 1
+        print(f"Resuming after {skip} positions ({last})", file=sys.stderr)
+
+    store = AnalysisStore(args.store) if args.store else None
+    if args.output is None:
+        written = analyze(positions, sys.stdout, args.depth, args.workers, store)
+    else:
+        with open(args.output, "at" if args.resume else "wt") as out:
+            written = analyze(positions, out, args.depth, args.workers, store)
+
+    print(f"Analyzed {written} positions", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
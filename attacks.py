@@ -0,0 +1,114 @@
+"""
+Precomputed attack tables, built once at import.
+
+For every square the tables hold the cells a knight, king or pawn placed there attacks, and for every
+direction the ray of cells a sliding piece could pass until the edge of the board. Sliding attacks are then
+found with the classical ray approach: take the ray, find the first occupied cell on it (the blocker) and cut
+off everything behind it using the ray of the blocker in the same direction.
+"""
+from bitboard import (
+    PAWN,
+    KNIGHT,
+    BISHOP,
+    ROOK,
+    QUEEN,
+    KNIGHT_DIRECTIONS,
+    KING_DIRECTIONS,
+    step_attacks,
+    pawn_attacks,
+)
+
+# Directions as (delta_row, delta_col). The first four increase the square number, the last four decrease it
+NORTH, EAST, NORTH_EAST, NORTH_WEST, SOUTH, WEST, SOUTH_WEST, SOUTH_EAST = range(8)
+DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (-1, -1), (-1, 1))
+
+ROOK_RAYS = (NORTH, EAST, SOUTH, WEST)
+BISHOP_RAYS = (NORTH_EAST, NORTH_WEST, SOUTH_WEST, SOUTH_EAST)
+
+
+def _ray(square, delta_row, delta_col):
+    row, col = square >> 3, square & 7
+    mask = 0
+    while True:
+        row += delta_row
+        col += delta_col
+        if not (0 <= row < 8 and 0 <= col < 8):
+            return mask
+        mask |= 1 << (row * 8 + col)
+
+
+KNIGHT_ATTACKS = tuple(step_attacks(1 << square, KNIGHT_DIRECTIONS) for square in range(64))
+KING_ATTACKS = tuple(step_attacks(1 << square, KING_DIRECTIONS) for square in range(64))
+
+# PAWN_ATTACKS[white][square]
+PAWN_ATTACKS = (
+    tuple(pawn_attacks(1 << square, False) for square in range(64)),
+    tuple(pawn_attacks(1 << square, True) for square in range(64)),
+)
+
+# RAYS[direction][square]
+RAYS = tuple(
+    tuple(_ray(square, delta_row, delta_col) for square in range(64))
+    for delta_row, delta_col in DIRECTIONS
+)
+
+
+def ray_attacks(square, occupied, direction):
+    """
+    Cells attacked along one direction from the given square, up to and including the first occupied cell
+    """
+    rays = RAYS[direction]
+    attacks = rays[square]
+    blockers = attacks & occupied
+    if blockers:
+        if direction < SOUTH:
+            # Rays with increasing square numbers are blocked by the lowest occupied square
+            blocker = (blockers & -blockers).bit_length() - 1
+        else:
+            blocker = blockers.bit_length() - 1
+        attacks ^= rays[blocker]
+    return attacks
+
+
+def rook_attacks(square, occupied):
+    """
+    Cells attacked by a rook on the given square
+    """
+    return (ray_attacks(square, occupied, NORTH) | ray_attacks(square, occupied, EAST)
+            | ray_attacks(square, occupied, SOUTH) | ray_attacks(square, occupied, WEST))
+
+
+def bishop_attacks(square, occupied):
+    """
+    Cells attacked by a bishop on the given square
+    """
+    return (ray_attacks(square, occupied, NORTH_EAST) | ray_attacks(square, occupied, NORTH_WEST)
+            | ray_attacks(square, occupied, SOUTH_WEST) | ray_attacks(square, occupied, SOUTH_EAST))
+
+
+def attacks_from(kind, square, white, occupied):
+    """
+    Cells attacked by a single piece of given kind and color placed on the given square
+    """
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    if kind == PAWN:
+        return PAWN_ATTACKS[white][square]
+    if kind == ROOK:
+        return rook_attacks(square, occupied)
+    if kind == BISHOP:
+        return bishop_attacks(square, occupied)
+    if kind == QUEEN:
+        return rook_attacks(square, occupied) | bishop_attacks(square, occupied)
+    return KING_ATTACKS[square]
+
+
+def _between(square, other):
+    for rays in RAYS:
+        if rays[square] >> other & 1:
+            return rays[square] & ~rays[other] & ~(1 << other)
+    return 0
+
+
+# BETWEEN[square][other]: cells strictly between two squares on a common line, 0 if they share none
+BETWEEN = tuple(tuple(_between(square, other) for other in range(64)) for square in range(64))
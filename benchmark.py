@@ -0,0 +1,409 @@
+"""
+Search benchmark with regression check.
+
+Runs :py:func:`engine.suggest_move` at a fixed depth on a fixed set of positions: the tests/*.board files and a
+corpus of positions generated by playing random (but seeded, so always the same) moves from the start position.
+For every position the nodes searched, nodes per second, the hit rate of the transposition table, the peak memory
+allocated during the search and the chosen move are recorded. The results can be written to a JSON file.
+
+Given a baseline (a JSON file written by an earlier run), the benchmark fails if the total nodes searched grew by
+more than the threshold. Node counts are the same on every machine, so this baseline is part of the repository
+(without any timings). Throughput depends on the machine, so the nodes per second are compared against a second,
+local baseline which is not committed, and the benchmark also fails if they dropped by more than the threshold.
+--update-baseline writes both.
+
+Usage::
+
+    python benchmark.py                                   # depth 5, compare against the stored baseline
+    python benchmark.py --depth 3 --output results.json
+    python benchmark.py --threshold 5 --corpus 50
+    python benchmark.py --update-baseline                 # store the results as new baselines
+    python benchmark.py --instrument --no-memory          # per function counters, see instrumentation.py
+    python benchmark.py --beam 0                          # full width search instead of the best 10 moves
+    python benchmark.py --compare-modes --depth 4         # nodes and move quality of beam vs. full width
+    python benchmark.py --scaling                         # speedup of the parallel search, see parallel.py
+    python benchmark.py --scaling --private-tables        # ... with a transposition table per worker
+"""
+import argparse
+import glob
+import json
+import random
+import sys
+import time
+import tracemalloc
+import engine
+import instrumentation
+import parallel
+from board import Board
+from bitboard import mask_to_cells
+from engine import MinMaxArg, Search
+
+BASELINE = "tests/benchmark_baseline.json"
+
+# Baseline with the timings of this machine, not committed
+LOCAL_BASELINE = "tests/benchmark_local.json"
+
+# Results which depend on the machine, left out of the committed baseline
+TIMINGS = ("seconds", "nps")
+
+DEPTH = 5
+CORPUS_SIZE = 20
+CORPUS_SEED = 1
+
+# Maximum growth of the nodes and maximum drop of the nodes per second against the baselines, in percent
+THRESHOLD = 10.0
+
+# Every search is timed this often, the fastest run counts
+REPEAT = 3
+
+# Numbers of workers measured by the scaling benchmark of the parallel search
+SCALING_WORKERS = (1, 2, 4, 8, 16)
+
+
+def generate_corpus(size=CORPUS_SIZE, seed=CORPUS_SEED, minPlies=6, maxPlies=40):
+    """
+    Generates positions by playing random valid moves from the start position.
+
+    :return: A list of (name, configuration string, white to move) tuples
+    """
+    rng = random.Random(seed)
+    board = Board()
+    positions = []
+
+    while len(positions) < size:
+        board.reset()
+        white = True
+        for _ in range(rng.randint(minPlies, maxPlies)):
+            moves = board.get_valid_moves(white)
+            if not moves:
+                break
+            piece, mask = rng.choice(moves)
+            board.make_move(piece, rng.choice(mask_to_cells(mask)))
+            white = not white
+
+        # Only keep positions where the side to move can still move
+        if board.get_valid_moves(white):
+            positions.append((f"corpus{len(positions) + 1:03d}", str(board), white))
+
+    return positions
+
+
+def collect_positions(corpusSize=CORPUS_SIZE, seed=CORPUS_SEED):
+    """
+    Returns the tests/*.board files (WHITE to move) followed by the generated corpus,
+    as (name, configuration string, white to move) tuples
+    """
+    positions = []
+    for fname in sorted(glob.glob("tests/*.board")):
+        with open(fname, "rt") as f:
+            positions.append((fname, f.read(), True))
+
+    return positions + generate_corpus(corpusSize, seed)
+
+
+def run_position(name, configuration, white, depth=DEPTH, alphaBeta=engine.ALPHA_BETA, memory=True, repeat=REPEAT,
+                 beamWidth=engine.BEAM_WIDTH):
+    """
+    Searches a single position with an empty transposition table.
+
+    The search is repeated and the fastest run is taken, which evens out noise from other processes. It is timed
+    without tracing the memory, as tracemalloc slows it down. If memory is True, the search is repeated once more
+    with tracemalloc to measure the peak memory.
+
+    :return: A dictionary with the measured values
+    """
+    board = Board()
+    board.load_from_memory(configuration)
+
+    seconds = None
+    for _ in range(repeat):
+        engine.transposition_table.clear()
+        search = Search(alphaBeta, beamWidth=beamWidth)
+        start = time.perf_counter()
+        move = engine.suggest_move(board, MinMaxArg(depth, white, search))
+        elapsed = time.perf_counter() - start
+        if seconds is None or elapsed < seconds:
+            seconds = elapsed
+    stats = engine.transposition_table.stats()
+
+    result = {
+        "name": name,
+        "white": white,
+        "depth": depth,
+        "move": str(move) if move.piece is not None else None,
+        "score": move.score,
+        "nodes": search.nodes,
+        "evaluations": search.evaluations,
+        "seconds": seconds,
+        "nps": search.nodes / seconds if seconds > 0 else 0.0,
+        "hit_rate": stats["hit_rate"],
+        "peak_memory": None,
+    }
+
+    if memory:
+        engine.transposition_table.clear()
+        tracemalloc.start()
+        engine.suggest_move(board, MinMaxArg(depth, white, Search(alphaBeta, beamWidth=beamWidth)))
+        result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result
+
+
+def run(positions, depth=DEPTH, alphaBeta=engine.ALPHA_BETA, memory=True, repeat=REPEAT, beamWidth=engine.BEAM_WIDTH,
+        out=sys.stdout):
+    """
+    Runs the benchmark on all positions and prints one line per position
+
+    :return: The results as a dictionary, ready to be written as JSON
+    """
+    results = []
+    for name, configuration, white in positions:
+        result = run_position(name, configuration, white, depth, alphaBeta, memory, repeat, beamWidth)
+        results.append(result)
+        if out is not None:
+            memoryText = "" if result["peak_memory"] is None else f", {result['peak_memory'] / 1024:.0f} KiB"
+            print(f"{name:24} {result['move'] or '-':20} {result['nodes']:8} nodes {result['nps']:10.0f} nodes/s "
+                  f"hits {result['hit_rate']:.1%}{memoryText}", file=out)
+
+    nodes = sum(result["nodes"] for result in results)
+    seconds = sum(result["seconds"] for result in results)
+    total = {
+        "nodes": nodes,
+        "evaluations": sum(result["evaluations"] for result in results),
+        "seconds": seconds,
+        "nps": nodes / seconds if seconds > 0 else 0.0,
+    }
+    if out is not None:
+        print(f"{'total':24} {'':20} {nodes:8} nodes {total['nps']:10.0f} nodes/s in {seconds:.2f}s", file=out)
+
+    return {"depth": depth, "alphaBeta": alphaBeta, "beamWidth": beamWidth, "positions": results, "total": total}
+
+
+def compare(results, baseline, threshold=THRESHOLD, out=sys.stdout):
+    """
+    Compares the results against a baseline. Changed moves and node counts are reported,
+    but only a growth of the total nodes by more than threshold percent is a regression.
+
+    :return: True if there is no regression
+    """
+    previous = {(result["name"], result["white"]): result for result in baseline["positions"]}
+    for result in results["positions"]:
+        before = previous.get((result["name"], result["white"]))
+        if before is None:
+            continue
+        if before["move"] != result["move"]:
+            print(f"{result['name']}: move changed from {before['move']} to {result['move']}", file=out)
+        if before["nodes"] != result["nodes"]:
+            print(f"{result['name']}: nodes changed from {before['nodes']} to {result['nodes']}", file=out)
+
+    nodes, baseNodes = results["total"]["nodes"], baseline["total"]["nodes"]
+    change = (nodes - baseNodes) / baseNodes * 100 if baseNodes else 0.0
+    print(f"nodes: {nodes} (baseline {baseNodes}, {change:+.1f}%)", file=out)
+
+    if change > threshold:
+        print(f"REGRESSION: nodes grew by more than {threshold}%", file=out)
+        return False
+
+    return True
+
+
+def compare_throughput(results, baseline, threshold=THRESHOLD, out=sys.stdout):
+    """
+    Compares the total nodes per second against a baseline of the same machine.
+    A drop by more than threshold percent is a regression.
+
+    :return: True if there is no regression
+    """
+    nps, baseNps = results["total"]["nps"], baseline["total"]["nps"]
+    change = (nps - baseNps) / baseNps * 100 if baseNps else 0.0
+    print(f"nodes/s: {nps:.0f} (local baseline {baseNps:.0f}, {change:+.1f}%)", file=out)
+
+    if change < -threshold:
+        print(f"REGRESSION: nodes/s dropped by more than {threshold}%", file=out)
+        return False
+
+    return True
+
+
+def without_timings(results):
+    """
+    Returns a copy of the results without the values which depend on the machine
+    """
+    copy = dict(results)
+    copy["positions"] = [{key: value for key, value in result.items() if key not in TIMINGS} for result in results["positions"]]
+    copy["total"] = {key: value for key, value in results["total"].items() if key not in TIMINGS}
+    return copy
+
+
+def exact_score(board, white, depth):
+    """
+    Score of the position found by a full width alpha-beta search without any reductions and without the
+    (pruned and budgeted) quiescence search, which is the exact mini-max score of the given depth
+    """
+    engine.transposition_table.clear()
+    search = Search(True, beamWidth=None, lateMoveReductions=False, nullMovePruning=False, quiescence=False)
+    return engine.suggest_move(board, MinMaxArg(depth, white, search)).score
+
+
+def compare_modes(positions, depth=DEPTH, beamWidth=engine.BEAM_WIDTH, out=sys.stdout):
+    """
+    Compares the beam search (the best beamWidth moves per position) with the full width search
+    (with late move reductions and null move pruning) by their nodes and the quality of the chosen moves.
+
+    The quality is measured against the exact mini-max score of the given depth: the loss of a move is how much
+    worse its exact score is than the one of the best move, in pawns and capped at 10 pawns so a single
+    missed mate does not dominate the average.
+
+    :return: A dictionary mapping the name of each mode to its totals
+    """
+    modes = {"beam": beamWidth, "full": None}
+    totals = {name: {"nodes": 0, "seconds": 0.0, "best": 0, "loss": 0.0} for name in modes}
+
+    for name, configuration, white in positions:
+        board = Board()
+        board.load_from_memory(configuration)
+        best = exact_score(board, white, depth)
+
+        line = f"{name:24}"
+        for mode, width in modes.items():
+            engine.transposition_table.clear()
+            search = Search(True, beamWidth=width)
+            start = time.perf_counter()
+            move = engine.suggest_move(board, MinMaxArg(depth, white, search))
+            seconds = time.perf_counter() - start
+
+            loss = 0.0
+            if move.piece is not None:
+                board.make_move(move.piece, move.cell)
+                score = exact_score(board, not white, depth - 1) if depth > 1 else board.evaluate()
+                board.unmake_move()
+                loss = min(max((best - score) if white else (score - best), 0.0), 10.0)
+
+            total = totals[mode]
+            total["nodes"] += search.nodes
+            total["seconds"] += seconds
+            total["best"] += loss == 0
+            total["loss"] += loss
+            line += f" {mode} {str(move):22} {search.nodes:7} nodes loss {loss:5.2f}"
+
+        print(line, file=out)
+
+    for mode, total in totals.items():
+        total["loss"] /= max(len(positions), 1)
+        print(f"{mode:5} {total['nodes']:8} nodes in {total['seconds']:.2f}s, best move in {total['best']} of "
+              f"{len(positions)} positions, average loss {total['loss']:.2f} pawns", file=out)
+
+    return totals
+
+
+def scaling(positions, depth=DEPTH, workerCounts=SCALING_WORKERS, shared=True, out=sys.stdout):
+    """
+    Runs the parallel root search (see :py:mod:`parallel`) on all positions with each number of workers and reports
+    the speedup against one worker. Creating the pools is not timed. Any difference in the chosen moves is reported,
+    with private tables (shared=False) there must be none.
+
+    :return: A dictionary mapping the number of workers to the measured seconds and speedup
+    """
+    results = {}
+    reference = None
+    for workers in workerCounts:
+        moves = []
+        nodes = 0
+        with parallel.create_pool(workers, shared=shared) as pool:
+            start = time.perf_counter()
+            for name, configuration, white in positions:
+                board = Board()
+                board.load_from_memory(configuration)
+                minMaxArg = MinMaxArg(depth, white)
+                moves.append(str(parallel.suggest_move_parallel(board, minMaxArg, pool=pool)))
+                nodes += minMaxArg.search.nodes
+            seconds = time.perf_counter() - start
+
+        if reference is None:
+            reference = (seconds, moves)
+        elif moves != reference[1]:
+            print(f"{workers} workers chose different moves than {workerCounts[0]}", file=out)
+
+        speedup = reference[0] / seconds if seconds > 0 else 0.0
+        results[workers] = {"seconds": seconds, "nodes": nodes, "speedup": speedup}
+        print(f"{workers:3} workers: {nodes:8} nodes in {seconds:7.2f}s, speedup {speedup:5.2f}", file=out)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the search on a fixed set of positions")
+    parser.add_argument("--depth", type=int, default=DEPTH, help="search depth")
+    parser.add_argument("--corpus", type=int, default=CORPUS_SIZE, help="number of generated positions")
+    parser.add_argument("--seed", type=int, default=CORPUS_SEED, help="seed of the generated positions")
+    parser.add_argument("--minmax", action="store_true", help="plain mini-max instead of alpha-beta")
+    parser.add_argument("--beam", type=int, default=engine.BEAM_WIDTH, help="moves searched per position, 0 for all")
+    parser.add_argument("--compare-modes", action="store_true", help="compare beam and full width search")
+    parser.add_argument("--scaling", action="store_true", help="speedup of the parallel search with 1 to 16 workers")
+    parser.add_argument("--private-tables", action="store_true", help="a transposition table per worker (--scaling)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="time every search this often, take the fastest")
+    parser.add_argument("--no-memory", action="store_true", help="skip measuring the peak memory")
+    parser.add_argument("--instrument", action="store_true", help="print call counts and times of the hot paths")
+    parser.add_argument("--profile", action="store_true", help="run under cProfile and print the top functions")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE, help="JSON file of an earlier run to compare the nodes against")
+    parser.add_argument("--local-baseline", default=LOCAL_BASELINE, help="JSON file of an earlier run on this machine to compare the nodes/s against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed growth of nodes and drop of nodes/s in percent")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baselines")
+    args = parser.parse_args(argv)
+
+    positions = collect_positions(args.corpus, args.seed)
+    beamWidth = args.beam or None
+
+    if args.compare_modes:
+        compare_modes(positions, args.depth, args.beam or engine.BEAM_WIDTH)
+        return 0
+
+    if args.scaling:
+        scaling(positions, args.depth, shared=not args.private_tables)
+        return 0
+
+    options = (args.depth, not args.minmax, not args.no_memory, args.repeat, beamWidth)
+    if args.instrument:
+        with instrumentation.instrumented() as report:
+            results = run(positions, *options)
+        print(report)
+    elif args.profile:
+        with instrumentation.profiling():
+            results = run(positions, *options)
+    else:
+        results = run(positions, *options)
+
+    if args.output:
+        with open(args.output, "wt") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "wt") as f:
+            json.dump(without_timings(results), f, indent=2)
+        with open(args.local_baseline, "wt") as f:
+            json.dump(results, f, indent=2)
+        return 0
+
+    passed = True
+    for fname, check in [(args.baseline, compare), (args.local_baseline, compare_throughput)]:
+        try:
+            with open(fname, "rt") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f"No baseline {fname}, nothing to compare against (create it with --update-baseline)")
+            continue
+
+        settings = ("depth", "alphaBeta", "beamWidth")
+        if any(baseline.get(setting) != results[setting] for setting in settings):
+            print(f"Baseline {fname} was created with different settings, nothing to compare against")
+            continue
+
+        passed = check(results, baseline, args.threshold) and passed
+
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
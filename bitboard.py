@@ -0,0 +1,159 @@
+"""
+Bitboard primitives for the chess board.
+
+A bitboard is a plain python integer with one bit per cell. Cells are numbered row by row,
+starting with a1 (row 0, col 0) as square 0 and ending with h8 (row 7, col 7) as square 63.
+So the square of a cell is simply ``row * 8 + col``.
+
+All functions in this module work set-wise, meaning they accept a bitboard with any number of
+bits set and return the combined result for all of them.
+"""
+
+# Piece kinds, used as index into the bitboards of each color
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+FULL = (1 << 64) - 1
+
+FILE_A = 0x0101010101010101
+FILE_B = FILE_A << 1
+FILE_G = FILE_A << 6
+FILE_H = FILE_A << 7
+
+RANK_3 = 0xFF << 16
+RANK_6 = 0xFF << 40
+
+# Before shifting sideways, the columns that would wrap around to the next row must be cleared
+_COLUMN_GUARDS = {
+    -2: FULL ^ (FILE_A | FILE_B),
+    -1: FULL ^ FILE_A,
+    0: FULL,
+    1: FULL ^ FILE_H,
+    2: FULL ^ (FILE_G | FILE_H),
+}
+
+KNIGHT_DIRECTIONS = ((2, 1), (2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2), (-2, 1), (-2, -1))
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((-1, 1), (-1, -1), (1, 1), (1, -1))
+QUEEN_DIRECTIONS = BISHOP_DIRECTIONS + ROOK_DIRECTIONS
+KING_DIRECTIONS = QUEEN_DIRECTIONS
+
+
+def cell_to_square(cell):
+    """
+    Turns a (row, col) cell into its square number
+    """
+    row, col = cell
+    return int(row) * 8 + int(col)
+
+
+def square_to_cell(square):
+    """
+    Turns a square number back into a (row, col) cell
+    """
+    return (square >> 3, square & 7)
+
+
+def iterate_squares(mask):
+    """
+    Yields the square number of every bit set in the mask, lowest square first
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def lowest_square(mask):
+    """
+    Returns the lowest square set in the mask or -1 if the mask is empty
+    """
+    return (mask & -mask).bit_length() - 1
+
+
+def mask_to_cells(mask):
+    """
+    Turns a bitboard into a list of (row, col) cells, lowest square first
+    """
+    return [(square >> 3, square & 7) for square in iterate_squares(mask)]
+
+
+def cells_to_mask(cells):
+    """
+    Turns an iterable of (row, col) cells into a bitboard
+    """
+    mask = 0
+    for row, col in cells:
+        mask |= 1 << (int(row) * 8 + int(col))
+    return mask
+
+
+def shift(mask, delta_row, delta_col):
+    """
+    Moves all bits of the mask by the given amount of rows and columns.
+    Bits leaving the board are dropped.
+    """
+    mask &= _COLUMN_GUARDS[delta_col]
+    offset = delta_row * 8 + delta_col
+    if offset >= 0:
+        return (mask << offset) & FULL
+    return mask >> -offset
+
+
+def step_attacks(mask, directions):
+    """
+    Cells attacked by non-sliding pieces (knights, kings) placed on the mask
+    """
+    attacks = 0
+    for delta_row, delta_col in directions:
+        attacks |= shift(mask, delta_row, delta_col)
+    return attacks
+
+
+def sliding_attacks(mask, occupied, directions):
+    """
+    Cells attacked by sliding pieces (rooks, bishops, queens) placed on the mask.
+    A ray stops at the first occupied cell, which is included in the attacks.
+    """
+    attacks = 0
+    for delta_row, delta_col in directions:
+        ray = shift(mask, delta_row, delta_col)
+        while ray:
+            attacks |= ray
+            ray = shift(ray & ~occupied, delta_row, delta_col)
+    return attacks
+
+
+def pawn_attacks(mask, white):
+    """
+    Cells attacked (diagonally forward) by pawns of the given color placed on the mask
+    """
+    forward = 1 if white else -1
+    return shift(mask, forward, -1) | shift(mask, forward, 1)
+
+
+def pawn_pushes(mask, white, empty):
+    """
+    Cells pawns of the given color placed on the mask can move into without hitting.
+    Pawns on their starting row may dash forward two cells if the path is not blocked.
+    """
+    forward = 1 if white else -1
+    single = shift(mask, forward, 0) & empty
+    double = shift(single & (RANK_3 if white else RANK_6), forward, 0) & empty
+    return single | double
+
+
+def piece_attacks(kind, mask, white, occupied):
+    """
+    Cells attacked by pieces of the given kind and color placed on the mask
+    """
+    if kind == PAWN:
+        return pawn_attacks(mask, white)
+    if kind == KNIGHT:
+        return step_attacks(mask, KNIGHT_DIRECTIONS)
+    if kind == BISHOP:
+        return sliding_attacks(mask, occupied, BISHOP_DIRECTIONS)
+    if kind == ROOK:
+        return sliding_attacks(mask, occupied, ROOK_DIRECTIONS)
+    if kind == QUEEN:
+        return sliding_attacks(mask, occupied, QUEEN_DIRECTIONS)
+    return step_attacks(mask, KING_DIRECTIONS)
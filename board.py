@@ -1,14 +1,47 @@
-from operator import is_
-import os
-import numpy as np
 from uuid import uuid4
 from pieces import Pawn, Rook, Bishop, Queen, King, Knight
+from bitboard import (
+    PAWN,
+    KNIGHT,
+    BISHOP,
+    ROOK,
+    QUEEN,
+    KING,
+    cell_to_square,
+    lowest_square,
+    iterate_squares,
+    mask_to_cells,
+)
+from attacks import (
+    BETWEEN,
+    KNIGHT_ATTACKS,
+    KING_ATTACKS,
+    PAWN_ATTACKS,
+    attacks_from,
+    bishop_attacks,
+    rook_attacks,
+)
+from zobrist import PIECE_KEYS, WHITE_TO_MOVE_KEY
+from evaluation import PIECE_CLASSES, PIECE_SQUARE_SCORES
 from util import (
+    cell_to_string,
     map_piece_to_character,
     InvalidColumnException,
     InvalidRowException,
+    MoveGenerationException,
 )
 
+# Characters of the piece codes of a snapshot (see BoardBase.to_snapshot): kind + 1, plus 8 for WHITE pieces
+PIECE_CHARACTERS = {kind + 1 + 8 * white: character.upper() if white else character
+                    for white in (False, True) for kind, character in enumerate("pnbrqk")}
+PIECE_CODES = {character: code for code, character in PIECE_CHARACTERS.items()}
+
+# Bytes of a position packed by BoardBase.to_packed: two cells per byte plus the color to move
+PACKED_SIZE = 33
+
+# The two snapshot codes of every packed byte
+_UNPACKED = tuple(bytes((byte & 15, byte >> 4)) for byte in range(256))
+
 
 class BoardBase:
     """
@@ -21,8 +54,8 @@ class BoardBase:
         """Constructor.
         Start with empty cells
         """
-        self.cells = [[None for _ in range(8)] for _ in range(8)]
         self.check_cache = {}
+        self.clear_board()
 
     def __str__(self):
         """
@@ -36,17 +69,17 @@ class BoardBase:
             ]
         )
 
-    def hash(self):
+    def hash(self, white=None):
         """
-        Returns a unique hash (string) representation for the current board configuration.
-        This is short form, not meant for readability.
+        Returns the 64 bit Zobrist hash (int) for the current board configuration.
+        The hash is maintained incrementally by :py:meth:`set_cell`, so this is a simple look-up.
+
+        :param white: If given, the side to move is mixed into the hash (True if WHITE is to move, False otherwise)
         """
-        return "".join(
-            [
-                "".join([map_piece_to_character(cell) for cell in row])
-                for row in reversed(self.cells)
-            ]
-        )
+        if white:
+            return self.zobrist_key ^ WHITE_TO_MOVE_KEY
+
+        return self.zobrist_key
     
     def save_to_disk(self, fname = None):
         """
@@ -66,45 +99,178 @@ class BoardBase:
     def clear_board(self):
         """
         Clears to board, deleting all pieces currently placed on it
+
+        Next to the cells holding the piece objects, the board keeps one bitboard per piece kind and color
+        (bitboards[white][kind]) and one occupancy mask per color (occupancy[white]), the Zobrist hash and
+        the material and piece-square evaluation in centipawns (see :py:mod:`evaluation`) and the square of
+        each king (king_squares[white], -1 if there is none).
+        All of them are kept in sync with the cells by :py:meth:`set_cell`.
         """
         self.cells = [[None for _ in range(8)] for _ in range(8)]
+        self.bitboards = [[0] * 6, [0] * 6]
+        self.occupancy = [0, 0]
+        self.zobrist_key = 0
+        self.evaluation = 0
+        self.king_squares = [-1, -1]
+        self.undo_stack = []
 
 
     def load_from_memory(self, configString):
         """
-        Read previously stored configuration from a memory string
+        Read previously stored configuration from a memory string. Raises ValueError for unknown
+        piece characters and pieces outside of the 8x8 cells.
 
         :param name: Filename to use. 
         """       
-        self.cells = [[None for _ in range(8)] for _ in range(8)]
+        self.clear_board()
 
         for row, line in enumerate(configString.split("\n")):
               line = line.strip()
               for col, pieceCode in enumerate(line.split(' ')):
-                if pieceCode == '.':
+                if pieceCode == '.' or not pieceCode:
+                    continue
+
+                if pieceCode not in PIECE_CODES:
+                    raise ValueError(f"invalid configuration, unexpected {pieceCode!r} in line {row + 1}")
+                if row > 7 or col > 7:
+                    raise ValueError(f"invalid configuration, piece {pieceCode!r} outside of the board in line {row + 1}")
+
+                code = PIECE_CODES[pieceCode]
+                piece = PIECE_CLASSES[(code & 7) - 1](self, code >= 8)
+
+                self.set_cell((7-row, col), piece)
+
+    def to_snapshot(self):
+        """
+        Returns the board configuration as 64 bytes, one per cell from a1, b1, ... to h8: 0 for an empty cell, otherwise
+        the piece kind + 1, plus 8 for WHITE pieces. Unlike the board with its pieces (which all reference the board),
+        this is small and cheap to pickle, e.g. to send it to another process. See :py:meth:`load_snapshot`.
+        """
+        data = bytearray(64)
+        for white in (False, True):
+            for kind, mask in enumerate(self.bitboards[white]):
+                for square in iterate_squares(mask):
+                    data[square] = kind + 1 + 8 * white
+
+        return bytes(data)
+
+    def load_snapshot(self, data):
+        """
+        Restores a board configuration created by :py:meth:`to_snapshot`. Raises ValueError for invalid data,
+        like a corrupt corpus record.
+        """
+        if len(data) != 64:
+            raise ValueError(f"a snapshot has 64 bytes, not {len(data)}")
+        for square, code in enumerate(data):
+            if code and code not in PIECE_CHARACTERS:
+                raise ValueError(f"invalid snapshot, unexpected code {code} at {cell_to_string((square >> 3, square & 7))}")
+
+        self.clear_board()
+
+        for square, code in enumerate(data):
+            if code:
+                self.set_cell((square >> 3, square & 7), PIECE_CLASSES[(code & 7) - 1](self, code >= 8))
+
+    def to_fen(self, white=True):
+        """
+        Returns the position as a single line in the style of the FEN notation: the rows from 8 to 1 separated
+        by "/", each with the pieces ("PNBRQK" for WHITE, "pnbrqk" for BLACK) and the number of empty cells
+        in between, followed by "w" or "b" for the color to move. As the rules of this project know no castling,
+        no en passant and no move counters, these fields of the FEN notation are left out.
+        For example the start position is "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w".
+
+        :param white: True if WHITE is to move
+        """
+        data = self.to_snapshot()
+        rows = []
+        for start in range(56, -1, -8):
+            row = ""
+            empty = 0
+            for code in data[start:start + 8]:
+                if not code:
+                    empty += 1
                     continue
-                
-                if pieceCode.isupper():
-                    white = True
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += PIECE_CHARACTERS[code]
+            if empty:
+                row += str(empty)
+            rows.append(row)
+
+        return "/".join(rows) + (" w" if white else " b")
+
+    def load_fen(self, text):
+        """
+        Restores a position written by :py:meth:`to_fen`. Full FEN strings are accepted as well (the fields after
+        the color to move are ignored), just like single empty cells written as ".", and a missing color means
+        WHITE is to move. Raises ValueError for an invalid position.
+
+        :return: True if WHITE is to move
+        """
+        fields = text.split()
+        rows = fields[0].split("/") if fields else []
+        if len(rows) != 8:
+            raise ValueError(f"invalid position {text!r}, expected 8 rows")
+
+        data = bytearray(64)
+        for index, row in enumerate(rows):
+            square = (7 - index) * 8
+            end = square + 8
+            for character in row:
+                if character in "12345678":
+                    square += int(character)
+                elif character == ".":
+                    square += 1
+                elif character in PIECE_CODES and square < end:
+                    data[square] = PIECE_CODES[character]
+                    square += 1
                 else:
-                    white = False
+                    raise ValueError(f"invalid position {text!r}, unexpected {character!r} in row {8 - index}")
+            if square != end:
+                raise ValueError(f"invalid position {text!r}, row {8 - index} does not have 8 cells")
+
+        side = fields[1] if len(fields) > 1 else "w"
+        if side not in ("w", "b"):
+            raise ValueError(f"invalid position {text!r}, expected w or b as color to move")
 
-                pieceCode = pieceCode.upper()
+        self.load_snapshot(data)
+        return side == "w"
 
-                if pieceCode == "P":
-                    piece = Pawn(self, white)
-                if pieceCode == "K":
-                    piece = King(self, white)
-                if pieceCode == "Q":
-                    piece = Queen(self, white)
-                if pieceCode == "N":
-                    piece = Knight(self, white)
-                if pieceCode == "B":
-                    piece = Bishop(self, white)
-                if pieceCode == "R":
-                    piece = Rook(self, white)
+    def to_packed(self, white=True):
+        """
+        Returns the position as :py:data:`PACKED_SIZE` bytes for bulk storage: the codes of
+        :py:meth:`to_snapshot` with two cells per byte (the first cell in the lower four bits),
+        followed by one byte for the color to move. See :py:meth:`load_packed`.
 
-                self.set_cell(np.array([7-row, col]), piece)
+        :param white: True if WHITE is to move
+        """
+        data = self.to_snapshot()
+        return bytes([data[square] | (data[square + 1] << 4) for square in range(0, 64, 2)] + [white])
+
+    def load_packed(self, data):
+        """
+        Restores a position created by :py:meth:`to_packed`
+
+        :return: True if WHITE is to move
+        """
+        if len(data) != PACKED_SIZE:
+            raise ValueError(f"a packed position has {PACKED_SIZE} bytes, not {len(data)}")
+        if data[32] > 1:
+            raise ValueError(f"invalid packed position, unexpected color {data[32]}")
+
+        self.load_snapshot(b"".join([_UNPACKED[byte] for byte in data[:32]]))
+        return bool(data[32])
+
+    def load_from_corpus(self, corpus, number):
+        """
+        Loads a position of a :py:class:`corpus.Corpus`, the alternative to :py:meth:`load_from_disk`
+        for many positions stored in one file
+
+        :param number: Number of the position in the corpus
+        :return: True if WHITE is to move
+        """
+        return self.load_packed(corpus[number])
 
     def load_from_disk(self, fname):
         """
@@ -122,7 +288,7 @@ class BoardBase:
         Calls is_king_check for board configurations not yet known. Caches the result for later look-up.
         """
         # Calculate hash and see if current position is in the cache
-        hash = self.hash() + "-w" if white else "-b"
+        hash = self.hash(white)
         if hash in self.check_cache:
             return self.check_cache[hash]
 
@@ -168,48 +334,145 @@ class BoardBase:
                 self.set_cell(piece.cell, None)
 
             # Update the pieces cell
-            piece.cell = np.array([row, col])
+            piece.cell = (int(row), int(col))
+
+        # Remove the piece currently placed on the cell from the bitboards, the hash and the evaluation
+        square = cell_to_square((row, col))
+        mask = 1 << square
+        previous = self.cells[row][col]
+        if previous is not None:
+            self.bitboards[previous.white][previous.kind] ^= mask
+            self.occupancy[previous.white] ^= mask
+            self.zobrist_key ^= PIECE_KEYS[previous.white][previous.kind][square]
+            self.evaluation -= PIECE_SQUARE_SCORES[previous.white][previous.kind][square]
+
+        # Add the new one
+        if piece is not None:
+            self.bitboards[piece.white][piece.kind] |= mask
+            self.occupancy[piece.white] |= mask
+            self.zobrist_key ^= PIECE_KEYS[piece.white][piece.kind][square]
+            self.evaluation += PIECE_SQUARE_SCORES[piece.white][piece.kind][square]
+
+        # Keep track of the kings
+        if previous is not None and previous.kind == KING:
+            self.king_squares[previous.white] = lowest_square(self.bitboards[previous.white][KING])
+        if piece is not None and piece.kind == KING:
+            self.king_squares[piece.white] = lowest_square(self.bitboards[piece.white][KING])
 
         # Update the cell on the board
         self.cells[row][col] = piece
 
+    def make_move(self, piece, cell):
+        """
+        Moves a piece placed on the board to the given cell, hitting any opposing piece placed there.
+        Everything needed to take the move back (including the previous hash and evaluation) is pushed to the undo stack,
+        see :py:meth:`unmake_move`.
+
+        Unlike :py:meth:`set_cell` there is no validation, the cell must be valid and the move must not hit an own piece.
+
+        :return: The hit piece or None
+        """
+        from_row, from_col = piece.cell
+        to_row, to_col = cell
+        from_square = from_row * 8 + from_col
+        to_square = to_row * 8 + to_col
+        to_mask = 1 << to_square
+
+        captured = self.cells[to_row][to_col]
+        self.undo_stack.append((piece, piece.cell, captured, self.zobrist_key, self.evaluation))
+
+        if captured is not None:
+            self.bitboards[captured.white][captured.kind] ^= to_mask
+            self.occupancy[captured.white] ^= to_mask
+            self.zobrist_key ^= PIECE_KEYS[captured.white][captured.kind][to_square]
+            self.evaluation -= PIECE_SQUARE_SCORES[captured.white][captured.kind][to_square]
+
+        move_mask = (1 << from_square) | to_mask
+        keys = PIECE_KEYS[piece.white][piece.kind]
+        scores = PIECE_SQUARE_SCORES[piece.white][piece.kind]
+        self.bitboards[piece.white][piece.kind] ^= move_mask
+        self.occupancy[piece.white] ^= move_mask
+        self.zobrist_key ^= keys[from_square] ^ keys[to_square]
+        self.evaluation += scores[to_square] - scores[from_square]
+
+        self.cells[from_row][from_col] = None
+        self.cells[to_row][to_col] = piece
+        piece.cell = (to_row, to_col)
+
+        if piece.kind == KING:
+            self.king_squares[piece.white] = lowest_square(self.bitboards[piece.white][KING])
+        if captured is not None and captured.kind == KING:
+            self.king_squares[captured.white] = lowest_square(self.bitboards[captured.white][KING])
+
+        return captured
+
+    def unmake_move(self):
+        """
+        Takes back the last move made by :py:meth:`make_move`, restoring the moved and the hit piece,
+        the bitboards, the hash and the evaluation.
+        """
+        piece, origin, captured, zobrist_key, evaluation = self.undo_stack.pop()
+
+        from_row, from_col = origin
+        to_row, to_col = piece.cell
+        to_mask = 1 << (to_row * 8 + to_col)
+
+        move_mask = (1 << (from_row * 8 + from_col)) | to_mask
+        self.bitboards[piece.white][piece.kind] ^= move_mask
+        self.occupancy[piece.white] ^= move_mask
+
+        if captured is not None:
+            self.bitboards[captured.white][captured.kind] ^= to_mask
+            self.occupancy[captured.white] ^= to_mask
+
+        self.cells[to_row][to_col] = captured
+        self.cells[from_row][from_col] = piece
+        piece.cell = origin
+        self.zobrist_key = zobrist_key
+        self.evaluation = evaluation
+
+        if piece.kind == KING:
+            self.king_squares[piece.white] = lowest_square(self.bitboards[piece.white][KING])
+        if captured is not None and captured.kind == KING:
+            self.king_squares[captured.white] = lowest_square(self.bitboards[captured.white][KING])
+
     def reset(self):
         """
         Resets the board to its default (start) configuration
         """
         # Start with all empty cells
-        self.cells = [[None for _ in range(8)] for _ in range(8)]
+        self.clear_board()
 
         # Pawns
         for col in range(8):
-            self.set_cell(np.array([1, col]), Pawn(self, True))
-            self.set_cell(np.array([6, col]), Pawn(self, False))
+            self.set_cell((1, col), Pawn(self, True))
+            self.set_cell((6, col), Pawn(self, False))
 
         # Rooks
-        self.set_cell(np.array([0, 0]), Rook(self, True))
-        self.set_cell(np.array([0, 7]), Rook(self, True))
-        self.set_cell(np.array([7, 0]), Rook(self, False))
-        self.set_cell(np.array([7, 7]), Rook(self, False))
+        self.set_cell((0, 0), Rook(self, True))
+        self.set_cell((0, 7), Rook(self, True))
+        self.set_cell((7, 0), Rook(self, False))
+        self.set_cell((7, 7), Rook(self, False))
 
         # Knights
-        self.set_cell(np.array([0, 1]), Knight(self, True))
-        self.set_cell(np.array([0, 6]), Knight(self, True))
-        self.set_cell(np.array([7, 1]), Knight(self, False))
-        self.set_cell(np.array([7, 6]), Knight(self, False))
+        self.set_cell((0, 1), Knight(self, True))
+        self.set_cell((0, 6), Knight(self, True))
+        self.set_cell((7, 1), Knight(self, False))
+        self.set_cell((7, 6), Knight(self, False))
 
         # Bishops
-        self.set_cell(np.array([0, 2]), Bishop(self, True))
-        self.set_cell(np.array([0, 5]), Bishop(self, True))
-        self.set_cell(np.array([7, 2]), Bishop(self, False))
-        self.set_cell(np.array([7, 5]), Bishop(self, False))
+        self.set_cell((0, 2), Bishop(self, True))
+        self.set_cell((0, 5), Bishop(self, True))
+        self.set_cell((7, 2), Bishop(self, False))
+        self.set_cell((7, 5), Bishop(self, False))
 
         # Queen
-        self.set_cell(np.array([0, 3]), Queen(self, True))
-        self.set_cell(np.array([7, 3]), Queen(self, False))
+        self.set_cell((0, 3), Queen(self, True))
+        self.set_cell((7, 3), Queen(self, False))
 
         # King
-        self.set_cell(np.array([0, 4]), King(self, True))
-        self.set_cell(np.array([7, 4]), King(self, False))
+        self.set_cell((0, 4), King(self, True))
+        self.set_cell((7, 4), King(self, False))
 
         #self.save_to_disk()
 
@@ -221,12 +484,18 @@ class Board(BoardBase):
     **HINT**: Read the documentation carefully. Also look at the parent class (BoardBase) for further reference and example implementations. 
     """
 
-    def __init__(self):
+    def __init__(self, rich_evaluation=False, verify_moves=False):
         """
-        Constructor, currently does nothing but calling the super constructor. 
+        Constructor, calls the super constructor and selects the evaluation.
 
+        :param rich_evaluation: True to use :py:meth:`evaluate_rich` in :py:meth:`evaluate`,
+            False to use the fast incremental material and piece-square evaluation.
+        :param verify_moves: True to double check every result of :py:meth:`get_valid_mask` by trying each move
+            (see :py:meth:`get_valid_mask_by_trial`). Meant for testing only, as it is slow.
         """
         super().__init__()
+        self.rich_evaluation = rich_evaluation
+        self.verify_moves = verify_moves
 
     def iterate_cells_with_pieces(self, white):
         """
@@ -240,13 +509,8 @@ class Board(BoardBase):
         :param white: True if WHITE pieces are to be iterated, False otherwise
         :type white: Boolean
         """
-        for row in range(8):
-            for col in range(8):
-
-                piece = self.get_cell((row, col))
-
-                if piece is not None and piece.white == white:
-                    yield piece
+        for square in iterate_squares(self.occupancy[white]):
+            yield self.cells[square >> 3][square & 7]
 
 
     def find_king(self, white):
@@ -261,11 +525,27 @@ class Board(BoardBase):
 
         :return: The :py:class:'King': object of the given color or None if there is no King on the board.
         """
-        for piece in self.iterate_cells_with_pieces(white):
-            if isinstance(piece, King):
-                return piece
+        square = self.king_squares[white]
+        if square < 0:
+            return None
+
+        return self.cells[square >> 3][square & 7]
+
+    def get_attacked_mask(self, white):
+        """
+        Returns a bitboard of all cells attacked by the pieces of the given color.
+        The attacks of each piece are looked up in the precomputed :py:mod:`attacks` tables.
+
+        :param white: True if the attacks of WHITE pieces are to be calculated, False otherwise
+        :type white: Boolean
+        """
+        occupied = self.occupancy[0] | self.occupancy[1]
+        attacked = 0
+        for kind, mask in enumerate(self.bitboards[white]):
+            for square in iterate_squares(mask):
+                attacked |= attacks_from(kind, square, white, occupied)
 
-        return None
+        return attacked
 
     def is_king_check(self, white):
         """
@@ -277,16 +557,235 @@ class Board(BoardBase):
         For each opposing piece, call the "get_reachable_cells()" method to get a list of all reachable cells.
         Iterate over each reachable cell and check if the kings cell is reachable. If yes, shortcut and return True right away.
         """
-        king = self.find_king(white)
+        square = self.king_squares[white]
+
+        return square >= 0 and self.is_square_attacked(square, not white)
+
+    def get_attackers_mask(self, square, by_white, occupied=None):
+        """
+        Returns a bitboard of all pieces of the given color attacking the given square.
+
+        Instead of generating the attacks of every piece, this looks outward from the square: a knight attacks the square
+        if a knight placed on the square would attack it, a rook or queen if a rook placed on the square would, and so on.
+
+        :param square: The attacked square (row * 8 + col)
+        :param by_white: True if the attacking pieces are WHITE, False otherwise
+        :param occupied: Occupancy used to block sliding pieces, by default all pieces on the board
+        """
+        if occupied is None:
+            occupied = self.occupancy[0] | self.occupancy[1]
+
+        pieces = self.bitboards[by_white]
+        return ((PAWN_ATTACKS[not by_white][square] & pieces[PAWN])
+                | (KNIGHT_ATTACKS[square] & pieces[KNIGHT])
+                | (KING_ATTACKS[square] & pieces[KING])
+                | (bishop_attacks(square, occupied) & (pieces[BISHOP] | pieces[QUEEN]))
+                | (rook_attacks(square, occupied) & (pieces[ROOK] | pieces[QUEEN])))
+
+    def is_square_attacked(self, square, by_white):
+        """
+        Checks whether any piece of the given color attacks the given square.
+        Works like :py:meth:`get_attackers_mask`, but stops at the first kind of attacker found.
+
+        :param square: The attacked square (row * 8 + col)
+        :param by_white: True if the attacking pieces are WHITE, False otherwise
+        """
+        pieces = self.bitboards[by_white]
+        if PAWN_ATTACKS[not by_white][square] & pieces[PAWN]:
+            return True
+        if KNIGHT_ATTACKS[square] & pieces[KNIGHT]:
+            return True
+        if KING_ATTACKS[square] & pieces[KING]:
+            return True
 
-        if king is not None:
-            for piece in self.iterate_cells_with_pieces(not white):
-                for row, col in piece.get_reachable_cells():
-                    if row == king.cell[0] and col == king.cell[1]:
-                        return True
+        occupied = self.occupancy[0] | self.occupancy[1]
+        queens = pieces[QUEEN]
+        if (pieces[BISHOP] | queens) and bishop_attacks(square, occupied) & (pieces[BISHOP] | queens):
+            return True
+        if (pieces[ROOK] | queens) and rook_attacks(square, occupied) & (pieces[ROOK] | queens):
+            return True
 
         return False
 
+    def get_checks_and_pins(self, white):
+        """
+        Analyses the situation of the king of given color once, so the valid moves of all pieces can be derived without
+        trying them on the board.
+
+        :param white: True for the WHITE king, False for the BLACK king
+        :return: A tuple (checkers, pins). checkers is a bitboard of all opposing pieces giving check, pins maps the square
+            of every pinned piece to the bitboard of cells it may still move into (the line towards the pinning piece).
+        """
+        king = self.king_squares[white]
+        if king < 0:
+            return 0, {}
+
+        checkers = self.get_attackers_mask(king, not white)
+
+        # Opposing sliders on a common line with the king, regardless of what is placed in between
+        enemy = self.bitboards[not white]
+        sliders = ((bishop_attacks(king, 0) & (enemy[BISHOP] | enemy[QUEEN]))
+                   | (rook_attacks(king, 0) & (enemy[ROOK] | enemy[QUEEN])))
+
+        occupied = self.occupancy[0] | self.occupancy[1]
+        own = self.occupancy[white]
+        pins = {}
+        for slider in iterate_squares(sliders):
+            between = BETWEEN[king][slider] & occupied
+            # Exactly one piece in between, and it is an own piece
+            if between and not between & (between - 1) and between & own:
+                pins[lowest_square(between)] = BETWEEN[king][slider] | (1 << slider)
+
+        return checkers, pins
+
+    def get_valid_mask(self, piece, checks_and_pins=None):
+        """
+        Returns a bitboard of all cells the given piece can move into without leaving its own king in check.
+
+        Kings may enter every reachable cell not attacked by an opposing piece (looking through the king itself, so it cannot
+        step back along the line of a checking slider). All other pieces cannot move at all during a double check. During a
+        single check they have to hit the checking piece or block its line. Pinned pieces can only move along their pin line.
+
+        :param piece: The piece to get the valid cells for
+        :param checks_and_pins: The result of :py:meth:`get_checks_and_pins` for the color of the piece, if already known
+        """
+        white = piece.white
+        reachable = piece.get_reachable_mask()
+
+        if piece.kind == KING:
+            occupied = (self.occupancy[0] | self.occupancy[1]) ^ (1 << cell_to_square(piece.cell))
+            valid = 0
+            for square in iterate_squares(reachable):
+                if not self.get_attackers_mask(square, not white, occupied):
+                    valid |= 1 << square
+
+        else:
+            if checks_and_pins is None:
+                checks_and_pins = self.get_checks_and_pins(white)
+            checkers, pins = checks_and_pins
+
+            valid = reachable
+            if checkers:
+                if checkers & (checkers - 1):
+                    valid = 0
+                else:
+                    valid &= checkers | BETWEEN[self.king_squares[white]][lowest_square(checkers)]
+
+            square = cell_to_square(piece.cell)
+            if square in pins:
+                valid &= pins[square]
+
+        if self.verify_moves:
+            expected = self.get_valid_mask_by_trial(piece)
+            if expected != valid:
+                raise MoveGenerationException(piece, mask_to_cells(expected), mask_to_cells(valid))
+
+        return valid
+
+    def get_valid_mask_by_trial(self, piece):
+        """
+        Reference implementation of :py:meth:`get_valid_mask`: tries every reachable cell on the board
+        and keeps those not leaving the own king in check.
+        """
+        valid = 0
+        for square in iterate_squares(piece.get_reachable_mask()):
+            self.make_move(piece, (square >> 3, square & 7))
+            if not self.is_king_check(piece.white):
+                valid |= 1 << square
+            self.unmake_move()
+
+        return valid
+
+    def get_valid_moves(self, white):
+        """
+        Returns all valid moves of the given color as a list of (piece, bitboard of target cells) tuples.
+        The checks and pins are analysed only once for all pieces.
+
+        :param white: True if the moves of WHITE pieces are to be generated, False otherwise
+        """
+        checks_and_pins = self.get_checks_and_pins(white)
+        moves = []
+        for piece in self.iterate_cells_with_pieces(white):
+            mask = self.get_valid_mask(piece, checks_and_pins)
+            if mask:
+                moves.append((piece, mask))
+
+        return moves
+
+    def static_exchange(self, from_cell, to_cell):
+        """
+        Static exchange evaluation: the material the side of the piece on from_cell wins (in units of
+        :py:meth:`get_value <pieces.Piece.get_value>`) by hitting on to_cell, if both sides keep recapturing on to_cell
+        with their least valuable piece and each side may stop as soon as recapturing does not pay off.
+        Negative values mean the hit loses material.
+
+        Nothing is moved on the board: attackers are taken from :py:meth:`get_attackers_mask` with every piece that
+        already took part removed from the occupancy, so sliders behind it (x-rays) join the exchange. Pins are not
+        considered. A king only recaptures if the cell is no longer attacked afterwards.
+
+        :param from_cell: The cell of the hitting piece
+        :param to_cell: The cell hit on, it may also be empty
+        """
+        to_square = cell_to_square(to_cell)
+        piece = self.get_cell(from_cell)
+        victim = self.get_cell(to_cell)
+
+        occupied = self.occupancy[0] | self.occupancy[1]
+        gains = [victim.get_value() if victim is not None else 0]
+        attacker = piece
+        attacker_mask = 1 << cell_to_square(from_cell)
+        white = piece.white
+
+        while True:
+            # Gain of the side to capture next, if it captures the piece just placed on to_cell
+            gains.append(attacker.get_value() - gains[-1])
+
+            occupied ^= attacker_mask
+            white = not white
+            attackers = self.get_attackers_mask(to_square, white, occupied) & occupied
+            if not attackers:
+                break
+
+            # Least valuable attacker first
+            for mask in self.bitboards[white]:
+                if mask & attackers:
+                    attacker_mask = (mask & attackers) & -(mask & attackers)
+                    break
+
+            attacker_square = attacker_mask.bit_length() - 1
+            attacker = self.cells[attacker_square >> 3][attacker_square & 7]
+            if attacker.kind == KING and self.get_attackers_mask(to_square, not white, occupied ^ attacker_mask) & occupied:
+                break
+
+        # Resolve the exchange backwards, every side chooses between recapturing and standing pat.
+        # The last gain is left out, there was no piece left to make that capture
+        for index in range(len(gains) - 2, 0, -1):
+            gains[index - 1] = -max(-gains[index - 1], gains[index])
+
+        return gains[0]
+
+    def static_exchange_by_trial(self, from_cell, to_cell):
+        """
+        Reference implementation of :py:meth:`static_exchange`: plays every recapture on the board
+        with :py:meth:`make_move <BoardBase.make_move>` and takes them back afterwards.
+        """
+        piece = self.get_cell(from_cell)
+        victim = self.get_cell(to_cell)
+        gain = victim.get_value() if victim is not None else 0
+
+        self.make_move(piece, to_cell)
+        to_square = cell_to_square(to_cell)
+        attackers = self.get_attackers_mask(to_square, not piece.white)
+        if attackers:
+            for mask in self.bitboards[not piece.white]:
+                if mask & attackers:
+                    square = lowest_square(mask & attackers)
+                    gain -= max(0, self.static_exchange_by_trial((square >> 3, square & 7), to_cell))
+                    break
+        self.unmake_move()
+
+        return gain
+
     def evaluate(self):
         """
         **TODO**: Evaluate the current board configuration into a numerical number.
@@ -296,6 +795,21 @@ class Board(BoardBase):
         **HINT**: Start with a score of zero.
         Use the iterate_cells_with_pieces Method to find all WHITE pieces and call their respective "evaluate" Method. Sum those scores up.
         Then use the iterate_cells_with_pieces Method to find all BLACK pieces, call their respective "evaluate" Method and substract that from the score.
+
+        By default this returns the material and piece-square evaluation the board keeps up to date with every placed,
+        removed or moved piece, so it costs nothing. The summed up piece evaluations are used only if the board was
+        created with rich_evaluation=True, see :py:meth:`evaluate_rich`.
+        """
+        if self.rich_evaluation:
+            return self.evaluate_rich()
+
+        return self.evaluation / 100
+
+    def evaluate_rich(self):
+        """
+        Evaluates the current board configuration by summing up the :py:meth:`evaluate <pieces.Piece.evaluate>`
+        scores of all pieces (WHITE positive, BLACK negative). This considers movability, threats and cover of each
+        piece, but needs a full move generation per piece.
         """
 
         score_white = 0
@@ -312,6 +826,31 @@ class Board(BoardBase):
 
         return score
 
+    def evaluate_move(self, piece, cell):
+        """
+        Returns what :py:meth:`evaluate` would return after moving the piece to the given cell.
+        With the incremental evaluation this is a table lookup, the move is not played on the board.
+        Only with rich_evaluation the move has to be made and taken back.
+        """
+        if self.rich_evaluation:
+            self.make_move(piece, cell)
+            score = self.evaluate()
+            self.unmake_move()
+            return score
+
+        row, col = cell
+        from_square = cell_to_square(piece.cell)
+        to_square = row * 8 + col
+
+        scores = PIECE_SQUARE_SCORES[piece.white][piece.kind]
+        evaluation = self.evaluation + scores[to_square] - scores[from_square]
+
+        captured = self.cells[row][col]
+        if captured is not None:
+            evaluation -= PIECE_SQUARE_SCORES[captured.white][captured.kind][to_square]
+
+        return evaluation / 100
+
     def is_valid_cell(self, cell):
         """
         **TODO**: Check if the given cell coordinates are valid. A cell coordinate is valid if both
@@ -337,7 +876,10 @@ class Board(BoardBase):
         You can use the "is_valid_cell()" Method to verify the cell is valid in the first place.
         If so, use "get_cell()" to retrieve the piece placed on it and return True if there is None
         """
-        return self.is_valid_cell(cell) and self.get_cell(cell) == None
+        if not self.is_valid_cell(cell):
+            return False
+
+        return not (self.occupancy[0] | self.occupancy[1]) >> cell_to_square(cell) & 1
 
     def piece_can_enter_cell(self, piece, cell):
         """
@@ -357,7 +899,7 @@ class Board(BoardBase):
         if not self.is_valid_cell(cell):
             return False
         
-        return (self.get_cell(cell) == None) or (self.get_cell(cell).is_white() != piece.is_white()) 
+        return not self.occupancy[piece.is_white()] >> cell_to_square(cell) & 1
  
 
     def piece_can_hit_on_cell(self, piece, cell):
@@ -378,7 +920,4 @@ class Board(BoardBase):
         if not self.is_valid_cell(cell=cell):
             return False
         
-        if self.get_cell(cell=cell) == None:
-            return False
-        
-        return self.get_cell(cell=cell).is_white() != piece.is_white()
\ No newline at end of file
+        return bool(self.occupancy[not piece.is_white()] >> cell_to_square(cell) & 1)
@@ -0,0 +1,179 @@
+"""
+On-disk corpus of positions for benchmarks and offline analysis.
+
+A corpus consists of two files:
+
+- ``<name>.corpus``: a header followed by one fixed-size record per position, each a packed position as written by
+  :py:meth:`to_packed <board.BoardBase.to_packed>`. As all records have the same size, position N is found at
+  ``HEADER_SIZE + N * record size`` without reading anything before it.
+- ``<name>.corpus.idx``: the names of the positions (e.g. the file they were read from). Names differ in length,
+  so the file starts with the offsets of all names, followed by the names themselves.
+
+Both files are read through :py:mod:`mmap`, so opening even a large corpus costs nothing, only the pages actually
+used are read, and all processes reading the same corpus share these pages in the page cache.
+
+Usage::
+
+    python corpus.py build positions.corpus tests/*.board positions.fen   # inputs as for analyze.py
+    python corpus.py show positions.corpus 17
+
+    with Corpus("positions.corpus") as corpus:
+        white = board.load_from_corpus(corpus, 17)
+"""
+import argparse
+import mmap
+import os
+import shutil
+import struct
+import sys
+from board import Board, PACKED_SIZE
+
+MAGIC = b"DAISYCOR"
+INDEX_MAGIC = b"DAISYIDX"
+
+# Magic, record size
+HEADER = struct.Struct("<8sI4x")
+HEADER_SIZE = HEADER.size
+
+# Magic, number of names
+INDEX_HEADER = struct.Struct("<8sQ")
+OFFSET = struct.Struct("<Q")
+
+
+def index_name(fname):
+    return fname + ".idx"
+
+
+def write_corpus(fname, positions):
+    """
+    Writes a corpus. The positions are written one by one as they come, the memory used does not depend on their number.
+
+    :param positions: An iterable of (name, packed position) tuples, like :py:func:`analyze.read_positions` returns
+    :return: Number of positions written
+    """
+    # The number of positions is only known at the end, so the offsets and the names go into temporary files first
+    offsetsName, namesName = fname + ".offsets.tmp", fname + ".names.tmp"
+    count = 0
+    offset = 0
+    try:
+        with open(fname, "wb") as data, open(offsetsName, "w+b") as offsets, open(namesName, "w+b") as names:
+            data.write(HEADER.pack(MAGIC, PACKED_SIZE))
+            offsets.write(OFFSET.pack(0))
+            for name, packed in positions:
+                if len(packed) != PACKED_SIZE:
+                    raise ValueError(f"position {name} has {len(packed)} bytes instead of {PACKED_SIZE}")
+                data.write(packed)
+                offset += names.write(name.encode("utf-8"))
+                offsets.write(OFFSET.pack(offset))
+                count += 1
+
+            with open(index_name(fname), "wb") as index:
+                index.write(INDEX_HEADER.pack(INDEX_MAGIC, count))
+                for part in (offsets, names):
+                    part.seek(0)
+                    shutil.copyfileobj(part, index)
+    finally:
+        for temporary in (offsetsName, namesName):
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    return count
+
+
+class Corpus:
+    """
+    Read-only access to a corpus through mmap. Records and names are only read when asked for.
+    """
+    def __init__(self, fname):
+        """
+        Opens a corpus written by :py:func:`write_corpus`. Raises ValueError if the files are not a valid corpus.
+        """
+        self.fname = fname
+        self.data = _map(fname)
+        self.index = _map(index_name(fname))
+
+        magic, self.record_size = HEADER.unpack_from(self.data)
+        if magic != MAGIC or self.record_size != PACKED_SIZE or (len(self.data) - HEADER_SIZE) % self.record_size:
+            self.close()
+            raise ValueError(f"{fname} is not a corpus of packed positions")
+
+        self.count = (len(self.data) - HEADER_SIZE) // self.record_size
+        magic, count = INDEX_HEADER.unpack_from(self.index)
+        if magic != INDEX_MAGIC or count != self.count:
+            self.close()
+            raise ValueError(f"{index_name(fname)} does not belong to {fname}")
+        self.names_start = INDEX_HEADER.size + (count + 1) * OFFSET.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, number):
+        """
+        Returns the packed position with the given number
+        """
+        if not 0 <= number < self.count:
+            raise IndexError(f"position {number} not in corpus of {self.count} positions")
+        start = HEADER_SIZE + number * self.record_size
+        return self.data[start:start + self.record_size]
+
+    def name(self, number):
+        """
+        Returns the name of the position with the given number
+        """
+        if not 0 <= number < self.count:
+            raise IndexError(f"position {number} not in corpus of {self.count} positions")
+        start, end = struct.unpack_from("<2Q", self.index, INDEX_HEADER.size + number * OFFSET.size)
+        return self.index[self.names_start + start:self.names_start + end].decode("utf-8")
+
+    def __iter__(self):
+        """
+        Yields (name, packed position) tuples of all positions
+        """
+        for number in range(self.count):
+            yield self.name(number), self[number]
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _map(fname):
+    with open(fname, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def main(argv=None):
+    # Imported here, as analyze itself reads corpus files
+    import analyze
+
+    parser = argparse.ArgumentParser(description="Builds and reads corpus files of packed positions")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="write the positions of the given inputs into a corpus")
+    build.add_argument("corpus", help="corpus file to write")
+    build.add_argument("paths", nargs="+", help=".board files, directories of them, corpus files or files with one position per line")
+    show = commands.add_parser("show", help="print positions of a corpus")
+    show.add_argument("corpus", help="corpus file to read")
+    show.add_argument("numbers", type=int, nargs="*", help="numbers of the positions, all if none given")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = write_corpus(args.corpus, analyze.read_positions(args.paths))
+        print(f"Wrote {count} positions to {args.corpus}", file=sys.stderr)
+        return 0
+
+    board = Board()
+    with Corpus(args.corpus) as corpus:
+        for number in args.numbers or range(len(corpus)):
+            white = board.load_from_corpus(corpus, number)
+            print(f"{number} {corpus.name(number)}: {board.to_fen(white)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
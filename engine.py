@@ -1,29 +1,164 @@
+import hashlib
+import math
 import random
-from tqdm import tqdm
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+import instrumentation
 from util import map_piece_to_character, cell_to_string
+from bitboard import KNIGHT, BISHOP, ROOK, QUEEN, cell_to_square, square_to_cell, mask_to_cells
+from evaluation import PIECE_VALUES
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from analysis_store import settings_of
 
 
 DEPTH = 3
 
+# Search with alpha-beta pruning (principal variation search) instead of plain mini-max
+ALPHA_BETA = True
+
+# Memory budget of the transposition table used by minMax_cached
+TRANSPOSITION_TABLE_MB = 16
+
+# Limits of the iterative deepening search (suggest_move_iterative)
+MAX_DEPTH = 8
+MOVE_TIME = 5.0
+
+# Number of plies the killer moves are kept for
+MAX_PLY = 64
+
+# Number of best statically evaluated moves searched per position, None searches all moves (full width)
+BEAM_WIDTH = 10
+
+# Late move reductions: quiet moves after the first LMR_MIN_MOVES moves are searched one ply shallower first
+LATE_MOVE_REDUCTIONS = True
+LMR_MIN_MOVES = 3
+
+# Null move pruning: if passing the move still fails high in a search reduced by NULL_MOVE_REDUCTION
+# plies, the position is pruned
+NULL_MOVE_PRUNING = True
+NULL_MOVE_REDUCTION = 2
+
+# Quiescence search: hits are searched beyond the last ply until the position is quiet. Each quiescence search
+# visits at most QUIESCENCE_NODES positions, every hit gets an equal share of the nodes left. Hits which cannot raise the score above alpha even with
+# DELTA_MARGIN (in pawns) on top are skipped (delta pruning), just like hits losing material in the exchange
+QUIESCENCE = True
+QUIESCENCE_NODES = 64
+DELTA_MARGIN = 2.0
+
+
+class CancellationToken:
+    """
+    Allows to stop a running search from the outside, e.g. from another thread.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """
+        Requests the search to stop as soon as possible
+        """
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+class Search:
+    """
+    Options and counters of a single search. One instance is shared by all stages of the MinMax Algorithm.
+    """
+    def __init__(self, alphaBeta=ALPHA_BETA, timeLimit=None, nodeLimit=None, token=None, beamWidth=BEAM_WIDTH,
+                 lateMoveReductions=LATE_MOVE_REDUCTIONS, nullMovePruning=NULL_MOVE_PRUNING, quiescence=QUIESCENCE):
+        """
+        Initializes the class using the provided parameters
+
+        :param alphaBeta: True to search with alpha-beta pruning, False for plain mini-max
+        :param timeLimit: Seconds after which the search stops, None for no limit
+        :param nodeLimit: Number of nodes after which the search stops, None for no limit
+        :param token: A :py:class:`CancellationToken` to stop the search from the outside, or None
+        :param beamWidth: Number of moves searched per position, None to search all moves
+        :param lateMoveReductions: True to search late quiet moves with reduced depth first (alpha-beta only)
+        :param nullMovePruning: True to prune positions where even passing the move fails high (alpha-beta only)
+        :param quiescence: True to extend the last ply by a :py:func:`quiescence` search of all hits
+        """
+        self.alphaBeta = alphaBeta
+        self.beamWidth = beamWidth
+        self.lateMoveReductions = lateMoveReductions
+        self.nullMovePruning = nullMovePruning
+        self.quiescence = quiescence
+        self.nodeLimit = nodeLimit
+        self.token = token
+        self.start = time.monotonic()
+        self.deadline = None if timeLimit is None else self.start + timeLimit
+        self.nodes = 0
+        self.evaluations = 0
+        self.quiescenceNodes = 0
+        # Mixed into the keys of the transposition table, see settings_key
+        self.settingsKey = None
+
+        # Depth of the last completed iteration (see suggest_move_iterative)
+        self.depth = 0
+
+        # Move ordering: two killer moves per ply and the history table per color (see order_moves),
+        # both as (from_square, to_square). They are kept over all iterations of an iterative deepening search
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [[0] * 4096, [0] * 4096]
+
+        # Set once a limit is hit. Results of a stopped search must not be used or cached
+        self.stopped = False
+        # Limits are ignored while False, so the first iteration of a search always completes
+        self.interruptible = True
+
+    def should_stop(self):
+        """
+        Checks the limits and the cancellation token. Once this returns True, it stays True.
+        """
+        if self.stopped or not self.interruptible:
+            return self.stopped
+
+        if ((self.nodeLimit is not None and self.nodes >= self.nodeLimit)
+                or (self.deadline is not None and time.monotonic() >= self.deadline)
+                or (self.token is not None and self.token.cancelled)):
+            self.stopped = True
+
+        return self.stopped
+
+    def elapsed(self):
+        """
+        Seconds since the search started
+        """
+        return time.monotonic() - self.start
+
 
 class MinMaxArg:
     """ Helper Class for the MinMax Algorithm.
     This class stores the current search depth and whether we are playing as white or black in this stage. 
+    All stages of one search share the same :py:class:`Search` for options and counters.
 
     Note: You don´t need to implement anything in this case, you can use it in the MinMax Algorithm as you seem fit. 
     """
-    def __init__(self, depth=DEPTH, playAsWhite=True):
+    def __init__(self, depth=DEPTH, playAsWhite=True, search=None, ply=0, allowNullMove=True):
         """
         Initializes the class using the provided parameters
+
+        :param ply: Number of moves played since the root of the search
+        :param allowNullMove: False right after a null move, so two null moves never follow each other
         """
         self.depth = depth
         self.playAsWhite = playAsWhite
+        self.search = search if search is not None else Search()
+        self.ply = ply
+        self.allowNullMove = allowNullMove
 
-    def next(self):
+    def next(self, reduction=0):
         """ 
         Provides the next stage of the MinMax Algorithm by reducing the depth by one and toggling playAsWhite
+
+        :param reduction: Number of plies to reduce the depth by in addition
         """
-        return MinMaxArg(self.depth - 1, not self.playAsWhite)
+        return MinMaxArg(self.depth - 1 - reduction, not self.playAsWhite, self.search, self.ply + 1)
 
 
 class Move:
@@ -59,7 +194,7 @@ class Move:
         return s
 
 
-def evaluate_all_possible_moves(board, minMaxArg, maximumNumberOfMoves = 10):
+def evaluate_all_possible_moves(board, minMaxArg, maximumNumberOfMoves = BEAM_WIDTH):
     """
     **TODO**:
     This method must evaluate all possible moves from all pieces of the current color. 
@@ -70,17 +205,18 @@ def evaluate_all_possible_moves(board, minMaxArg, maximumNumberOfMoves = 10):
     Iterate over all cells with pieces on them by calling the :py:meth:`iterate_cells_with_pieces <board.Board.iterate_cells_with_pieces>` method. 
     For each piece, retrieve all valid moves by calling the :py:meth:`get_valid_cells <pieces.Piece.get_valid_cells>` method of that piece. 
 
-    In order to evaluate a valid move, first you need to place that piece on the respective cell. Call the :py:meth:`set_cell <board.BoardBase.set_cell>` method 
-    to do so. Before doing so, remember the cell the piece is currently placed on as you will need to place it back later.
-    Because placing a piece on a new cell could potential hit (and thus remove) an opposing piece currently placed on this cell, 
-    you need to remember the piece on the target cell as well. Call :py:meth:`get_cell <board.BoardBase.get_cell>` to retrieve that piece and store it in a variable.
+    In order to evaluate a valid move, first you need to place that piece on the respective cell. Call the :py:meth:`make_move <board.BoardBase.make_move>` method 
+    to do so. It remembers the original cell and any hit piece on the undo stack of the board.
 
     After the new board configuration is set in place, call the :py:meth:`evaluate <board.Board.evaluate>` method. You can use the 
     :py:class:`Move` class to store the move (piece and target cell) alongside its achieved evaluation score in a list. 
 
-    Restore the original board configuration by placing the piece in its original cell and restoring any potentially removed piece before 
+    Restore the original board configuration by calling :py:meth:`unmake_move <board.BoardBase.unmake_move>` before 
     moving on to the next move or piece. 
 
+    :py:meth:`evaluate_move <board.Board.evaluate_move>` combines these three steps and, with the incremental
+    evaluation, gets the score without playing the move at all.
+
     Remember the :py:meth:`evaluate <board.Board.evaluate>` method always evaluates from WHITEs perspective, so a higher evaluation
     relates to a better position for WHITE. 
 
@@ -92,22 +228,20 @@ def evaluate_all_possible_moves(board, minMaxArg, maximumNumberOfMoves = 10):
     
     After sorting, a maximum number of moves as provided by the respective parameter must be returned. If there are 
     more moves possible (in most situations there are), only return the top (or worst). Hint: Slice the list after sorting. 
+    If the maximum number of moves is None, all moves are returned (full width search).
     """
     evaluated_possible_moves = []
-    pieces = board.iterate_cells_with_pieces(minMaxArg.playAsWhite) # alle figuren der farbe
-
-    for piece in pieces: 
-        posi = piece.cell # ursprüngliche position jeder figur speichern
-        valid_moves = piece.get_valid_cells() # alle möglichen züge der jeweiligen figur durchgehen
-        for move in valid_moves: 
+    valid_moves = board.get_valid_moves(minMaxArg.playAsWhite) # alle figuren der farbe mit ihren gültigen zügen
 
-            gegner_figur = board.get_cell(move) # mögliche figur oder leer (None)
+    for piece, valid_mask in valid_moves: 
+        if minMaxArg.search.should_stop():
+            break
 
-            board.set_cell(move, piece) # simulation des zuges
-            evaluated_possible_moves.append(Move(piece, move, board.evaluate())) # Bewertung
+        for move in mask_to_cells(valid_mask): # alle möglichen züge der jeweiligen figur durchgehen
 
-            board.set_cell(posi, piece)  # zurücksetzen beider figuren
-            board.set_cell(move, gegner_figur)
+            # Bewertung nach dem Zug, ohne ihn auf dem Brett auszuführen
+            evaluated_possible_moves.append(Move(piece, move, board.evaluate_move(piece, move)))
+            minMaxArg.search.evaluations += 1
 
     evaluated_possible_moves.sort(key=lambda move: move.score, reverse=minMaxArg.playAsWhite)
 
@@ -147,11 +281,7 @@ def minMax(board, minMaxArg):
 
     If the remaining search depth is greater than 1 (minMaxArg.depth > 1),
     iterate over all possible moves. Implement each move by placing the piece in question on the respective cell. 
-    Call the :py:meth:`set_cell <board.BoardBase.set_cell>` method 
-    to do so. Before doing so, remember the cell the piece is currently placed on as you will need to place it back later.
-    Because placing a piece on a new cell could potential hit (and thus remove) an opposing piece currently placed on this cell, 
-    you need to remember the piece on the target cell as well. Call :py:meth:`get_cell <board.BoardBase.get_cell>` 
-    to retrieve that piece and store it in a variable.
+    Call the :py:meth:`make_move <board.BoardBase.make_move>` method to do so.
 
     After the new board configuration is set in place, 
     call the :py:meth:`minMax_cached <engine.minMax_cached>` method
@@ -159,7 +289,7 @@ def minMax(board, minMaxArg):
 
     Overwrite the current moves score with the result from the recursive call.
     
-    Restore the original board configuration by placing the piece in its original cell and restoring any potentially removed piece before 
+    Restore the original board configuration by calling :py:meth:`unmake_move <board.BoardBase.unmake_move>` before 
     moving on to the next move. 
 
     After all moves and their counter-moves have been evaluated sort the list
@@ -187,7 +317,9 @@ def minMax(board, minMaxArg):
     """
     # TODO: Implement the Mini-Max algorithm
 
-    evaluated_moves = evaluate_all_possible_moves(board=board, minMaxArg=minMaxArg)
+    minMaxArg.search.nodes += 1
+
+    evaluated_moves = evaluate_all_possible_moves(board, minMaxArg, minMaxArg.search.beamWidth)
 
     if not evaluated_moves:
         score = 1e6
@@ -195,25 +327,27 @@ def minMax(board, minMaxArg):
             score *= -1
         return Move(None, None, score)
 
-    if minMaxArg.depth == 1:
+    if minMaxArg.depth == 1 and not minMaxArg.search.quiescence:
         return evaluated_moves[0]
 
     for move in evaluated_moves:
 
-        # Ursprüngliche Zelle und Piece
-        cell = move.piece.cell
-        piece = move.piece
-        urspr_piece = board.get_cell(move.cell)
-        board.set_cell(cell=cell, piece=piece)
+        board.make_move(move.piece, move.cell)
 
-        minMax_ergebnis = minMax_cached(board=board, minMaxArg = minMaxArg.next())
+        if minMaxArg.depth == 1:
+            # Am Horizont nur noch Schlagabtausche weiter verfolgen
+            move.score = start_quiescence(board, minMaxArg.next()).score
+        else:
+            minMax_ergebnis = minMax_cached(board=board, minMaxArg = minMaxArg.next())
 
-        # Score überschreiben
-        move.score = minMax_ergebnis.score
+            # Score überschreiben
+            move.score = minMax_ergebnis.score
 
         # Zurücksetzen
-        board.set_cell(cell=move.cell, piece=urspr_piece)
-        board.set_cell(cell=cell, piece=move.piece)
+        board.unmake_move()
+
+        if minMaxArg.search.stopped:
+            break
 
     evaluated_moves.sort(key=lambda move: move.score, reverse=minMaxArg.playAsWhite)
 
@@ -247,14 +381,460 @@ def suggest_random_move(board):
 
 
 
-def suggest_move(board):
+def order_moves(board, moves, minMaxArg, hashMove=None):
+    """
+    Sorts the moves in place, so the moves most likely to cause a cutoff in :py:func:`alphaBeta` are searched first:
+
+    1. the hash move, the best move of an earlier search of this position as (from_square, to_square)
+    2. hits not losing material, the most valuable victim first and among those the least valuable attacker first (MVV-LVA)
+    3. the killer moves of this ply, quiet moves which caused a cutoff in a sibling position
+    4. all other quiet moves, by their score in the history table
+    5. hits losing material according to :py:meth:`static_exchange <board.Board.static_exchange>`, the smallest loss first
+
+    The sort is stable, so moves of equal rank keep their previous order.
+    """
+    search = minMaxArg.search
+    killers = search.killers[minMaxArg.ply] if minMaxArg.ply < MAX_PLY else ()
+    history = search.history[minMaxArg.playAsWhite]
+
+    def rank(move):
+        squares = move_to_squares(move)
+        if squares == hashMove:
+            return (0, 0, 0)
+
+        victim = board.get_cell(move.cell)
+        if victim is not None:
+            if victim.get_value() < move.piece.get_value():
+                exchange = board.static_exchange(move.piece.cell, move.cell)
+                if exchange < 0:
+                    return (4, -exchange, 0)
+            return (1, -victim.get_value(), move.piece.get_value())
+
+        if squares in killers:
+            return (2, killers.index(squares), 0)
+
+        return (3, -history[squares[0] * 64 + squares[1]], 0)
+
+    moves.sort(key=rank)
+
+
+def record_cutoff(move, minMaxArg):
+    """
+    Remembers a quiet (not hitting) move which caused a cutoff as killer move of its ply
+    and rewards it in the history table, deeper searches more.
+    """
+    search = minMaxArg.search
+    squares = move_to_squares(move)
+
+    if minMaxArg.ply < MAX_PLY:
+        killers = search.killers[minMaxArg.ply]
+        if killers[0] != squares:
+            killers[1] = killers[0]
+            killers[0] = squares
+
+    search.history[minMaxArg.playAsWhite][squares[0] * 64 + squares[1]] += minMaxArg.depth * minMaxArg.depth
+
+
+def start_quiescence(board, minMaxArg, alpha=-math.inf, beta=math.inf):
+    """
+    Starts a :py:func:`quiescence` search with a budget of :py:data:`QUIESCENCE_NODES` from a position
+    at the end of the main search
+
+    :return: A :py:class:`Move` without piece holding the score
+    """
+    return Move(None, None, quiescence(board, minMaxArg.playAsWhite, minMaxArg.search, alpha, beta, QUIESCENCE_NODES))
+
+
+def quiescence(board, white, search, alpha, beta, budget):
+    """
+    Searches only hits, until there are no more hits worth searching. This avoids evaluating a position
+    in the middle of an exchange. The side to move may always stop hitting and keep the static evaluation
+    ("stand pat"). Hits are ordered by MVV-LVA. Hits which cannot raise the score above alpha (WHITE) or below
+    beta (BLACK) even with :py:data:`DELTA_MARGIN` on top, and hits losing material according to
+    :py:meth:`static_exchange <board.Board.static_exchange>`, are skipped.
+
+    The budget is split evenly among all hits, skipped or not, so a position is searched the same way
+    whatever the window. Otherwise a narrow window would leave more nodes for deeper hits, and alpha-beta
+    would not return the same scores as mini-max. Positions with less budget than hits are not expanded.
+
+    :param budget: Maximum number of positions visited, including this one
+    :return: The score from WHITEs perspective. Like alpha-beta, a score outside of the window is only a bound.
+    """
+    search.nodes += 1
+    search.quiescenceNodes += 1
+
+    standPat = board.evaluate()
+    if white:
+        if standPat >= beta:
+            return standPat
+        alpha = max(alpha, standPat)
+    else:
+        if standPat <= alpha:
+            return standPat
+        beta = min(beta, standPat)
+
+    if budget <= 1 or search.should_stop():
+        # The stand pat clamped to the window
+        return alpha if white else beta
+
+    enemies = board.occupancy[not white]
+    hits = []
+    for piece, mask in board.get_valid_moves(white):
+        for cell in mask_to_cells(mask & enemies):
+            victim = board.get_cell(cell)
+            hits.append((-victim.get_value(), piece.get_value(), piece, cell, PIECE_VALUES[victim.kind] / 100))
+    hits.sort(key=lambda hit: hit[:2])
+
+    share = (budget - 1) // max(len(hits), 1)
+    if share < 1:
+        return alpha if white else beta
+
+    best = standPat
+    for _, _, piece, cell, value in hits:
+        # Delta pruning: the skipped hit counts with the most it is assumed to gain, so the returned bound stays valid
+        if white and standPat + value + DELTA_MARGIN <= alpha:
+            best = max(best, standPat + value + DELTA_MARGIN)
+            continue
+        if not white and standPat - value - DELTA_MARGIN >= beta:
+            best = min(best, standPat - value - DELTA_MARGIN)
+            continue
+
+        if board.static_exchange(piece.cell, cell) < 0:
+            continue
+
+        board.make_move(piece, cell)
+        score = quiescence(board, not white, search, alpha, beta, share)
+        board.unmake_move()
+
+        if white:
+            best = max(best, score)
+            alpha = max(alpha, score)
+        else:
+            best = min(best, score)
+            beta = min(beta, score)
+
+        if alpha >= beta:
+            break
+
+    return best
+
+
+def has_pieces(board, white):
+    """
+    True if the given color has pieces other than pawns and the king. Without them, passing
+    the move (see :py:func:`alphaBeta`) is often better than any real move (zugzwang).
+    """
+    masks = board.bitboards[white]
+    return bool(masks[KNIGHT] | masks[BISHOP] | masks[ROOK] | masks[QUEEN])
+
+
+def alphaBeta(board, minMaxArg, alpha=-math.inf, beta=math.inf):
+    """
+    Mini-max search with alpha-beta pruning. It considers the same moves as :py:func:`minMax` and 
+    returns the same best move, but skips moves that cannot change the result anymore.
+
+    All scores are from WHITEs perspective: alpha is the score WHITE is already guaranteed, beta the score
+    BLACK is already guaranteed. As a principal variation search, only the first (best ordered) move
+    is searched with the full window. All others are searched with a null window just to prove they are
+    not better, and only re-searched with the full window if that proof fails.
+
+    Unless disabled in the :py:class:`Search`, late move reductions and null move pruning cut the cost further.
+    Both may change the result compared to :py:func:`minMax`, in exchange they allow a full width search
+    (:py:attr:`Search.beamWidth` None) which does not discard any move up front.
+
+    :param board: Reference to the board we need to play on
+    :type board: :py:class:`board.Board`
+    :param minMaxArg: The combined arguments for the mini-max search algorithm.
+    :type minMaxArg: :py:class:`MinMaxArg`
+    :return: Return the best move to make in the current situation.
+    :rtype: :py:class:`Move`
+    """
+    search = minMaxArg.search
+    search.nodes += 1
+    white = minMaxArg.playAsWhite
+
+    key = board.hash(white) ^ settings_key(search, board)
+    entry = transposition_table.probe(key)
+    if entry is not None and entry.depth == minMaxArg.depth:
+        if (entry.bound == EXACT
+                or (entry.bound == LOWER and entry.score >= beta)
+                or (entry.bound == UPPER and entry.score <= alpha)):
+            move = squares_to_move(board, entry.move, entry.score, white)
+            if move is not None:
+                return move
+
+    inCheck = board.is_king_check(white)
+
+    # Null move: let the opponent move twice. If that still fails high, a real move will too
+    depth = minMaxArg.depth
+    if (search.nullMovePruning and minMaxArg.allowNullMove and minMaxArg.ply > 0 and not inCheck
+            and depth > NULL_MOVE_REDUCTION + 1 and has_pieces(board, white)):
+        nullArg = MinMaxArg(depth - 1 - NULL_MOVE_REDUCTION, not white, search, minMaxArg.ply + 1, False)
+        if white and beta < math.inf:
+            score = alphaBeta(board, nullArg, math.nextafter(beta, -math.inf), beta).score
+            if score >= beta and not search.stopped:
+                return Move(None, None, score)
+        elif not white and alpha > -math.inf:
+            score = alphaBeta(board, nullArg, alpha, math.nextafter(alpha, math.inf)).score
+            if score <= alpha and not search.stopped:
+                return Move(None, None, score)
+
+    evaluated_moves = evaluate_all_possible_moves(board, minMaxArg, search.beamWidth)
+
+    if search.stopped:
+        return evaluated_moves[0] if evaluated_moves else Move(None, None, 0)
+
+    if not evaluated_moves:
+        score = -1e6 if white else 1e6
+        transposition_table.store(key, minMaxArg.depth, score, EXACT)
+        return Move(None, None, score)
+
+    if minMaxArg.depth == 1 and not search.quiescence:
+        bestMove = evaluated_moves[0]
+        transposition_table.store(key, minMaxArg.depth, bestMove.score, EXACT, move_to_squares(bestMove))
+        return bestMove
+
+    # Moves of the last ply are followed by a quiescence search instead of another alphaBeta stage
+    child = start_quiescence if depth == 1 else alphaBeta
+
+    order_moves(board, evaluated_moves, minMaxArg, entry.move if entry is not None else None)
+
+    alphaOrig, betaOrig = alpha, beta
+    bestMove = None
+
+    for index, move in enumerate(evaluated_moves):
+        captured = board.make_move(move.piece, move.cell)
+
+        # Late quiet moves are unlikely to be best, so they are searched one ply shallower first
+        reduction = 0
+        if (search.lateMoveReductions and index >= LMR_MIN_MOVES and depth >= 3
+                and captured is None and not inCheck):
+            reduction = 1
+
+        if index == 0:
+            score = child(board, minMaxArg.next(), alpha, beta).score
+        elif white:
+            score = child(board, minMaxArg.next(reduction), alpha, math.nextafter(alpha, math.inf)).score
+            if reduction and score > alpha:
+                score = child(board, minMaxArg.next(), alpha, math.nextafter(alpha, math.inf)).score
+            if alpha < score < beta:
+                score = child(board, minMaxArg.next(), alpha, beta).score
+        else:
+            score = child(board, minMaxArg.next(reduction), math.nextafter(beta, -math.inf), beta).score
+            if reduction and score < beta:
+                score = child(board, minMaxArg.next(), math.nextafter(beta, -math.inf), beta).score
+            if alpha < score < beta:
+                score = child(board, minMaxArg.next(), alpha, beta).score
+
+        board.unmake_move()
+
+        if search.stopped:
+            return bestMove if bestMove is not None else move
+
+        move.score = score
+        if white:
+            if bestMove is None or score > bestMove.score:
+                bestMove = move
+            alpha = max(alpha, score)
+        else:
+            if bestMove is None or score < bestMove.score:
+                bestMove = move
+            beta = min(beta, score)
+
+        if alpha >= beta:
+            if captured is None:
+                record_cutoff(move, minMaxArg)
+            break
+
+    bound = EXACT
+    if bestMove.score <= alphaOrig:
+        bound = UPPER
+    elif bestMove.score >= betaOrig:
+        bound = LOWER
+
+    transposition_table.store(key, minMaxArg.depth, bestMove.score, bound, move_to_squares(bestMove))
+    return bestMove
+
+
+def suggest_move(board, minMaxArg=None):
     """
     Helper function to start the mini-max algorithm.
+    Depending on :py:attr:`Search.alphaBeta` either :py:func:`alphaBeta` or plain :py:func:`minMax_cached` is used.
     """
-    return minMax_cached(board, MinMaxArg())
+    if minMaxArg is None:
+        minMaxArg = MinMaxArg()
+
+    if not minMaxArg.search.alphaBeta:
+        return minMax_cached(board, minMaxArg)
+
+    # The inner nodes of alpha-beta mostly have bounds, not exact scores, so only the root goes into the analysis store
+    key = board.hash(minMaxArg.playAsWhite)
+    move = lookup_stored(board, minMaxArg, key)
+    if move is None:
+        move = alphaBeta(board, minMaxArg)
+        store_result(board, minMaxArg, key, move)
+    return move
+
+
+def suggest_move_iterative(board, playAsWhite=True, maxDepth=MAX_DEPTH, timeLimit=MOVE_TIME, nodeLimit=None, token=None, alphaBeta=ALPHA_BETA, callback=None, beamWidth=BEAM_WIDTH):
+    """
+    Iterative deepening: searches with depth 1, 2, 3, ... until maxDepth is reached, the time or node limit
+    is exceeded or the token is cancelled. The best move of the last completed iteration is returned,
+    the first iteration always completes.
+
+    Every iteration stores its results in the :py:data:`transposition_table`, where the next (deeper) iteration
+    picks up the best moves to search them first.
+
+    :param callback: Called as callback(depth, move, search) after every completed iteration, or None
+    :param beamWidth: Number of moves searched per position, None for a full width search
+    :return: The best move found and the :py:class:`Search` with the counters of the whole search
+    """
+    search = Search(alphaBeta, timeLimit, nodeLimit, token, beamWidth)
+    bestMove = None
+
+    for depth in range(1, maxDepth + 1):
+        search.interruptible = bestMove is not None
+        move = suggest_move(board, MinMaxArg(depth, playAsWhite, search))
+        if search.stopped:
+            break
+
+        bestMove = move
+        search.depth = depth
+        if callback is not None:
+            callback(depth, bestMove, search)
 
-eval_cache = {}
-total_hits = 0
+        # No moves left, searching deeper will not change that
+        if bestMove.piece is None:
+            break
+
+    return bestMove, search
+
+class BackgroundSearch:
+    """
+    Runs :py:func:`suggest_move_iterative` in a worker thread, so the caller (e.g. the event loop of the UI)
+    stays responsive. The search works on a copy of the board, the board itself may be read while searching
+    but must not be changed.
+
+    Usage::
+
+        background = BackgroundSearch(board)
+        while not background.done():
+            if background.progress is not None:
+                depth, squares, score, text, search = background.progress
+            ...
+        move, search = background.result()
+    """
+    def __init__(self, board, playAsWhite=True, callback=None, **options):
+        """
+        Starts the search.
+
+        :param board: The board to search, the returned move refers to a piece of this board
+        :param playAsWhite: The color to move
+        :param callback: Called as callback(depth, squares, score, text, search) from the worker thread after every
+                         completed iteration (see :py:attr:`progress`), or None
+        :param options: Further keyword arguments of :py:func:`suggest_move_iterative`, e.g. maxDepth or timeLimit
+        """
+        self.board = board
+        self.playAsWhite = playAsWhite
+        self.callback = callback
+        self.token = CancellationToken()
+        self.future = Future()
+        # (depth, (from_square, to_square) or None, score, move as text, search) of the last completed iteration,
+        # None until the first one completes. Only a copy of the best move is kept, as its piece belongs to the
+        # copy of the board which the search goes on changing
+        self.progress = None
+
+        copy = type(board)(rich_evaluation=board.rich_evaluation, verify_moves=board.verify_moves)
+        copy.load_snapshot(board.to_snapshot())
+        self.thread = threading.Thread(target=self._run, args=(copy, options), daemon=True)
+        self.thread.start()
+
+    def _run(self, copy, options):
+        try:
+            move, search = suggest_move_iterative(copy, self.playAsWhite, token=self.token,
+                                                  callback=self._completed, **options)
+            # Hand out the move with the piece of the original board instead of the copy
+            if move.piece is not None:
+                move = squares_to_move(self.board, move_to_squares(move), move.score, self.playAsWhite)
+            self.future.set_result((move, search))
+        except InvalidStateError:
+            # Cancelled in the meantime, nobody waits for the result
+            pass
+        except BaseException as error:
+            if not self.future.done():
+                self.future.set_exception(error)
+
+    def _completed(self, depth, move, search):
+        self.progress = (depth, move_to_squares(move), move.score, str(move) if move.piece is not None else "-", search)
+        if self.callback is not None:
+            self.callback(*self.progress)
+
+    def hurry(self):
+        """
+        Stops the search as soon as possible. The result is the best move of the last completed iteration.
+        """
+        self.token.cancel()
+
+    def cancel(self):
+        """
+        Stops the search and discards its result
+        """
+        self.token.cancel()
+        self.future.cancel()
+
+    def cancelled(self):
+        return self.future.cancelled()
+
+    def done(self):
+        """
+        Returns True once the result is available (or the search was cancelled)
+        """
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """
+        Waits for the search and returns the best move and the :py:class:`Search` like :py:func:`suggest_move_iterative`
+        """
+        return self.future.result(timeout)
+
+    def add_done_callback(self, function):
+        """
+        Calls function(backgroundSearch) once the search is done or cancelled, from the worker thread
+        (or right away, if it is already done)
+        """
+        self.future.add_done_callback(lambda future: function(self))
+
+
+transposition_table = TranspositionTable(TRANSPOSITION_TABLE_MB)
+
+# Optional persistent store of search results (see analysis_store.AnalysisStore), None to search everything again
+analysis_store = None
+
+
+def move_to_squares(move):
+    """
+    Turns an engine move into the compact (from_square, to_square) form stored in the transposition table
+    """
+    if move.piece is None:
+        return None
+
+    return (cell_to_square(move.piece.cell), cell_to_square(move.cell))
+
+
+def squares_to_move(board, squares, score, playAsWhite):
+    """
+    Turns a (from_square, to_square) tuple back into an engine move on the given board.
+    Returns None if the squares do not describe a move of the given color, e.g. after a hash collision.
+    """
+    if squares is None:
+        return Move(None, None, score)
+
+    from_square, to_square = squares
+    piece = board.get_cell(square_to_cell(from_square))
+    if piece is None or piece.white != playAsWhite:
+        return None
+
+    return Move(piece, square_to_cell(to_square), score)
 
 
 def minMax_cached(board, minMaxArg):
@@ -264,19 +844,73 @@ def minMax_cached(board, minMaxArg):
     and minMaxArgs, the result is taken from the cache instead of repeating
     the mini-max algorithm again. This can save computation time as
     it avoid to repeat evaluations over and over again. 
-    """
-    global eval_cache, total_hits
 
-    # Calculate a unique hash code for the current board position and search depth
-    hash = str(minMaxArg.depth) + board.hash()
-    if hash in eval_cache:
-        total_hits += 1
-        # print(f"Cache hit! Cache has {len(eval_cache.keys())} entries with {total_hits} hits so far")
-        return eval_cache[hash]
+    Results are kept in the bounded :py:data:`transposition_table` and, if set, in the persistent
+    :py:data:`analysis_store`, which is asked before searching.
+    """
+    # The Zobrist hash covers the board position and the side to move
+    key = board.hash(minMaxArg.playAsWhite)
+    tableKey = key ^ settings_key(minMaxArg.search, board)
+
+    entry = transposition_table.probe(tableKey)
+    if entry is not None and entry.bound == EXACT and entry.depth == minMaxArg.depth:
+        move = squares_to_move(board, entry.move, entry.score, minMaxArg.playAsWhite)
+        if move is not None:
+            if instrumentation.enabled:
+                instrumentation.count("minMax_cached.hit")
+            return move
+
+    move = lookup_stored(board, minMaxArg, key)
+    if move is not None:
+        transposition_table.store(tableKey, minMaxArg.depth, move.score, EXACT, move_to_squares(move))
+        return move
 
     # Its not the cache so do the actual evaluation
+    if instrumentation.enabled:
+        instrumentation.count("minMax_cached.miss")
     bestMove = minMax(board, minMaxArg)
+    if minMaxArg.search.stopped:
+        return bestMove
 
     # Cache it for later
-    eval_cache[hash] = bestMove
+    transposition_table.store(tableKey, minMaxArg.depth, bestMove.score, EXACT, move_to_squares(bestMove))
+    store_result(board, minMaxArg, key, bestMove)
     return bestMove
+
+
+def settings_key(search, board):
+    """
+    Returns a 64 bit key of the settings of the search on the board (see :py:func:`analysis_store.settings_of`).
+    It is mixed into the keys of the :py:data:`transposition_table`, so a search never takes the results
+    of a search with other options or another evaluation, e.g. of a beam search.
+    """
+    # A search only ever runs on one board, so the key is computed once
+    if search.settingsKey is None:
+        digest = hashlib.blake2b(settings_of(search, board).encode(), digest_size=8).digest()
+        search.settingsKey = int.from_bytes(digest, "little")
+    return search.settingsKey
+
+
+def lookup_stored(board, minMaxArg, key):
+    """
+    Returns the result for the position from the :py:data:`analysis_store`, or None if there is no store or no result
+    """
+    if analysis_store is None:
+        return None
+
+    stored = analysis_store.lookup(key, minMaxArg.depth, settings_of(minMaxArg.search, board))
+    if stored is None:
+        return None
+
+    if instrumentation.enabled:
+        instrumentation.count("analysis_store.hit")
+    score, squares = stored
+    return squares_to_move(board, squares, score, minMaxArg.playAsWhite)
+
+
+def store_result(board, minMaxArg, key, move):
+    """
+    Writes the result of a completed search to the :py:data:`analysis_store`, if there is one
+    """
+    if analysis_store is not None and not minMaxArg.search.stopped:
+        analysis_store.store(key, minMaxArg.depth, settings_of(minMaxArg.search, board), move.score, move_to_squares(move))
@@ -0,0 +1,102 @@
+"""
+Material and piece-square tables for the fast, incremental evaluation.
+
+Every piece is worth its material value (see the get_value() methods of the piece classes) plus a bonus
+depending on the cell it is placed on. Both are combined into one table per color and piece kind, already
+signed from WHITEs perspective, so the board can keep the evaluation as a running sum that is updated
+whenever a piece is placed, removed or moved. All values are in centipawns (integers), so the running
+sum does not accumulate rounding errors.
+"""
+from pieces import Pawn, Knight, Bishop, Rook, Queen, King
+
+# Tables as seen from WHITE, laid out like the .board files: rank 8 in the first line, rank 1 in the last one.
+PAWN_TABLE = (
+     0,   0,   0,   0,   0,   0,   0,   0,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    10,  10,  20,  30,  30,  20,  10,  10,
+     5,   5,  10,  25,  25,  10,   5,   5,
+     0,   0,   0,  20,  20,   0,   0,   0,
+     5,  -5, -10,   0,   0, -10,  -5,   5,
+     5,  10,  10, -20, -20,  10,  10,   5,
+     0,   0,   0,   0,   0,   0,   0,   0,
+)
+
+KNIGHT_TABLE = (
+   -50, -40, -30, -30, -30, -30, -40, -50,
+   -40, -20,   0,   0,   0,   0, -20, -40,
+   -30,   0,  10,  15,  15,  10,   0, -30,
+   -30,   5,  15,  20,  20,  15,   5, -30,
+   -30,   0,  15,  20,  20,  15,   0, -30,
+   -30,   5,  10,  15,  15,  10,   5, -30,
+   -40, -20,   0,   5,   5,   0, -20, -40,
+   -50, -40, -30, -30, -30, -30, -40, -50,
+)
+
+BISHOP_TABLE = (
+   -20, -10, -10, -10, -10, -10, -10, -20,
+   -10,   0,   0,   0,   0,   0,   0, -10,
+   -10,   0,   5,  10,  10,   5,   0, -10,
+   -10,   5,   5,  10,  10,   5,   5, -10,
+   -10,   0,  10,  10,  10,  10,   0, -10,
+   -10,  10,  10,  10,  10,  10,  10, -10,
+   -10,   5,   0,   0,   0,   0,   5, -10,
+   -20, -10, -10, -10, -10, -10, -10, -20,
+)
+
+ROOK_TABLE = (
+     0,   0,   0,   0,   0,   0,   0,   0,
+     5,  10,  10,  10,  10,  10,  10,   5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+     0,   0,   0,   5,   5,   0,   0,   0,
+)
+
+QUEEN_TABLE = (
+   -20, -10, -10,  -5,  -5, -10, -10, -20,
+   -10,   0,   0,   0,   0,   0,   0, -10,
+   -10,   0,   5,   5,   5,   5,   0, -10,
+    -5,   0,   5,   5,   5,   5,   0,  -5,
+     0,   0,   5,   5,   5,   5,   0,  -5,
+   -10,   5,   5,   5,   5,   5,   0, -10,
+   -10,   0,   5,   0,   0,   0,   0, -10,
+   -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+
+KING_TABLE = (
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -20, -30, -30, -40, -40, -30, -30, -20,
+   -10, -20, -20, -20, -20, -20, -20, -10,
+    20,  20,   0,   0,   0,   0,  20,  20,
+    20,  30,  10,   0,   0,  10,  30,  20,
+)
+
+# In the order of the piece kinds in :py:mod:`bitboard`
+PIECE_CLASSES = (Pawn, Knight, Bishop, Rook, Queen, King)
+TABLES = (PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_TABLE)
+
+# Material value of each piece kind in centipawns
+PIECE_VALUES = tuple(round(cls(None, True).get_value() * 100) for cls in PIECE_CLASSES)
+
+
+def _build_scores(white):
+    scores = []
+    for value, table in zip(PIECE_VALUES, TABLES):
+        kind_scores = []
+        for square in range(64):
+            row, col = square >> 3, square & 7
+            # Black pieces use the table mirrored vertically
+            table_row = 7 - row if white else row
+            score = value + table[table_row * 8 + col]
+            kind_scores.append(score if white else -score)
+        scores.append(kind_scores)
+    return scores
+
+
+# PIECE_SQUARE_SCORES[white][kind][square]: contribution of a piece to the evaluation, from WHITEs perspective
+PIECE_SQUARE_SCORES = [_build_scores(False), _build_scores(True)]
@@ -0,0 +1,206 @@
+"""
+Opt-in instrumentation of the hot paths of the engine.
+
+While enabled, the functions listed in :py:data:`TIMED` are replaced by wrappers counting their calls and
+measuring their cumulative time (including the time spent in nested calls). Disabling puts the original
+functions back, so there is no cost at all while the instrumentation is off. Events which cannot be timed
+as a function call, like the cache hits and misses of :py:func:`engine.minMax_cached`, are counted by
+:py:func:`count`, which the engine only calls after checking :py:data:`enabled`.
+
+Usage::
+
+    with instrumentation.instrumented() as report:
+        suggest_move(board)
+    print(report)
+
+    with instrumentation.profiling():       # cProfile, prints the top functions afterwards
+        suggest_move(board)
+
+    with instrumentation.tracing_memory():  # tracemalloc, prints the peak and the top allocations
+        suggest_move(board)
+"""
+import cProfile
+import functools
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Checked by the engine before counting an event
+enabled = False
+
+# Number of calls (or events) and cumulative seconds per name
+calls = {}
+seconds = {}
+
+# (module name, class name or None, function name) of all timed functions
+TIMED = (
+    ("pieces", "Piece", "get_reachable_cells"),
+    ("pieces", "Piece", "get_valid_cells"),
+    ("pieces", "Piece", "evaluate"),
+    ("board", "BoardBase", "set_cell"),
+    ("board", "BoardBase", "make_move"),
+    ("board", "Board", "get_valid_moves"),
+    ("board", "Board", "get_valid_mask"),
+    ("board", "Board", "is_king_check"),
+    ("board", "Board", "evaluate"),
+    ("board", "Board", "evaluate_move"),
+    ("engine", None, "minMax_cached"),
+)
+
+_originals = []
+
+
+def _wrap(name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds[name] = seconds.get(name, 0.0) + time.perf_counter() - start
+            calls[name] = calls.get(name, 0) + 1
+
+    return wrapper
+
+
+def enable():
+    """
+    Installs the wrappers around all :py:data:`TIMED` functions. Does nothing if already enabled.
+    """
+    global enabled
+    if enabled:
+        return
+
+    for moduleName, className, functionName in TIMED:
+        owner = sys.modules.get(moduleName) or __import__(moduleName)
+        if className is not None:
+            owner = getattr(owner, className)
+        name = functionName if className is None else f"{className}.{functionName}"
+
+        # Look into the class dictionary, so inherited methods are not copied into a subclass
+        original = owner.__dict__[functionName]
+        _originals.append((owner, functionName, original))
+        setattr(owner, functionName, _wrap(name, original))
+
+    enabled = True
+
+
+def disable():
+    """
+    Restores the original functions. The counters are kept until :py:func:`reset` is called.
+    """
+    global enabled
+    while _originals:
+        owner, functionName, original = _originals.pop()
+        setattr(owner, functionName, original)
+
+    enabled = False
+
+
+def reset():
+    """
+    Clears all counters
+    """
+    calls.clear()
+    seconds.clear()
+
+
+def count(name):
+    """
+    Counts an event. Callers should check :py:data:`enabled` first, so nothing is counted while disabled.
+    """
+    calls[name] = calls.get(name, 0) + 1
+
+
+def report(callCounts=None, cumulativeSeconds=None):
+    """
+    Returns the counters as a printable table, sorted by cumulative time
+
+    :param callCounts: Calls per name, the current counters if None
+    :param cumulativeSeconds: Seconds per name, the current counters if None
+    """
+    callCounts = calls if callCounts is None else callCounts
+    cumulativeSeconds = seconds if cumulativeSeconds is None else cumulativeSeconds
+
+    lines = [f"{'function':28} {'calls':>10} {'total ms':>10} {'per call us':>12}"]
+    for name in sorted(callCounts, key=lambda name: (-cumulativeSeconds.get(name, 0.0), name)):
+        if name in cumulativeSeconds:
+            total = cumulativeSeconds[name]
+            lines.append(f"{name:28} {callCounts[name]:10} {total * 1000:10.1f} {total / callCounts[name] * 1e6:12.2f}")
+        else:
+            lines.append(f"{name:28} {callCounts[name]:10}")
+
+    return "\n".join(lines)
+
+
+class Report:
+    """
+    Result of :py:func:`instrumented`, a snapshot of the counters of one search
+    """
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+
+    def __str__(self):
+        return report(self.calls, self.seconds)
+
+
+@contextmanager
+def instrumented():
+    """
+    Enables the instrumentation with fresh counters for the duration of the with block.
+    Yields a :py:class:`Report` which holds the counters after the block.
+    """
+    result = Report()
+    wasEnabled = enabled
+    reset()
+    enable()
+    try:
+        yield result
+    finally:
+        if not wasEnabled:
+            disable()
+        result.calls = dict(calls)
+        result.seconds = dict(seconds)
+
+
+@contextmanager
+def profiling(sort="cumulative", limit=25, out=sys.stdout):
+    """
+    Runs the with block under cProfile and prints the top functions afterwards.
+    Yields the cProfile.Profile object.
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        if out is not None:
+            pstats.Stats(profile, stream=out).sort_stats(sort).print_stats(limit)
+
+
+@contextmanager
+def tracing_memory(limit=10, out=sys.stdout):
+    """
+    Runs the with block under tracemalloc and prints the peak memory and the lines which allocated the most memory.
+    Yields a dictionary, which holds the "peak" memory in bytes afterwards.
+    """
+    result = {"peak": 0}
+    wasTracing = tracemalloc.is_tracing()
+    if not wasTracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield result
+    finally:
+        result["peak"] = tracemalloc.get_traced_memory()[1]
+        snapshot = tracemalloc.take_snapshot()
+        if not wasTracing:
+            tracemalloc.stop()
+        if out is not None:
+            print(f"Peak memory: {result['peak'] / 1024:.1f} KiB", file=out)
+            for statistic in snapshot.statistics("lineno")[:limit]:
+                print(statistic, file=out)
@@ -0,0 +1,204 @@
+"""
+Parallel root search over a pool of worker processes.
+
+The moves at the root of the search are distributed over the workers, each searching the position after one root move.
+Workers receive a compact snapshot of the board (see :py:meth:`to_snapshot <board.BoardBase.to_snapshot>`) and the
+move as (from_square, to_square), instead of a pickled board with all its pieces.
+
+Like a principal variation search, the first (best ordered) root move is searched alone to get a bound. All other
+root moves are then searched in parallel with a null window, only proving they are not better, and those which are
+better are searched again with the full window. The best move is picked in the order of the root moves.
+
+By default all workers share one :py:class:`SharedTranspositionTable <transposition.SharedTranspositionTable>`,
+so a position searched by one worker is not searched again by another. The result then depends on which worker
+finished first. With ``shared=False`` every worker has a private table which is cleared for each task, then the
+result is the same for any number of workers.
+
+Usage::
+
+    with create_pool(8) as pool:
+        move = suggest_move_parallel(board, MinMaxArg(depth=5), pool=pool)
+"""
+import math
+import multiprocessing
+import os
+import engine
+from board import Board
+from bitboard import cell_to_square, square_to_cell
+from engine import MinMaxArg, Move
+from transposition import SharedTranspositionTable, TranspositionTable
+
+# Number of worker processes
+WORKERS = os.cpu_count() or 1
+
+# Memory budget of the transposition table shared by all worker processes
+SHARED_TRANSPOSITION_TABLE_MB = 64
+
+# Memory budget of the transposition table of each worker process, if not shared
+WORKER_TRANSPOSITION_TABLE_MB = 4
+
+
+def _init_worker(megabytes, name):
+    if name is None:
+        engine.transposition_table = TranspositionTable(megabytes)
+    else:
+        engine.transposition_table = SharedTranspositionTable(megabytes, name)
+
+
+class WorkerPool:
+    """
+    A pool of worker processes together with the transposition table they share (if any).
+    Created by :py:func:`create_pool`, closing it also frees the shared table.
+    """
+
+    def __init__(self, workers, megabytes, shared):
+        self.table = SharedTranspositionTable(megabytes) if shared else None
+        name = self.table.name if shared else None
+        self.pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(megabytes, name))
+
+    @property
+    def shared(self):
+        return self.table is not None
+
+    def map(self, function, tasks, chunksize=1):
+        return self.pool.map(function, tasks, chunksize=chunksize)
+
+    def close(self):
+        """
+        Stops the worker processes and frees the shared table
+        """
+        self.pool.terminate()
+        self.pool.join()
+        if self.table is not None:
+            self.table.close()
+            self.table.unlink()
+            self.table = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def create_pool(workers=WORKERS, megabytes=None, shared=True):
+    """
+    Creates a pool of worker processes for :py:func:`suggest_move_parallel`.
+    Creating the pool is expensive, so it should be reused for many searches.
+
+    :param workers: Number of worker processes
+    :param megabytes: Memory budget of the shared table, or of the table of each worker if not shared
+    :param shared: True if all workers share one transposition table
+    """
+    if megabytes is None:
+        megabytes = SHARED_TRANSPOSITION_TABLE_MB if shared else WORKER_TRANSPOSITION_TABLE_MB
+    return WorkerPool(workers, megabytes, shared)
+
+
+def search_options(search):
+    """
+    Returns the options of a :py:class:`engine.Search` as keyword arguments, to create the same search in a worker
+    """
+    return {
+        "alphaBeta": search.alphaBeta,
+        "beamWidth": search.beamWidth,
+        "lateMoveReductions": search.lateMoveReductions,
+        "nullMovePruning": search.nullMovePruning,
+        "quiescence": search.quiescence,
+    }
+
+
+def search_root_move(task):
+    """
+    Runs in a worker: plays one root move on the snapshot and searches the resulting position.
+
+    :param task: A tuple (snapshot, (rich_evaluation, verify_moves), white, (from_square, to_square), depth, alpha, beta, options)
+    :return: A tuple (score, nodes)
+    """
+    snapshot, (richEvaluation, verifyMoves), white, squares, depth, alpha, beta, options = task
+
+    # A private table starts empty, so the result does not depend on what the worker searched before
+    if not isinstance(engine.transposition_table, SharedTranspositionTable):
+        engine.transposition_table.clear()
+    # The snapshot holds only the pieces, the board has to evaluate like the one of the caller
+    board = Board(rich_evaluation=richEvaluation, verify_moves=verifyMoves)
+    board.load_snapshot(snapshot)
+    board.make_move(board.get_cell(square_to_cell(squares[0])), square_to_cell(squares[1]))
+
+    search = engine.Search(**options)
+    minMaxArg = MinMaxArg(depth - 1, not white, search, ply=1)
+    if search.alphaBeta:
+        score = engine.alphaBeta(board, minMaxArg, alpha, beta).score
+    else:
+        score = engine.minMax_cached(board, minMaxArg).score
+
+    return score, search.nodes
+
+
+def suggest_move_parallel(board, minMaxArg=None, workers=WORKERS, pool=None, shared=True):
+    """
+    Parallel version of :py:func:`engine.suggest_move`, distributing the root moves over a pool of worker processes.
+
+    :param minMaxArg: Depth, color and :py:class:`engine.Search` options. The nodes of all workers are added to the search.
+    :param workers: Number of worker processes, if no pool is given
+    :param pool: A pool created by :py:func:`create_pool`, or None to create one just for this search
+    :param shared: True if the workers share one transposition table, if no pool is given
+    :return: The best move, with a piece of the given board
+    """
+    if minMaxArg is None:
+        minMaxArg = MinMaxArg()
+
+    search = minMaxArg.search
+    white = minMaxArg.playAsWhite
+    if minMaxArg.depth <= 1:
+        return engine.suggest_move(board, minMaxArg)
+
+    if pool is None:
+        with create_pool(workers, shared=shared) as pool:
+            return suggest_move_parallel(board, minMaxArg, pool=pool)
+
+    moves = engine.evaluate_all_possible_moves(board, minMaxArg, search.beamWidth)
+    if not moves:
+        return engine.suggest_move(board, minMaxArg)
+    search.nodes += 1
+
+    snapshot = board.to_snapshot()
+    flags = (board.rich_evaluation, board.verify_moves)
+    options = search_options(search)
+    squares = [(cell_to_square(move.piece.cell), cell_to_square(move.cell)) for move in moves]
+
+    def run(indices, windows):
+        tasks = [(snapshot, flags, white, squares[index], minMaxArg.depth, alpha, beta, options)
+                 for index, (alpha, beta) in zip(indices, windows)]
+        results = pool.map(search_root_move, tasks, chunksize=1)
+        search.nodes += sum(nodes for _, nodes in results)
+        return [score for score, _ in results]
+
+    # The first move alone, with the full window
+    scores = [None] * len(moves)
+    scores[0] = run([0], [(-math.inf, math.inf)])[0]
+    best = scores[0]
+
+    # All others with a null window, just to prove they are not better
+    others = list(range(1, len(moves)))
+    if white:
+        window = (best, math.nextafter(best, math.inf))
+    else:
+        window = (math.nextafter(best, -math.inf), best)
+    for index, score in zip(others, run(others, [window] * len(others))):
+        scores[index] = score
+
+    # The better ones again with the full window, for their exact score
+    better = [index for index in others if (scores[index] > best if white else scores[index] < best)]
+    window = (best, math.inf) if white else (-math.inf, best)
+    for index, score in zip(better, run(better, [window] * len(better))):
+        scores[index] = score
+
+    # Deterministic reduce: the best score wins, on equal scores the first root move
+    bestIndex = 0
+    for index in range(1, len(moves)):
+        if (scores[index] > scores[bestIndex]) if white else (scores[index] < scores[bestIndex]):
+            bestIndex = index
+
+    move = moves[bestIndex]
+    return Move(move.piece, move.cell, scores[bestIndex])
@@ -0,0 +1,170 @@
+"""
+Perft (performance test) of the move generation.
+
+Counts all leaf nodes of the game tree up to a given depth, using the same move generation the engine uses
+(:py:meth:`get_valid_moves <board.Board.get_valid_moves>`, :py:meth:`make_move <board.BoardBase.make_move>` and
+:py:meth:`unmake_move <board.BoardBase.unmake_move>`). The counts are compared against a table of expected counts,
+so a wrong move generator is found immediately, and the nodes per second give a single throughput number.
+
+The rule set of this project knows no castling, no en passant and no promotion (pawns stay pawns on the last row).
+Up to depth 4 from the start position none of these can occur, so the counts there equal the well known ones.
+At depth 5 the count is the well known 4865609 minus the 258 en passant captures.
+
+Usage::
+
+    python perft.py 4                       # start position, depth 4
+    python perft.py 3 tests/knight.board    # any .board file
+    python perft.py 3 --divide --black      # counts per root move, BLACK to move
+    python perft.py --check                 # verify all entries of EXPECTED_COUNTS
+    python perft.py --check 3               # ... up to depth 3 only
+"""
+import argparse
+import sys
+import time
+from board import Board
+from bitboard import mask_to_cells
+from util import cell_to_string
+
+START = "start"
+
+# EXPECTED_COUNTS[(position, white)] = counts for depth 1, 2, 3, ...
+EXPECTED_COUNTS = {
+    (START, True): (20, 400, 8902, 197281, 4865351),
+    (START, False): (20, 400, 8902, 197281),
+    ("tests/queen.board", True): (10, 177, 2870),
+    ("tests/queen.board", False): (8, 67, 2099),
+    ("tests/knight.board", True): (6, 89, 1791),
+    ("tests/knight.board", False): (15, 189, 2519),
+    ("tests/bishop.board", True): (21, 231, 4914),
+    ("tests/bishop.board", False): (12, 250, 3166),
+    ("tests/rook.board", True): (20, 76, 1559),
+    ("tests/rook.board", False): (4, 80, 348),
+    ("tests/pawn.board", True): (29, 791, 22524),
+    ("tests/pawn.board", False): (29, 796, 23625),
+    ("tests/random1.board", True): (49, 1415, 62133),
+    ("tests/random1.board", False): (31, 1358, 39625),
+    ("tests/random2.board", True): (38, 1472, 57395),
+    ("tests/random2.board", False): (41, 1549, 60967),
+}
+
+
+def load_position(position):
+    """
+    Returns a new board set up with the given position, which is either START or the file name of a .board file
+    """
+    board = Board()
+    if position == START:
+        board.reset()
+    else:
+        board.load_from_disk(position)
+    return board
+
+
+def perft(board, depth, white=True):
+    """
+    Counts the leaf nodes of the game tree of given depth.
+    On the last level the moves are only counted, not played.
+
+    :param board: The board, it is left unchanged
+    :param depth: Number of plies, 0 counts the position itself
+    :param white: True if WHITE is to move
+    """
+    if depth == 0:
+        return 1
+
+    nodes = 0
+    for piece, mask in board.get_valid_moves(white):
+        if depth == 1:
+            nodes += bin(mask).count("1")
+            continue
+
+        for cell in mask_to_cells(mask):
+            board.make_move(piece, cell)
+            nodes += perft(board, depth - 1, not white)
+            board.unmake_move()
+
+    return nodes
+
+
+def divide(board, depth, white=True):
+    """
+    Like :py:func:`perft`, but returns the leaf node count for each root move separately,
+    as a dict mapping moves like "e2e4" to their count. Useful to narrow down a wrong count.
+    """
+    counts = {}
+    for piece, mask in board.get_valid_moves(white):
+        for cell in mask_to_cells(mask):
+            move = cell_to_string(piece.cell) + cell_to_string(cell)
+            board.make_move(piece, cell)
+            counts[move] = perft(board, depth - 1, not white)
+            board.unmake_move()
+
+    return counts
+
+
+def run(position=START, depth=3, white=True, show_divide=False, out=sys.stdout):
+    """
+    Runs perft on a position and prints the count, the time and the nodes per second.
+    The count is compared against :py:data:`EXPECTED_COUNTS` if there is an entry for it.
+
+    :return: A tuple (nodes, seconds, expected), expected is None if unknown
+    """
+    board = load_position(position)
+
+    start = time.perf_counter()
+    if show_divide:
+        counts = divide(board, depth, white)
+        for move in sorted(counts):
+            print(f"{move}: {counts[move]}", file=out)
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(board, depth, white)
+    seconds = time.perf_counter() - start
+
+    expected = EXPECTED_COUNTS.get((position, white), ())
+    expected = expected[depth - 1] if 0 < depth <= len(expected) else None
+
+    side = "WHITE" if white else "BLACK"
+    nps = nodes / seconds if seconds > 0 else 0.0
+    status = "" if expected is None else (" ok" if nodes == expected else f" WRONG, expected {expected}")
+    print(f"perft({depth}) {position} {side}: {nodes} nodes in {seconds:.3f}s ({nps:.0f} nodes/s){status}", file=out)
+
+    return nodes, seconds, expected
+
+
+def check(max_depth=None, out=sys.stdout):
+    """
+    Runs all entries of :py:data:`EXPECTED_COUNTS` up to the given depth
+
+    :return: True if all counts match
+    """
+    ok = True
+    for (position, white), counts in EXPECTED_COUNTS.items():
+        for depth in range(1, len(counts) + 1):
+            if max_depth is not None and depth > max_depth:
+                break
+            nodes, _, expected = run(position, depth, white, out=out)
+            ok = ok and nodes == expected
+
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Counts the leaf nodes of the game tree (perft)")
+    parser.add_argument("depth", type=int, nargs="?", default=None, help="number of plies (default 3)")
+    parser.add_argument("position", nargs="?", default=START, help="a .board file, or 'start' (default)")
+    parser.add_argument("--black", action="store_true", help="BLACK is to move")
+    parser.add_argument("--divide", action="store_true", help="print the count of every root move")
+    parser.add_argument("--check", action="store_true", help="verify all expected counts (up to depth, if given)")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return 0 if check(args.depth) else 1
+
+    depth = 3 if args.depth is None else args.depth
+    nodes, _, expected = run(args.position, depth, not args.black, args.divide)
+    return 0 if expected is None or nodes == expected else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
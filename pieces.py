@@ -1,10 +1,30 @@
+from bitboard import (
+    PAWN,
+    KNIGHT,
+    BISHOP,
+    ROOK,
+    QUEEN,
+    KING,
+    cell_to_square,
+    cells_to_mask,
+    mask_to_cells,
+    pawn_pushes,
+)
+from attacks import attacks_from
+
+
 class Piece:
     """
     Base class for pieces on the board. 
     
     A piece holds a reference to the board, its color and its currently located cell.
     In this class, you need to implement two methods, the "evaluate()" method and the "get_valid_cells()" method.
+
+    Every subclass sets "kind" to one of the piece kinds from :py:mod:`bitboard`. It selects the bitboard
+    of the board this piece is tracked in.
     """
+    kind = None
+
     def __init__(self, board, white):
         """
         Constructor for a piece based on provided parameters
@@ -50,6 +70,29 @@ class Piece:
     def get_value(self):
         pass
 
+    def get_attack_mask(self):
+        """
+        Returns a bitboard of all cells this piece attacks from its current cell, regardless of what is placed on them.
+        Sliding pieces are stopped by the first occupied cell on each ray. The attacks are looked up in the
+        precomputed :py:mod:`attacks` tables.
+        """
+        occupied = self.board.occupancy[0] | self.board.occupancy[1]
+        return attacks_from(self.kind, cell_to_square(self.cell), self.white, occupied)
+
+    def get_reachable_mask(self):
+        """
+        Returns a bitboard of all cells this piece could move into, not considering checks.
+        Every attacked cell not blocked by a piece of the same color can be entered.
+        """
+        return self.get_attack_mask() & ~self.board.occupancy[self.white]
+
+    def get_reachable_cells(self):
+        """
+        Returns a list of reachable cells (row, col) this piece could move into, not considering checks.
+        See :py:meth:`get_reachable_mask` for the movement rules.
+        """
+        return mask_to_cells(self.get_reachable_mask())
+
     def evaluate(self):
         """
         **TODO** Implement a meaningful numerical evaluation of this piece on the board.
@@ -74,45 +117,40 @@ class Piece:
         # return piece_value
 
         own_valid_cells = self.get_valid_cells()
+        own_valid_mask = cells_to_mask(own_valid_cells)
 
-        posi = self.cell
+        posi_mask = 1 << cell_to_square(self.cell)
 
         bedrohungen = 0
         schlagb_figuren_score = 0
         anzahl_gedeckt = 0
 
-        for row in range(8):
-            for col in range(8):
+        # nur belegte Felder durchgehen (statt aller 64), die eigene Figur deckt sich nicht selbst
+        for white in (True, False):
+            for piece in list(self.board.iterate_cells_with_pieces(white)):
 
-                piece = self.board.get_cell((row, col))
+                if piece is self:
+                    continue
 
-                if piece is not None:
+                if piece.is_white() == self.white:
 
-                    if piece.is_white() == self.white:
+                    self.board.set_cell(self.cell, piece=None)
 
-                        self.board.set_cell(self.cell, piece=None)
+                    if cells_to_mask(piece.get_valid_cells()) & posi_mask:
+                        anzahl_gedeckt += 1
 
-                        for cell in piece.get_valid_cells():
-                            if cell[0] == posi[0] and cell[1] == posi[1]:
-                                anzahl_gedeckt += 1
+                    self.board.set_cell(self.cell, piece=self)
 
-                        self.board.set_cell(self.cell, piece=self)
-
-
-
-                    else:
+                else:
 
-                        foreign_cell = piece.cell
-                        foreign_valid_cells = piece.get_valid_cells()
+                    foreign_mask = 1 << cell_to_square(piece.cell)
 
-                        for cell in foreign_valid_cells:
-                            if cell[0] == posi[0] and cell[1] == posi[1]:
-                                bedrohungen += 1
+                    if cells_to_mask(piece.get_valid_cells()) & posi_mask:
+                        bedrohungen += 1
 
-                        for cell in own_valid_cells:
-                            if cell[0] == foreign_cell[0] and cell[1] == foreign_cell[1]:
-                                if self.get_value() < piece.get_value():
-                                    schlagb_figuren_score = 1e3
+                    if own_valid_mask & foreign_mask:
+                        if self.get_value() < piece.get_value():
+                            schlagb_figuren_score = 1e3
 
         # Berechnung
         sicherheit = anzahl_gedeckt - bedrohungen
@@ -125,326 +163,108 @@ class Piece:
 
     def get_valid_cells(self):
         """
-        **TODO** Return a list of **valid** cells this piece can move into. 
+        Return a list of **valid** cells this piece can move into. 
         
         A cell is valid if 
           a) it is **reachable**. That is what the :py:meth:`get_reachable_cells` method is for and
           b) after a move into this cell the own king is not (or no longer) in check.
 
-        **HINT**: Use the :py:meth:`get_reachable_cells` method of this piece to receive a list of reachable cells.
-        Iterate through all of them and temporarily place the piece on this cell. Then check whether your own King (same color)
-        is in check. Use the :py:meth:`is_king_check_cached` method to test for checks. If there is no check after this move, add
-        this cell to the list of valid cells. After every move, restore the original board configuration. 
+        The board answers this from the checks and pins of the current configuration without trying each move,
+        see :py:meth:`get_valid_mask <board.Board.get_valid_mask>`.
         
-        To temporarily move a piece into a new cell, first store its old position (self.cell) in a local variable. 
-        The target cell might have another piece already placed on it. 
-        Use :py:meth:`get_cell <board.BoardBase.get_cell>` to retrieve that piece (or None if there was none) and store it as well. 
-        Then call :py:meth:`set_cell <board.BoardBase.set_cell>` to place this piece on the target cell and test for any checks given. 
-        After this, restore the original configuration by placing this piece back into its old position (call :py:meth:`set_cell <board.BoardBase.set_cell>` again)
-        and place the previous piece also back into its cell. 
-        
-        :return: Return True 
+        :return: A list of valid (row, col) cells
         """
 
-        possible_moves = self.get_reachable_cells()
-
-        valid_cells = []
-
-        for move in possible_moves:
-
-            origin_cell = self.cell # Speichern der ursprünglichen position
-            possible_piece = self.board.get_cell(move) #get_cell gibt nicht position, sondern das piece auf der posi wieder
-
-            self.board.set_cell(move, self) # simulieren der züge (temporär)
-
-            if not self.board.is_king_check(self.is_white()):  # schach prüfung
-                valid_cells.append(self.cell)
-
-            self.board.set_cell(origin_cell, self)   # zurückstellen der figuren
-            self.board.set_cell(move, possible_piece)
-
-        return valid_cells
+        return mask_to_cells(self.board.get_valid_mask(self))
 
 
 
 
 
 class Pawn(Piece):  # Bauer
+    kind = PAWN
+
     def __init__(self, board, white):
         super().__init__(board, white)
     # teilt figur wert zu
     def get_value(self):
         return 1
 
-    def get_reachable_cells(self):
+    def get_reachable_mask(self):
         """
-        **TODO** Implement the movability mechanik for `pawns <https://de.wikipedia.org/wiki/Bauer_(Schach)>`_. 
+        Movability of `pawns <https://de.wikipedia.org/wiki/Bauer_(Schach)>`_.
 
-        **NOTE**: Here you do not yet need to consider whether your own King would become checked after a move. This will be taken care of by
-        the :py:meth:`is_king_check <board.Board.is_king_check>` and :py:meth:`get_valid_cells <pieces.Piece.get_valid_cells>` methods.
-
-        **HINT**: Pawns can move only forward (towards the opposing army). Depening of whether this piece is black of white, this means pawn
-        can move only to higher or lower rows. Normally a pawn can only move one cell forward as long as the target cell is not occupied by any other piece. 
-        If the pawn is still on its starting row, it can also dash forward and move two pieces at once (as long as the path to that cell is not blocked).
-        Pawns can only hit diagonally, meaning they can hit other pieces only the are one cell forward left or one cell forward right from them. 
-
-        You can call :py:meth:`cell_is_valid_and_empty <board.Board.cell_is_valid_and_empty>`, 
-        :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>` 
-        to check for necessary conditions to implement the pawn movability mechanics. 
-
-        **NOTE**: For all you deep chess experts: Hitting `en passant <https://de.wikipedia.org/wiki/En_passant>`_ does not need to be implemented.
-        
-        :return: A list of reachable cells this pawn could move into.
+        Pawns can move only forward (towards the opposing army) into an empty cell. If the pawn is still on its
+        starting row, it can also dash forward two cells as long as the path is not blocked.
+        Pawns can only hit diagonally forward. Hitting `en passant <https://de.wikipedia.org/wiki/En_passant>`_ is not implemented.
         """
-        reachable_cells = []
-
-        row, col = self.cell
-
-        if self.is_white():
-
-            if self.board.cell_is_valid_and_empty((row + 1, col)):
-                reachable_cells.append((row + 1, col))
-
-                if row == 1:
-                    if self.board.cell_is_valid_and_empty((row + 2, col)):
-                        reachable_cells.append((row + 2, col))
-
-            # Diagonal schlagen
-            if self.can_hit_on_cell((row + 1, col - 1)):
-                reachable_cells.append((row + 1, col - 1))
-
-            if self.can_hit_on_cell((row + 1, col + 1)):
-                reachable_cells.append((row + 1, col + 1))
-
-        else:
-
-            if self.board.cell_is_valid_and_empty((row - 1, col)):
-                reachable_cells.append((row - 1, col))
-
-                # erster Schritt darf 2 nach vorne
-                if row == 6:
-                    if self.board.cell_is_valid_and_empty((row - 2, col)):
-                        reachable_cells.append((row - 2, col))
-
-            # Diagonal schlagen
-            if self.can_hit_on_cell((row - 1, col - 1)):
-                reachable_cells.append((row - 1, col - 1))
+        board = self.board
+        empty = ~(board.occupancy[0] | board.occupancy[1])
+        pawn = 1 << cell_to_square(self.cell)
 
-            if self.can_hit_on_cell((row - 1, col + 1)):
-                reachable_cells.append((row - 1, col + 1))
-
-        return reachable_cells
+        return pawn_pushes(pawn, self.white, empty) | (self.get_attack_mask() & board.occupancy[not self.white])
 
 
 
 class Rook(Piece):  # Turm
+    """
+    `Rooks <https://de.wikipedia.org/wiki/Turm_(Schach)>`_ move horizontally or vertically until blocked.
+    """
+    kind = ROOK
+
     def __init__(self, board, white):
         super().__init__(board, white)
     # teilt figur wert zu
     def get_value(self):
         return 5
 
-    def get_reachable_cells(self):
-        """
-        **TODO** Implement the movability mechanic for `rooks <https://de.wikipedia.org/wiki/Turm_(Schach)>`_. 
-
-        **NOTE**: Here you do not yet need to consider whether your own King would become checked after a move. This will be taken care of by
-        the :py:meth:`is_king_check <board.Board.is_king_check>` and :py:meth:`get_valid_cells <pieces.Piece.get_valid_cells>` methods.
-
-        **HINT**: Rooks can move only horizontally or vertically. They can move an arbitrary amount of cells until blocked by an own piece
-        or an opposing piece (which they could hit and then being stopped).
-
-        You can call :py:meth:`cell_is_valid_and_empty <board.Board.cell_is_valid_and_empty>`, 
-        :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>` 
-        to check for necessary conditions to implement the rook movability mechanics. 
-
-        :return: A list of reachable cells this rook could move into.
-        """
-        reachable_cells = []
-        row, col = self.cell
-
-        richtungen = [
-            (-1, 0),  # vertikal nach oben
-            (1, 0),  # vertikal nach unten
-            (0, 1),  # horizontal nach rechts
-            (0, -1)  # horizontal nach links
-        ]
-
-        # Durchlauf für jede Richtung und Diagonale
-        for delta_row, delta_col in richtungen:
-
-            # für die jeweilige Richtung und Diagonale das Spielfeld durch
-            for i in range(1, 8):
-                cell = (row + delta_row * i, col + delta_col * i)
-                piece = self.board.get_cell(cell)
-
-                if piece is None:
-                    if self.can_enter_cell(cell):
-                        reachable_cells.append(cell)
-                else:
-                    if self.can_hit_on_cell(cell):
-                        reachable_cells.append(cell)
-                    break
-
-        return reachable_cells
-
 
 class Knight(Piece):  # Springer
+    """
+    `Knights <https://de.wikipedia.org/wiki/Springer_(Schach)>`_ jump two rows and one column or one row and two columns
+    and are not blocked by pieces in between.
+    """
+    kind = KNIGHT
+
     def __init__(self, board, white):
         super().__init__(board, white)
     # teilt figur wert zu
     def get_value(self):
         return 3
 
-    def get_reachable_cells(self):
-        """
-        **TODO** Implement the movability mechanic for `knights <https://de.wikipedia.org/wiki/Springer_(Schach)>`_. 
-
-        **NOTE**: Here you do not yet need to consider whether your own King would become checked after a move. This will be taken care of by
-        the :py:meth:`is_king_check <board.Board.is_king_check>` and :py:meth:`get_valid_cells <pieces.Piece.get_valid_cells>` methods.
-
-        **HINT**: Knights can move in a special pattern. They can move two rows up or down and then one column left or right. Alternatively, they can
-        move one row up or down and then two columns left or right. They are not blocked by pieces in between. 
-
-        You can call :py:meth:`cell_is_valid_and_empty <board.Board.cell_is_valid_and_empty>`, 
-        :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>` 
-        to check for necessary conditions to implement the rook movability mechanics. 
-
-        :return: A list of reachable cells this knight could move into.
-        """
-        row, col = self.cell
-        
-        reachable_cell = [
-            # 2 Reihen nach oben und rechts
-            (row+2, col +1),
-            # 2 Reihen anch oben und links
-            (row+2, col -1),
-            # eine Reihe nach oben und 2 rechts
-            (row+1, col+2),
-            # eine Reihe nach oben und 2 links
-            (row+1, col-2),
-            # eine Reihe nach unten und 2 rechts
-            (row-1,col+2),
-            # eine Reihe nach unten und 2 links
-            (row-1,col-2),
-            # 2 Reihen nach unten und rechts
-            (row-2, col+1),
-            # 2 Reihen nach unten und links
-            (row-2, col-1)
-        ]
-        # gefilterte Liste reachable_cells wird zurückgegeben -> Figur kann auch schlagen 
-        return [ cell for cell in reachable_cell if self.can_enter_cell(cell) or self.can_hit_on_cell(cell) ]
-
 
 class Bishop(Piece):  # Läufer
+    """
+    `Bishops <https://de.wikipedia.org/wiki/L%C3%A4ufer_(Schach)>`_ move diagonally until blocked.
+    """
+    kind = BISHOP
+
     def __init__(self, board, white):
         super().__init__(board, white)
     # teilt figur wert zu
     def get_value(self):
         return 3
 
-    def get_reachable_cells(self):
-        """
-        **TODO** Implement the movability mechanic for `bishop <https://de.wikipedia.org/wiki/L%C3%A4ufer_(Schach)>`_. 
-
-        **NOTE**: Here you do not yet need to consider whether your own King would become checked after a move. This will be taken care of by
-        the :py:meth:`is_king_check <board.Board.is_king_check>` and :py:meth:`get_valid_cells <pieces.Piece.get_valid_cells>` methods.
-
-        **HINT**: Bishops can move diagonally an arbitrary amount of cells until blocked.
-
-        You can call :py:meth:`cell_is_valid_and_empty <board.Board.cell_is_valid_and_empty>`, 
-        :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>` 
-        to check for necessary conditions to implement the rook movability mechanics. 
-
-        :return: A list of reachable cells this bishop could move into.
-        """
-        reachable_cells = []
-        row, col = self.cell
-
-        richtungen = [
-            (-1, 1),  # diagonal rechts oben
-            (-1, -1),  # diagonal links oben
-            (1, 1),  # diagonal rechts unten
-            (1, -1),  # diagonal links unten
-        ]
-
-        # Durchlauf für jede Richtung und Diagonale
-        for delta_row, delta_col in richtungen:
-
-            # für die jeweilige Richtung und Diagonale das Spielfeld durch
-            for i in range(1, 8):
-                cell = (row + delta_row * i, col + delta_col * i)
-                piece = self.board.get_cell(cell)
-
-                if piece is None:
-                    if self.can_enter_cell(cell):
-                        reachable_cells.append(cell)
-                else:
-                    if self.can_hit_on_cell(cell):
-                        reachable_cells.append(cell)
-                    break
-
-        return reachable_cells
-        
-
 
 class Queen(Piece):  # Königin
+    """
+    The `queen <https://de.wikipedia.org/wiki/Dame_(Schach)>`_ combines the movability of rooks and bishops.
+    """
+    kind = QUEEN
+
     def __init__(self, board, white):
         super().__init__(board, white)
     # teilt figur wert zu
     def get_value(self):
         return 9
 
-    def get_reachable_cells(self):
-        """
-        **TODO** Implement the movability mechanic for the `queen <https://de.wikipedia.org/wiki/Dame_(Schach)>`_. 
-
-        **NOTE**: Here you do not yet need to consider whether your own King would become checked after a move. This will be taken care of by
-        the :py:meth:`is_king_check <board.Board.is_king_check>` and :py:meth:`get_valid_cells <pieces.Piece.get_valid_cells>` methods.
-
-        **HINT**: Queens can move horizontally, vertically and diagonally an arbitrary amount of cells until blocked. They combine the movability
-        of rooks and bishops. 
-
-        You can call :py:meth:`cell_is_valid_and_empty <board.Board.cell_is_valid_and_empty>`, 
-        :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>` 
-        to check for necessary conditions to implement the rook movability mechanics. 
-
-        :return: A list of reachable cells this queen could move into.
-        """
-
-        reachable_cells = []
-        row, col = self.cell
-
-        richtungen = [
-            (-1, 1),  # diagonal rechts oben
-            (-1, -1),  # diagonal links oben
-            (1, 1),  # diagonal rechts unten
-            (1, -1),  # diagonal links unten
-            (-1, 0),  # vertikal nach oben
-            (1, 0),  # vertikal nach unten
-            (0, 1),  # horizontal nach rechts
-            (0, -1)  # horizontal nach links
-        ]
-
-        # Durchlauf für jede Richtung und Diagonale
-        for delta_row, delta_col in richtungen:
-
-            # für die jeweilige Richtung und Diagonale das Spielfeld durch
-            for i in range(1, 8):
-                cell = (row + delta_row * i, col + delta_col * i)
-                piece = self.board.get_cell(cell)
-
-                if piece is None:
-                    if self.can_enter_cell(cell):
-                        reachable_cells.append(cell)
-                else:
-                    if self.can_hit_on_cell(cell):
-                        reachable_cells.append(cell)
-                    break
-
-        return reachable_cells
 
 class King(Piece):  # König
+    """
+    The `king <https://de.wikipedia.org/wiki/K%C3%B6nig_(Schach)>`_ moves one cell in any direction.
+    """
+    kind = KING
+
     def __init__(self, board, white):
         super().__init__(board, white)
 
@@ -452,36 +272,3 @@ class King(Piece):  # König
     def get_value(self):
         # sys.maxsize war zu viel: Subtraktion im Board funktioniert nicht mehr
         return 1e6
-
-    def get_reachable_cells(self):
-        """
-        **TODO** Implement the movability mechanic for the `king <https://de.wikipedia.org/wiki/K%C3%B6nig_(Schach)>`_. 
-
-        **NOTE**: Here you do not yet need to consider whether your own King would become checked after a move. This will be taken care of by
-        the :py:meth:`is_king_check <board.Board.is_king_check>` and :py:meth:`get_valid_cells <pieces.Piece.get_valid_cells>` methods.
-
-        **HINT**: Kings can move horizontally, vertically and diagonally but only one piece at a time.
-
-        You can call :py:meth:`cell_is_valid_and_empty <board.Board.cell_is_valid_and_empty>`, 
-        :py:meth:`can_hit_on_cell <pieces.Piece.can_hit_on_cell>` and :py:meth:`can_enter_cell <pieces.Piece.can_enter_cell>` 
-        to check for necessary conditions to implement the rook movability mechanics. 
-
-        :return: A list of reachable cells this king could move into.
-        """
-
-        row, col = self.cell 
-
-        possible_reachable_cells = [
-            (row - 1, col), # Links
-            (row + 1, col), # Rechts
-            (row, col + 1), # Oben
-            (row, col - 1), # Unten
-            (row - 1, col - 1), # Links Unten
-            (row + 1, col - 1), # Rechts Unten
-            (row - 1, col + 1), # Links Oben
-            (row + 1, col + 1), # Rechts Oben
-        ]
-
-        reachable_cells = [ cell for cell in possible_reachable_cells if self.can_enter_cell(cell) ]
-
-        return reachable_cells
\ No newline at end of file
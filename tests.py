@@ -1,14 +1,33 @@
 import unittest
+import io
 import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
 from unittest_prettify.colorize import (
     colorize,
     RED,
 )
-from board import Board, InvalidRowException, InvalidColumnException
+from board import Board, InvalidRowException, InvalidColumnException, PACKED_SIZE
 from pieces import Pawn, Queen, Pawn, Rook, Knight, Bishop, King
 from util import cell_to_string, map_piece_to_character, map_piece_to_fullname
-
-from engine import evaluate_all_possible_moves, MinMaxArg
+from bitboard import piece_attacks, mask_to_cells
+from attacks import attacks_from
+
+import engine
+from engine import evaluate_all_possible_moves, MinMaxArg, Search, CancellationToken, suggest_move_iterative, BackgroundSearch
+from transposition import TranspositionTable, SharedTranspositionTable, EXACT, LOWER
+import perft
+import benchmark
+import instrumentation
+import parallel
+import uci
+import analyze
+import corpus
+import analysis_store
+from analysis_store import AnalysisStore
 
 
 def iterate_pieces(board):
@@ -198,6 +217,46 @@ class TestBoard(unittest.TestCase):
 
         self.assertFalse(self.board.is_valid_cell((row, col)), f"Should not be able to hit on ({row}, {col}) as it is not a valid cell!")
 
+  @colorize(color=RED)
+  def test_A09_bitboards_follow_set_cell(self):
+    """board.bitboards and board.occupancy must always describe the same configuration as board.cells"""
+    self.board.load_from_disk("tests/random1.board")
+
+    piece = self.board.get_cell((3, 3))
+    self.board.set_cell((5, 3), piece)
+    self.board.set_cell((0, 7), None)
+    self.board.set_cell((7, 7), Queen(self.board, True))
+
+    for white in [True, False]:
+      occupancy = 0
+      for kind, mask in enumerate(self.board.bitboards[white]):
+        expected = 0
+        for piece in iterate_pieces(self.board):
+          if piece.white == white and piece.kind == kind:
+            expected |= 1 << (piece.cell[0] * 8 + piece.cell[1])
+
+        self.assertEqual(mask, expected, "bitboards must match the pieces placed on the board")
+        occupancy |= mask
+
+      self.assertEqual(self.board.occupancy[white], occupancy, "occupancy must match the pieces placed on the board")
+
+  @colorize(color=RED)
+  def test_A10_zobrist_hash(self):
+    """board.hash() must only depend on the configuration, not on how it was reached"""
+    self.board.load_from_disk("tests/random1.board")
+    beforeHash = self.board.hash()
+
+    piece = self.board.get_cell((4, 2))
+    self.board.set_cell((5, 3), piece)
+    self.assertNotEqual(beforeHash, self.board.hash(), "board.hash() must change when a piece moves")
+
+    other = Board()
+    other.load_from_disk("tests/random1.board")
+    other.set_cell((5, 3), other.get_cell((4, 2)))
+    self.assertEqual(other.hash(), self.board.hash(), "board.hash() must be equal for equal configurations")
+
+    self.assertNotEqual(self.board.hash(True), self.board.hash(False), "board.hash() must respect the side to move")
+
   # ---------------------------------------------------------------------------
   # Phase B – Figurenlogik, König & Evaluation
   # ---------------------------------------------------------------------------
@@ -251,6 +310,19 @@ class TestBoard(unittest.TestCase):
           
           self.fail(f"Movement of the {map_piece_to_fullname(piece)} wrongly implemented!")
 
+  @colorize(color=RED) 
+  def test_B01b_attack_tables(self):
+    """The precomputed attack tables must match the attacks calculated by shifting bitboards"""
+    for configuration in ["random1.board", "random2.board", "queen.board", "knight.board"]:
+      self.board.load_from_disk("tests/" + configuration)
+      occupied = self.board.occupancy[0] | self.board.occupancy[1]
+
+      for kind in range(6):
+        for white in [True, False]:
+          for square in range(64):
+            self.assertEqual(attacks_from(kind, square, white, occupied), piece_attacks(kind, 1 << square, white, occupied),
+                             f"Attack table of piece kind {kind} wrong on square {square} in {configuration}")
+
   @colorize(color=RED) 
   def test_B02_iterate_pieces_empty_board(self):
     self.board.clear_board()
@@ -337,6 +409,21 @@ class TestBoard(unittest.TestCase):
     self.assertTrue(self.board.is_king_check(True), "is_king_check does not properly identify king being in check!")
     self.assertTrue(self.board.is_king_check(False), "is_king_check does not properly identify king being in check!")
 
+  @colorize(color=RED) 
+  def test_B05b_is_square_attacked(self):
+    """board.is_square_attacked() looks outward from the square and must agree with the attacks of all pieces"""
+    for configuration in ["random1.board", "random2.board", "pawn.board", "king.board"]:
+      self.board.load_from_disk("tests/" + configuration)
+
+      for white in [True, False]:
+        attacked = self.board.get_attacked_mask(white)
+        for square in range(64):
+          expected = (attacked >> square) & 1 == 1
+          self.assertEqual(self.board.is_square_attacked(square, white), expected,
+                           f"is_square_attacked wrong for square {square} in {configuration}")
+          self.assertEqual(self.board.get_attackers_mask(square, white) != 0, expected,
+                           f"get_attackers_mask wrong for square {square} in {configuration}")
+
   @colorize(color=RED) 
   def test_B06_evaluate(self):
     self.board.reset()
@@ -369,6 +456,23 @@ class TestBoard(unittest.TestCase):
     
     self.assertLess(self.board.evaluate(), 0, msg="Evaluate should return a negative value if black is dominanting.")
 
+  @colorize(color=RED) 
+  def test_B06b_evaluate_rich(self):
+    board = Board(rich_evaluation=True)
+    board.reset()
+    self.assertAlmostEqual(board.evaluate(), 0, msg="The rich evaluation should return 0 on the default board configuration.")
+
+    board.load_from_memory(
+      """. . . . k . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . . . . . .
+         P P P P P P P P
+         R N B Q K B N R""")
+    self.assertGreater(board.evaluate(), 0, msg="The rich evaluation should return a positive value if white is dominanting.")
+
   @colorize(color=RED) 
   def test_B07_get_valid_moves_leaves_board_intact(self):
     # Load a configuration from disk
@@ -385,6 +489,189 @@ class TestBoard(unittest.TestCase):
       # Now make sure the board configuration did not change
       self.assertEqual(beforeHash, self.board.hash(), "piece.get_valid_cells must not alter board configuration after its return")
 
+  @colorize(color=RED) 
+  def test_B08_make_unmake_move_leaves_board_intact(self):
+    self.board.load_from_disk("tests/random1.board")
+
+    def snapshot(board):
+      return (board.hash(), str(board), [list(masks) for masks in board.bitboards], list(board.occupancy),
+              [(piece, piece.cell) for piece in iterate_pieces(board)])
+
+    def walk(white, depth):
+      before = snapshot(self.board)
+      for piece in list(self.board.iterate_cells_with_pieces(white)):
+        for cell in piece.get_valid_cells():
+          expected = self.board.evaluate_move(piece, cell)
+          self.board.make_move(piece, cell)
+          self.assertEqual(expected, self.board.evaluate(), "evaluate_move must predict the evaluation after the move")
+
+          # The incrementally updated hash must match the one of a freshly loaded board
+          fresh = Board()
+          fresh.load_from_memory(str(self.board))
+          self.assertEqual(fresh.hash(), self.board.hash(), "make_move must update the hash")
+          self.assertEqual(fresh.bitboards, self.board.bitboards, "make_move must update the bitboards")
+          self.assertEqual(fresh.evaluation, self.board.evaluation, "make_move must update the evaluation")
+          self.assertEqual(fresh.king_squares, self.board.king_squares, "make_move must update the king squares")
+
+          if depth > 1:
+            walk(not white, depth - 1)
+
+          self.board.unmake_move()
+          self.assertEqual(before, snapshot(self.board), "unmake_move must restore the board configuration")
+
+    walk(True, 2)
+    self.assertEqual(self.board.undo_stack, [], "every make_move must be taken back")
+
+  @colorize(color=RED) 
+  def test_B09_valid_moves_without_trial(self):
+    """board.get_valid_mask() must agree with trying every move on the board, also in check and with pinned pieces"""
+    # king.board is left out: with two kings per color "in check" is not well defined there
+    configurations = ["queen.board", "knight.board", "bishop.board", "rook.board", "pawn.board", "random1.board", "random2.board"]
+    positions = [open("tests/" + configuration).read() for configuration in configurations]
+
+    # Pinned bishop and rook, the pawn gives check
+    positions.append(
+      """. . . . k . . .
+         . . . . r . . .
+         . . . . . . . .
+         . . . . B . . q
+         . . . . . . . .
+         . . . p . . . .
+         . . . . K R . .
+         . . . . . . . .""")
+
+    # Double check by knight and rook
+    positions.append(
+      """. . . . k . . .
+         . . . . r . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . n . . . .
+         . . . . . Q . .
+         . . . . K . . .""")
+
+    board = Board(verify_moves=True)
+
+    def walk(white, depth):
+      for piece, mask in board.get_valid_moves(white):
+        for cell in piece.get_valid_cells():
+          board.make_move(piece, cell)
+          if depth > 1:
+            walk(not white, depth - 1)
+          board.unmake_move()
+
+    for position in positions:
+      for white in [True, False]:
+        board.load_from_memory(position)
+        walk(white, 2)
+
+  @colorize(color=RED)
+  def test_B11_static_exchange(self):
+    self.board.load_from_memory(
+      """. . . r . . . k
+         . . . . . . . .
+         . . . . . . . .
+         . . . p . . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . R . . . .
+         K . . R . . . .""")
+    self.assertEqual(self.board.static_exchange((1, 3), (4, 3)), 1, "the second rook behind the first one must join the exchange")
+    self.board.set_cell((0, 3), None)
+    self.assertEqual(self.board.static_exchange((1, 3), (4, 3)), -4, "without the second rook the pawn is defended")
+    self.assertEqual(self.board.undo_stack, [], "static_exchange must not move any piece")
+
+    # Compare against playing the exchange on the board for every hit in the fixtures
+    for configuration in ["queen.board", "knight.board", "bishop.board", "rook.board", "pawn.board", "random1.board", "random2.board"]:
+      self.board.load_from_disk("tests/" + configuration)
+      beforeHash = self.board.hash()
+      for white in [True, False]:
+        for piece, mask in self.board.get_valid_moves(white):
+          for cell in mask_to_cells(mask & self.board.occupancy[not white]):
+            self.assertEqual(self.board.static_exchange(piece.cell, cell), self.board.static_exchange_by_trial(piece.cell, cell),
+                             f"static exchange of {map_piece_to_fullname(piece)} {cell_to_string(piece.cell)}x{cell_to_string(cell)} in {configuration}")
+      self.assertEqual(beforeHash, self.board.hash(), "static_exchange must not alter board configuration")
+
+  @colorize(color=RED)
+  def test_B10_perft(self):
+    """The number of leaf nodes of the game tree must match the stored counts of perft.EXPECTED_COUNTS"""
+    for (position, white), counts in perft.EXPECTED_COUNTS.items():
+      board = perft.load_position(position)
+      for depth, expected in enumerate(counts[:3], 1):
+        self.assertEqual(perft.perft(board, depth, white), expected, f"Wrong perft({depth}) of {position}, WHITE={white}")
+
+    board = perft.load_position(perft.START)
+    counts = perft.divide(board, 2)
+    self.assertEqual(len(counts), 20, "perft.divide() must list every root move")
+    self.assertEqual(sum(counts.values()), 400, "perft.divide() must sum up to perft()")
+    self.assertEqual(len(board.undo_stack), 0, "perft must leave the board unchanged")
+
+  @colorize(color=RED)
+  def test_B12_fen_and_packed(self):
+    self.board.reset()
+    self.assertEqual(self.board.to_fen(), "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w")
+    self.assertEqual(len(self.board.to_packed()), PACKED_SIZE)
+
+    for configuration in ["queen.board", "knight.board", "bishop.board", "rook.board", "pawn.board", "random1.board", "random2.board"]:
+      self.board.load_from_disk("tests/" + configuration)
+      for white in [True, False]:
+        other = Board()
+        self.assertEqual(other.load_fen(self.board.to_fen(white)), white, f"the color to move must survive to_fen in {configuration}")
+        self.assertEqual(str(other), str(self.board), f"load_fen must restore {configuration}")
+        self.assertEqual(other.hash(), self.board.hash())
+
+        other = Board()
+        self.assertEqual(other.load_packed(self.board.to_packed(white)), white, f"the color to move must survive to_packed in {configuration}")
+        self.assertEqual(str(other), str(self.board), f"load_packed must restore {configuration}")
+
+    # Full FEN strings and single empty cells written as "." are understood as well
+    self.assertFalse(self.board.load_fen("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"))
+    self.assertEqual(self.board.to_fen(False), "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b")
+    self.assertTrue(self.board.load_fen("k......./8/8/8/8/8/8/7K"))
+    self.assertEqual(self.board.to_fen(), "k7/8/8/8/8/8/8/7K w")
+
+    for invalid in ["", "8/8/8/8/8/8/8", "9/8/8/8/8/8/8/8", "7/8/8/8/8/8/8/8", "x7/8/8/8/8/8/8/8", "08/8/8/8/8/8/8/8", "8/8/8/8/8/8/8/8 x"]:
+      with self.assertRaises(ValueError, msg=f"load_fen must reject {invalid!r}"):
+        self.board.load_fen(invalid)
+
+    for invalid in [bytes([8] + [0] * 31 + [1]), bytes([7] + [0] * 31 + [1]), bytes([0xf0] + [0] * 31 + [0]), bytes(32) + bytes([2])]:
+      with self.assertRaises(ValueError, msg=f"load_packed must reject {invalid!r}"):
+        self.board.load_packed(invalid)
+
+  @colorize(color=RED)
+  def test_B13_corpus(self):
+    configurations = ["queen.board", "knight.board", "bishop.board", "rook.board", "pawn.board", "random1.board", "random2.board"]
+    positions = []
+    for number, configuration in enumerate(configurations):
+      self.board.load_from_disk("tests/" + configuration)
+      positions.append((configuration, self.board.to_packed(number % 2 == 0)))
+
+    with tempfile.TemporaryDirectory() as directory:
+      fname = os.path.join(directory, "positions.corpus")
+      self.assertEqual(corpus.write_corpus(fname, iter(positions)), len(positions))
+      self.assertEqual(os.path.getsize(fname), corpus.HEADER_SIZE + len(positions) * PACKED_SIZE, "the records must have a fixed size")
+
+      with corpus.Corpus(fname) as positionCorpus:
+        self.assertEqual(len(positionCorpus), len(positions))
+        self.assertEqual(list(positionCorpus), positions)
+        for number in reversed(range(len(positions))):
+          self.assertEqual(positionCorpus.name(number), configurations[number])
+          self.assertEqual(self.board.load_from_corpus(positionCorpus, number), number % 2 == 0)
+          other = Board()
+          other.load_from_disk("tests/" + configurations[number])
+          self.assertEqual(str(self.board), str(other), f"load_from_corpus must restore {configurations[number]}")
+        with self.assertRaises(IndexError):
+          positionCorpus[len(positions)]
+
+      # Analysis reads corpus files directly
+      self.assertEqual([name for name, _ in analyze.read_positions([fname])], configurations)
+
+      with open(fname, "ab") as f:
+        f.write(b"x")
+      with self.assertRaises(ValueError, msg="a corpus with a partial record must be rejected"):
+        corpus.Corpus(fname)
+
   # ---------------------------------------------------------------------------
   # Phase C – Engine / MinMax-Einbindung
   # ---------------------------------------------------------------------------
@@ -442,6 +729,540 @@ class TestBoard(unittest.TestCase):
     moves = evaluate_all_possible_moves(self.board, minMaxArg=MinMaxArg(playAsWhite=True), maximumNumberOfMoves=6)
     self.assertEqual(len(moves), 6, "evaluate_all_possible_moves should respect requested amount of moves")
 
+  @colorize(color=RED) 
+  def test_C05_alpha_beta_matches_min_max(self):
+    for white in [True, False]:
+      results = []
+      for alphaBeta in [False, True]:
+        self.board.load_from_memory(
+          """. . . . k . . .
+             . . . r . . . .
+             . . . . . . . .
+             . . . . n . . .
+             . . . . . . . .
+             . . Q . . . . .
+             . . . . . . . .
+             . . . . K . . .""")
+        beforeHash = self.board.hash()
+
+        engine.transposition_table.clear()
+        search = Search(alphaBeta=alphaBeta, lateMoveReductions=False, nullMovePruning=False)
+        minMaxArg = MinMaxArg(depth=3, playAsWhite=white, search=search)
+        move = engine.suggest_move(self.board, minMaxArg)
+        self.assertEqual(beforeHash, self.board.hash(), "the search must not alter board configuration after its return")
+        self.assertEqual(self.board.undo_stack, [], "the search must take back every move it made")
+
+        results.append((move.piece.cell, move.cell, move.score, minMaxArg.search.nodes))
+
+      self.assertEqual(results[0][:3], results[1][:3], "alpha-beta must find the same best move as plain mini-max")
+      self.assertLessEqual(results[1][3], results[0][3], "alpha-beta must not visit more nodes than plain mini-max")
+
+  @colorize(color=RED) 
+  def test_C06_iterative_deepening_limits(self):
+    self.board.load_from_memory(
+      """. . . . k . . .
+         . . . r . . . .
+         . . . . . . . .
+         . . . . n . . .
+         . . . . . . . .
+         . . Q . . . . .
+         . . . . . . . .
+         . . . . K . . .""")
+    beforeHash = self.board.hash()
+
+    depths = []
+    move, search = suggest_move_iterative(self.board, maxDepth=3, timeLimit=None, callback=lambda depth, move, search: depths.append(depth))
+    self.assertEqual(depths, [1, 2, 3], "iterative deepening should complete every depth without limits")
+    self.assertEqual(search.depth, 3)
+    self.assertIsNotNone(move.piece)
+
+    token = CancellationToken()
+    token.cancel()
+    move, search = suggest_move_iterative(self.board, maxDepth=3, timeLimit=None, token=token)
+    self.assertEqual(search.depth, 1, "a cancelled search should stop after the first iteration")
+    self.assertIsNotNone(move.piece, "a cancelled search should still return a move")
+
+    move, search = suggest_move_iterative(self.board, maxDepth=10, timeLimit=None, nodeLimit=20)
+    self.assertLess(search.depth, 10, "the node limit should stop the search")
+    self.assertIsNotNone(move.piece, "a stopped search should still return a move")
+
+    self.assertEqual(beforeHash, self.board.hash(), "a stopped search must not alter board configuration after its return")
+
+
+  @colorize(color=RED)
+  def test_C07_benchmark(self):
+    corpus = benchmark.generate_corpus(size=3)
+    self.assertEqual(corpus, benchmark.generate_corpus(size=3), "the generated corpus must always be the same")
+
+    results = benchmark.run(corpus, depth=2, repeat=1, out=None)
+    self.assertEqual(len(results["positions"]), 3)
+    for result in results["positions"]:
+      self.assertIsNotNone(result["move"])
+      self.assertGreater(result["nodes"], 0)
+      self.assertGreater(result["peak_memory"], 0)
+
+    output = io.StringIO()
+    baseline = benchmark.without_timings(results)
+    self.assertNotIn("nps", baseline["total"], "the committed baseline must not depend on the machine")
+    self.assertTrue(benchmark.compare(results, baseline, out=output))
+    larger = json.loads(json.dumps(results))
+    larger["total"]["nodes"] *= 2
+    self.assertFalse(benchmark.compare(larger, baseline, threshold=10, out=output), "doubled nodes must be a regression")
+
+    self.assertTrue(benchmark.compare_throughput(results, results, out=output))
+    slower = json.loads(json.dumps(results))
+    slower["total"]["nps"] /= 2
+    self.assertFalse(benchmark.compare_throughput(slower, results, threshold=10, out=output), "halved nodes/s must be a regression")
+
+  @colorize(color=RED)
+  def test_C08_instrumentation(self):
+    from pieces import Piece
+    original = Piece.__dict__["get_valid_cells"]
+
+    self.board.reset()
+    engine.transposition_table.clear()
+    with instrumentation.instrumented() as report:
+      engine.suggest_move(self.board, MinMaxArg(depth=2, search=Search(alphaBeta=False)))
+      self.board.get_cell((1, 4)).get_valid_cells()
+
+    self.assertGreater(report.calls["Board.evaluate_move"], 0)
+    self.assertGreater(report.calls["minMax_cached.miss"], 0)
+    self.assertEqual(report.calls["Piece.get_valid_cells"], 1)
+    self.assertIn("Board.evaluate_move", str(report))
+
+    self.assertFalse(instrumentation.enabled)
+    self.assertIs(Piece.__dict__["get_valid_cells"], original, "disabling must restore the original functions")
+    self.assertFalse(hasattr(engine.minMax_cached, "__wrapped__"), "disabling must restore the original functions")
+
+  @colorize(color=RED)
+  def test_C09_move_ordering(self):
+    self.board.load_from_memory(
+      """. . . . k . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . r . q . .
+         . . . . P . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . . K . . N""")
+    arg = MinMaxArg(depth=2, playAsWhite=True)
+    pawn = self.board.get_cell((3, 4))
+    knight = self.board.get_cell((0, 7))
+    king = self.board.get_cell((0, 4))
+
+    moves = [engine.Move(piece, cell, 0) for piece, mask in self.board.get_valid_moves(True) for cell in mask_to_cells(mask)]
+    engine.record_cutoff(engine.Move(king, (1, 4), 0), arg)
+    engine.order_moves(self.board, moves, arg, hashMove=engine.move_to_squares(engine.Move(knight, (2, 6), 0)))
+
+    order = [(move.piece, move.cell) for move in moves]
+    self.assertEqual(order[0], (knight, (2, 6)), "the hash move must be searched first")
+    self.assertEqual(order[1], (pawn, (4, 5)), "the queen is the most valuable victim")
+    self.assertEqual(order[2], (pawn, (4, 3)))
+    self.assertEqual(order[3], (king, (1, 4)), "the killer move must follow the hits")
+
+  @colorize(color=RED)
+  def test_C10_full_width_search(self):
+    self.board.load_from_disk("tests/random1.board")
+    beforeHash = self.board.hash()
+
+    moves = evaluate_all_possible_moves(self.board, MinMaxArg(search=Search(beamWidth=None)), None)
+    self.assertEqual(len(moves), perft.perft(self.board, 1), "without a beam width all moves must be considered")
+
+    nodes = []
+    for options in [{}, dict(beamWidth=None, lateMoveReductions=False, nullMovePruning=False), dict(beamWidth=None)]:
+      engine.transposition_table.clear()
+      search = Search(**options)
+      move = engine.suggest_move(self.board, MinMaxArg(depth=4, search=search))
+      self.assertIsNotNone(move.piece)
+      self.assertEqual(beforeHash, self.board.hash(), "the search must not alter board configuration after its return")
+      nodes.append(search.nodes)
+
+    self.assertLess(nodes[0], nodes[2], "the beam search must visit fewer nodes than the full width search")
+    self.assertLess(nodes[2], nodes[1], "reductions and null move pruning must save nodes")
+
+    # Without clearing the table in between, a search must not take the results of a search with other settings
+    sparse = """. . . . k . . .
+                . . . r . . . .
+                . . . . . . . .
+                . . . . . . . .
+                . . . . . . . .
+                . . . . . . . .
+                . . Q . . . . .
+                . . . . K . . ."""
+    fast, rich = Board(), Board(rich_evaluation=True)
+    fast.load_from_memory(sparse)
+    rich.load_from_memory(sparse)
+    for first, second, board in [(dict(), dict(beamWidth=None), self.board), (dict(alphaBeta=False), dict(), self.board), (dict(), dict(), rich)]:
+      engine.transposition_table.clear()
+      expected = engine.suggest_move(board, MinMaxArg(depth=2, search=Search(**second)))
+      engine.transposition_table.clear()
+      engine.suggest_move(fast if board is rich else board, MinMaxArg(depth=2, search=Search(**first)))
+      search = Search(**second)
+      move = engine.suggest_move(board, MinMaxArg(depth=2, search=search))
+      self.assertEqual((move.piece.cell, move.cell, move.score), (expected.piece.cell, expected.cell, expected.score))
+      self.assertGreater(search.nodes, 1, "the position must be searched again")
+
+  @colorize(color=RED)
+  def test_C11_quiescence(self):
+    self.board.load_from_memory(
+      """. . . . . . . k
+         . . . . . . . .
+         . . . . p . . .
+         . . . p . . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . . . . . .
+         K . . Q . . . .""")
+    queen = self.board.get_cell((0, 3))
+    self.assertEqual(self.board.static_exchange((0, 3), (4, 3)), -8, "the queen is lost for a pawn")
+
+    engine.transposition_table.clear()
+    move = engine.suggest_move(self.board, MinMaxArg(depth=1, search=Search(quiescence=False)))
+    self.assertEqual((move.piece, move.cell), (queen, (4, 3)), "without quiescence the pawn looks free")
+
+    for alphaBeta in [False, True]:
+      engine.transposition_table.clear()
+      search = Search(alphaBeta=alphaBeta)
+      move = engine.suggest_move(self.board, MinMaxArg(depth=1, search=search))
+      self.assertNotEqual(move.cell, (4, 3), "the quiescence search must see the recapture")
+      self.assertGreater(search.quiescenceNodes, 0)
+      self.assertEqual(self.board.undo_stack, [], "the search must take back every move it made")
+
+    # With quiescence, alpha-beta must still find the same scores as plain mini-max
+    other = Board()
+    white = other.load_fen("r1bk1bnr/1p3pp1/2pp4/P3p2p/P1P1P2q/B1Kn3N/R3BPPR/1N1Q4 b")
+    positions = [("fen", str(other), white)] + benchmark.generate_corpus(size=40, seed=16)
+    for name, configuration, white in positions:
+      self.board.load_from_memory(configuration)
+      results = []
+      for alphaBeta in [False, True]:
+        engine.transposition_table.clear()
+        search = Search(alphaBeta=alphaBeta, lateMoveReductions=False, nullMovePruning=False)
+        move = engine.suggest_move(self.board, MinMaxArg(depth=2, playAsWhite=white, search=search))
+        results.append(move.score)
+
+      self.assertEqual(results[0], results[1], f"alpha-beta with quiescence must match mini-max in {name}")
+
+  @colorize(color=RED)
+  def test_C12_parallel_search(self):
+    self.board.load_from_disk("tests/random1.board")
+    beforeHash = self.board.hash()
+
+    other = Board()
+    other.load_snapshot(self.board.to_snapshot())
+    self.assertEqual(len(self.board.to_snapshot()), 64)
+    self.assertEqual(str(other), str(self.board), "load_snapshot must restore the board configuration")
+    self.assertEqual(other.hash(), self.board.hash())
+
+    results = []
+    for workers in [1, 2]:
+      minMaxArg = MinMaxArg(depth=3)
+      move = parallel.suggest_move_parallel(self.board, minMaxArg, workers=workers, shared=False)
+      self.assertIs(move.piece.board, self.board, "the move must refer to a piece of the searched board")
+      self.assertEqual(beforeHash, self.board.hash(), "the search must not alter board configuration after its return")
+      results.append((move.piece.cell, move.cell, move.score, minMaxArg.search.nodes))
+
+    self.assertEqual(results[0], results[1], "the result must not depend on the number of workers")
+
+    with parallel.create_pool(2) as pool:
+      minMaxArg = MinMaxArg(depth=3)
+      move = parallel.suggest_move_parallel(self.board, minMaxArg, pool=pool)
+      self.assertIs(move.piece.board, self.board)
+      self.assertGreater(minMaxArg.search.nodes, 0)
+      self.assertTrue(any(pool.table.words), "the workers must store into the shared table")
+
+    # The workers must evaluate like the board of the caller
+    rich = Board(rich_evaluation=True)
+    rich.load_from_memory(
+      """. . . . k . . .
+         . . . r . . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . . . . . . .
+         . . Q . . . . .
+         . . . . K . . .""")
+    engine.transposition_table.clear()
+    expected = engine.suggest_move(rich, MinMaxArg(depth=2, search=Search(alphaBeta=False)))
+    move = parallel.suggest_move_parallel(rich, MinMaxArg(depth=2, search=Search(alphaBeta=False)), workers=1, shared=False)
+    self.assertEqual((move.piece.cell, move.cell, move.score), (expected.piece.cell, expected.cell, expected.score),
+                     "the workers must keep the evaluation of the board")
+
+  @colorize(color=RED)
+  def test_C13_background_search(self):
+    self.board.load_from_disk("tests/random1.board")
+    beforeHash = self.board.hash()
+
+    depths = []
+    engine.transposition_table.clear()
+    background = BackgroundSearch(self.board, maxDepth=2, timeLimit=None, callback=lambda depth, squares, score, text, search: depths.append(depth))
+    move, search = background.result(timeout=60)
+    self.assertTrue(background.done())
+    self.assertEqual(depths, [1, 2])
+    self.assertEqual(background.progress[0], 2, "the progress should hold the last completed iteration")
+    self.assertIs(move.piece.board, self.board, "the move must refer to a piece of the searched board")
+    self.assertEqual(beforeHash, self.board.hash(), "the search must not alter the board it was started on")
+
+    engine.transposition_table.clear()
+    expected, _ = suggest_move_iterative(self.board, maxDepth=2, timeLimit=None)
+    self.assertEqual((move.piece.cell, move.cell), (expected.piece.cell, expected.cell), "the background search must find the same move")
+    self.assertEqual(background.progress[1:4], (engine.move_to_squares(move), move.score, str(move)), "the progress should hold a copy of the best move")
+
+    # The copy searched in the background must evaluate like the board it was made from
+    rich = Board(rich_evaluation=True)
+    rich.load_from_disk("tests/random1.board")
+    engine.transposition_table.clear()
+    move, _ = BackgroundSearch(rich, maxDepth=1, timeLimit=None).result(timeout=60)
+    engine.transposition_table.clear()
+    expected, _ = suggest_move_iterative(rich, maxDepth=1, timeLimit=None)
+    self.assertEqual(move.score, expected.score, "the background search must keep the evaluation of the board")
+
+    # Hurrying returns the best move of the last completed iteration
+    background = BackgroundSearch(self.board, maxDepth=50, timeLimit=None)
+    background.hurry()
+    move, search = background.result(timeout=60)
+    self.assertIsNotNone(move.piece)
+    self.assertLess(search.depth, 50)
+
+    # Cancelling discards the result
+    background = BackgroundSearch(self.board, maxDepth=50, timeLimit=None)
+    background.cancel()
+    self.assertTrue(background.cancelled())
+    background.thread.join(timeout=60)
+    self.assertFalse(background.thread.is_alive(), "a cancelled search must stop")
+
+  @colorize(color=RED)
+  def test_C14_uci(self):
+    out = io.StringIO()
+    commands = ["uci", "isready", "position startpos moves e2e4 e7e5", "go depth 2",
+                "position board rnbqkbnr/pppppppp/......../......../....P.../......../PPPP.PPP/RNBQKBNR b", "go nodes 50",
+                "position startpos moves e2e5", "frobnicate", "position fen 8/8/8/8/8/8/8/8 x",
+                "position fen 8/8/8/8/8/8/8/8 w", "go depth 2"]
+    self.assertEqual(uci.main(io.StringIO("\n".join(commands) + "\n"), out), 0)
+
+    lines = out.getvalue().splitlines()
+    self.assertEqual(lines[:3], [f"id name {uci.NAME}", "uciok", "readyok"])
+    bestmoves = [line for line in lines if line.startswith("bestmove")]
+    self.assertEqual(len(bestmoves), 3, "every go command must be answered with a best move")
+    self.assertEqual(bestmoves[2], "bestmove 0000", "without moves there is no best move")
+    self.assertTrue(any(line.startswith("info depth 2 ") and " nps " in line for line in lines))
+    self.assertIn("info string illegal move e2e5", lines)
+    self.assertIn("info string unknown command frobnicate", lines)
+    self.assertTrue(any(line.startswith("info string invalid position") for line in lines))
+    self.assertTrue(any(line.startswith("info depth 1 score mate 0 ") for line in lines), "no moves left must be reported as mate")
+    scores = [int(line.split(" score cp ")[1].split()[0]) for line in lines if " score cp " in line]
+    self.assertTrue(all(abs(score) < 100000 for score in scores), "mate scores must not be given in centipawns")
+
+    # The best move for BLACK must be a move of a BLACK piece
+    board = Board()
+    board.load_from_memory(uci.parse_rows("rnbqkbnr/pppppppp/......../......../....P.../......../PPPP.PPP/RNBQKBNR"))
+    piece, _ = uci.parse_move(board, bestmoves[1].split()[1], False)
+    self.assertFalse(piece.white)
+
+    # The headless engine must not load the UI
+    code = "import sys, uci; sys.exit('ui' in sys.modules or 'pygame' in sys.modules)"
+    self.assertEqual(subprocess.run([sys.executable, "-c", code]).returncode, 0, "uci must not import the UI")
+
+  @colorize(color=RED)
+  def test_C15_batch_analysis(self):
+    with tempfile.TemporaryDirectory() as directory:
+      fname = os.path.join(directory, "positions.txt")
+      with open(fname, "wt") as f:
+        for _, configuration, white in benchmark.generate_corpus(size=6):
+          self.board.load_from_memory(configuration)
+          f.write(self.board.to_fen(white) + "\n")
+        f.write("# a comment\n")
+      output = os.path.join(directory, "results.jsonl")
+
+      # A broken .board file is reported and skipped, like an invalid line
+      broken = os.path.join(directory, "broken.board")
+      with open(broken, "wt") as f:
+        f.write(". . . . k . . .\n. . x . . . . .\n")
+      with self.assertRaisesRegex(ValueError, "'x'"):
+        self.board.load_from_disk(broken)
+
+      self.assertEqual(analyze.main([fname, broken, "tests/random1.board", "--depth", "2", "--workers", "2", "--output", output]), 0)
+      with open(output, "rt") as f:
+        records = [json.loads(line) for line in f]
+      self.assertEqual([record["name"] for record in records], [f"{fname}:{number}" for number in range(1, 7)] + ["tests/random1.board"],
+                       "the records must be written in the order of the input")
+      self.assertTrue(all(record["move"] is not None and record["nodes"] > 0 for record in records))
+
+      # Interrupted in the middle of the fourth record
+      with open(output, "rt") as f:
+        lines = f.readlines()
+      with open(output, "wt") as f:
+        f.write("".join(lines[:3]) + lines[3][:10])
+
+      self.assertEqual(analyze.main([fname, broken, "tests/random1.board", "--depth", "2", "--workers", "2", "--output", output, "--resume"]), 0)
+      with open(output, "rt") as f:
+        resumed = [json.loads(line) for line in f]
+      self.assertEqual([(record["name"], record["move"]) for record in resumed], [(record["name"], record["move"]) for record in records],
+                       "a resumed run must continue after the last complete record")
+
+      self.assertEqual(analyze.main(["tests/random2.board", "--output", output, "--resume"]), 1, "resuming with another input must fail")
+
+def store_in_shared_table(name):
+  table = SharedTranspositionTable(megabytes=1, name=name)
+  entry = table.probe(12345)
+  table.store(54321, 4, -0.5, LOWER, (1, 2))
+  table.close()
+  return entry.score
+
+def store_in_analysis_store(arguments):
+  store, first = arguments
+  for key in range(first, first + 50):
+    store.store(key, 4, "test", key / 10, (key % 64, 0))
+  return store.lookup(first, 4, "test")
+
+class TestTranspositionTable(unittest.TestCase):
+  def setUp(self):
+    self.table = TranspositionTable(megabytes=1)
+
+  @colorize(color=RED)
+  def test_T01_store_and_probe(self):
+    self.assertIsNone(self.table.probe(12345), "probe should not find keys never stored")
+
+    self.table.store(12345, 3, 1.5, EXACT, (12, 28))
+    entry = self.table.probe(12345)
+    self.assertIsNotNone(entry, "probe should find stored keys")
+    self.assertEqual(entry.score, 1.5)
+    self.assertEqual(entry.depth, 3)
+    self.assertEqual(entry.bound, EXACT)
+    self.assertEqual(entry.move, (12, 28))
+
+    self.table.store(0, 0, -2.0, LOWER)
+    entry = self.table.probe(0)
+    self.assertIsNotNone(entry, "probe should find the key 0 (empty board)")
+    self.assertIsNone(entry.move)
+    self.assertEqual(entry.bound, LOWER)
+
+    self.assertEqual(self.table.hits, 2)
+    self.assertEqual(self.table.misses, 1)
+
+  @colorize(color=RED)
+  def test_T02_replacement(self):
+    # Three keys mapping to the same bucket
+    deep, shallow, newest = 7, 7 + (self.table.bucket_mask + 1), 7 + 2 * (self.table.bucket_mask + 1)
+
+    self.table.store(deep, 5, 1.0)
+    self.table.store(shallow, 2, 2.0)
+    self.table.store(newest, 1, 3.0)
+
+    self.assertIsNotNone(self.table.probe(deep), "the deepest result must stay in the depth-preferred entry")
+    self.assertIsNone(self.table.probe(shallow), "the always-replace entry should hold the newest result only")
+    self.assertIsNotNone(self.table.probe(newest), "the always-replace entry should hold the newest result")
+    self.assertEqual(self.table.overwrites, 1)
+    self.assertEqual(self.table.collisions, 1)
+
+  @colorize(color=RED)
+  def test_T03_memory_budget(self):
+    table = TranspositionTable(megabytes=2)
+    used = table.keys.itemsize * len(table.keys) + table.scores.itemsize * len(table.scores) + table.data.itemsize * len(table.data)
+    self.assertLessEqual(used, 2 * 1024 * 1024, "the table must respect its memory budget")
+    self.assertGreater(used, 1024 * 1024, "the table should make use of its memory budget")
+
+  @colorize(color=RED)
+  def test_T04_shared_table(self):
+    table = SharedTranspositionTable(megabytes=1)
+    try:
+      self.assertLessEqual(table.memory.size, 1024 * 1024, "the table must respect its memory budget")
+      table.store(12345, 3, 1.5, EXACT, (12, 28))
+
+      # Another process sees the entries of this one, and the other way round
+      with multiprocessing.Pool(1) as pool:
+        self.assertEqual(pool.apply(store_in_shared_table, (table.name,)), 1.5)
+      entry = table.probe(54321)
+      self.assertIsNotNone(entry, "entries stored by another process must be found")
+      self.assertEqual((entry.score, entry.depth, entry.bound, entry.move), (-0.5, 4, LOWER, (1, 2)))
+
+      # A torn write (only some words of an entry updated) must not be taken for a valid entry
+      slot = (12345 & table.bucket_mask) * 2
+      table.words[slot * 3 + 1] ^= 1
+      self.assertIsNone(table.probe(12345), "an entry whose words do not match its key must not be found")
+
+      table.clear()
+      self.assertIsNone(table.probe(54321))
+    finally:
+      table.close()
+      table.unlink()
+
+
+  @colorize(color=RED)
+  def test_T05_analysis_store(self):
+    with tempfile.TemporaryDirectory() as directory:
+      store = AnalysisStore(os.path.join(directory, "analysis.sqlite"), maxEntries=100, minDepth=3)
+      self.assertIsNone(store.lookup(12345, 3, "test"))
+      store.store(12345, 3, "test", 1.5, (12, 28))
+      store.store(2 ** 64 - 1, 3, "test", -2.0)
+      store.store(777, 2, "test", 0.0)
+      self.assertEqual(store.lookup(12345, 3, "test"), (1.5, (12, 28)))
+      self.assertEqual(store.lookup(2 ** 64 - 1, 3, "test"), (-2.0, None), "keys above 2^63 must be stored as well")
+      self.assertIsNone(store.lookup(12345, 4, "test"), "results are stored per depth")
+      self.assertIsNone(store.lookup(12345, 3, "other"), "results are stored per settings")
+      self.assertIsNone(store.lookup(777, 2, "test"), "results below the minimum depth must not be stored")
+
+      # Several processes writing at the same time
+      with multiprocessing.Pool(2) as pool:
+        results = pool.map(store_in_analysis_store, [(store, 1000), (store, 2000), (store, 3000)])
+      self.assertEqual(results, [(100.0, (40, 0)), (200.0, (16, 0)), (300.0, (56, 0))])
+      self.assertEqual(len(store), 152)
+      store.evict()
+      self.assertLessEqual(len(store), 100, "the store must respect its cap")
+
+      # The least recently used results go first
+      store.clear()
+      for key in range(store.maxEntries):
+        store.store(key, 3, "test", 0.0)
+      store.lookup(0, 3, "test")
+      for key in range(1000, 1000 + analysis_store.EVICT_INTERVAL):
+        store.store(key, 3, "test", 0.0)
+      store.evict()
+      self.assertLessEqual(len(store), store.maxEntries)
+      self.assertIsNotNone(store.lookup(0, 3, "test"), "a recently used result must be kept")
+      self.assertIsNone(store.lookup(1, 3, "test"), "the least recently used result must be removed")
+
+      # The engine takes searched positions from the store
+      store.clear()
+      board = Board()
+      board.load_from_disk("tests/random1.board")
+      try:
+        engine.analysis_store = store
+        for alphaBeta in [False, True]:
+          searches = []
+          for _ in range(2):
+            engine.transposition_table.clear()
+            search = Search(alphaBeta=alphaBeta)
+            move = engine.suggest_move(board, MinMaxArg(depth=3, search=search))
+            searches.append((move.piece.cell, move.cell, move.score, search.nodes))
+          self.assertEqual(searches[0][:3], searches[1][:3], "a stored result must equal the searched one")
+          self.assertGreater(searches[0][3], 0)
+          self.assertEqual(searches[1][3], 0, "a stored position must not be searched again")
+
+        # Results of another evaluation, or of an older version, must not be taken
+        sparse = ". . . . k . . .\n. . . r . . . .\n" + ". . . . . . . .\n" * 4 + ". . Q . . . . .\n. . . . K . . ."
+        board.load_from_memory(sparse)
+        engine.suggest_move(board, MinMaxArg(depth=3))
+        rich = Board(rich_evaluation=True)
+        rich.load_from_memory(sparse)
+        engine.transposition_table.clear()
+        search = Search()
+        engine.suggest_move(rich, MinMaxArg(depth=3, search=search))
+        self.assertGreater(search.nodes, 0, "a changed evaluation must miss the stored results")
+
+        version = analysis_store.EVAL_VERSION
+        try:
+          analysis_store.EVAL_VERSION += 1
+          engine.transposition_table.clear()
+          search = Search()
+          engine.suggest_move(board, MinMaxArg(depth=3, search=search))
+          self.assertGreater(search.nodes, 0, "a new version must miss the results of the old one")
+        finally:
+          analysis_store.EVAL_VERSION = version
+      finally:
+        engine.analysis_store = None
+      store.close()
+
 
 if __name__ == "__main__":
   unittest.main()
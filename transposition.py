@@ -0,0 +1,298 @@
+"""
+Fixed-size transposition table for the search.
+
+The table is organized in buckets of two entries. The first entry of a bucket is *depth-preferred*:
+it is only replaced by a search of at least the same depth. The second one is *always-replace* and takes
+whatever does not fit into the first one. This keeps deep (expensive) results around while still caching
+the most recent shallow ones.
+
+Entries live in flat arrays instead of python objects, so the memory used is fixed by the budget given
+to the constructor and does not grow during a game.
+
+:py:class:`SharedTranspositionTable` keeps the entries in a shared memory block instead, so several processes
+can probe and store into the same table.
+"""
+import struct
+from array import array
+from multiprocessing import shared_memory
+
+# Bound types of a stored score
+EXACT, LOWER, UPPER = range(3)
+
+# Bytes per entry: key (8), score (8) and packed data (4)
+ENTRY_SIZE = 20
+
+# Bytes per entry of the shared table: key ^ score ^ data (8), score (8) and data (8)
+SHARED_ENTRY_SIZE = 24
+
+# Packed data word layout
+_FROM_BITS = 0
+_TO_BITS = 6
+_HAS_MOVE = 1 << 12
+_BOUND_BITS = 13
+_USED = 1 << 15
+_DEPTH_BITS = 16
+
+
+class TranspositionEntry:
+    """
+    Result of a successful :py:meth:`TranspositionTable.probe`.
+    The move is a (from_square, to_square) tuple or None.
+    """
+
+    __slots__ = ("score", "depth", "bound", "move")
+
+    def __init__(self, score, depth, bound, move):
+        self.score = score
+        self.depth = depth
+        self.bound = bound
+        self.move = move
+
+
+class TranspositionTable:
+    """
+    Bounded hash table mapping Zobrist keys to search results (score, depth, bound type and best move).
+    """
+
+    def __init__(self, megabytes=16):
+        """
+        Allocates the table. The number of buckets is the largest power of two fitting into the memory budget.
+
+        :param megabytes: Memory budget for the table
+        """
+        buckets = _buckets(megabytes, ENTRY_SIZE)
+        self.bucket_mask = buckets - 1
+        self.size = buckets * 2
+        self.keys = array("Q", bytes(8 * self.size))
+        self.scores = array("d", bytes(8 * self.size))
+        self.data = array("I", bytes(4 * self.size))
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Resets the hit, miss, collision and overwrite counters
+        """
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.overwrites = 0
+
+    def clear(self):
+        """
+        Removes all entries from the table and resets the counters
+        """
+        self.keys = array("Q", bytes(8 * self.size))
+        self.scores = array("d", bytes(8 * self.size))
+        self.data = array("I", bytes(4 * self.size))
+        self.reset_stats()
+
+    def stats(self):
+        """
+        Returns the counters as a dictionary, including the hit rate of all probes
+        """
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "overwrites": self.overwrites,
+            "hit_rate": self.hits / probes if probes else 0.0,
+        }
+
+    def probe(self, key):
+        """
+        Looks up the given key.
+
+        :param key: Zobrist key of the position (see :py:meth:`board.BoardBase.hash`)
+        :return: A :py:class:`TranspositionEntry` or None if the position is not stored
+        """
+        index = (key & self.bucket_mask) * 2
+        collision = False
+
+        for slot in (index, index + 1):
+            data = self.data[slot]
+            if not data & _USED:
+                continue
+
+            if self.keys[slot] == key:
+                self.hits += 1
+                return _unpack(self.scores[slot], data)
+
+            collision = True
+
+        self.misses += 1
+        if collision:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, bound=EXACT, move=None):
+        """
+        Stores a search result.
+
+        :param key: Zobrist key of the position
+        :param depth: Remaining search depth the score was calculated with
+        :param score: The score, always from WHITEs perspective
+        :param bound: EXACT, LOWER or UPPER
+        :param move: Best move as (from_square, to_square) tuple or None
+        """
+        index = (key & self.bucket_mask) * 2
+        data = _pack(depth, bound, move)
+
+        # The depth-preferred entry takes the result if it is empty, the same position or not deeper
+        slot = index
+        stored = self.data[slot]
+        if stored & _USED and self.keys[slot] != key and (stored >> _DEPTH_BITS) > depth:
+            # Otherwise it goes into the always-replace entry
+            slot = index + 1
+            stored = self.data[slot]
+
+        if stored & _USED and self.keys[slot] != key:
+            self.overwrites += 1
+
+        self.keys[slot] = key
+        self.scores[slot] = score
+        self.data[slot] = data
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    Transposition table in a :py:mod:`multiprocessing.shared_memory` block, shared by all processes attached to it.
+
+    Every entry consists of three 64 bit words: the key XOR the score bits XOR the data, the score bits and the data.
+    There are no locks. Two processes writing the same entry at the same time may leave a mix of both writes behind,
+    but then the key no longer matches the XOR of the three words, so the entry is simply not found. The counters
+    (see :py:meth:`stats`) are kept per process.
+
+    One process creates the table and finally calls :py:meth:`unlink`. All others attach to it by its :py:attr:`name`,
+    they should be started by :py:mod:`multiprocessing` from the creating process, so they share its resource tracker.
+    """
+
+    def __init__(self, megabytes=16, name=None):
+        """
+        Creates a new shared table, or attaches to an existing one
+
+        :param megabytes: Memory budget for the table, must be the same for all processes
+        :param name: Name of an existing table to attach to, None to create a new one
+        """
+        buckets = _buckets(megabytes, SHARED_ENTRY_SIZE)
+        self.bucket_mask = buckets - 1
+        self.size = buckets * 2
+
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=self.size * SHARED_ENTRY_SIZE)
+            self.memory.buf[:] = bytes(self.size * SHARED_ENTRY_SIZE)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+
+        self.name = self.memory.name
+        self.words = self.memory.buf.cast("Q")
+        self.reset_stats()
+
+    def clear(self):
+        """
+        Removes all entries from the table (for all processes) and resets the counters
+        """
+        self.memory.buf[:] = bytes(self.size * SHARED_ENTRY_SIZE)
+        self.reset_stats()
+
+    def close(self):
+        """
+        Detaches this process from the table
+        """
+        self.words.release()
+        self.memory.close()
+
+    def unlink(self):
+        """
+        Frees the shared memory block, to be called once by the creating process after all others are done
+        """
+        self.memory.unlink()
+
+    def probe(self, key):
+        """
+        Looks up the given key, see :py:meth:`TranspositionTable.probe`
+        """
+        words = self.words
+        index = (key & self.bucket_mask) * 2
+        collision = False
+
+        for slot in (index, index + 1):
+            base = slot * 3
+            check, bits, data = words[base], words[base + 1], words[base + 2]
+            if not data & _USED:
+                continue
+
+            if check ^ bits ^ data == key:
+                self.hits += 1
+                return _unpack(_bits_to_float(bits), data)
+
+            collision = True
+
+        self.misses += 1
+        if collision:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, score, bound=EXACT, move=None):
+        """
+        Stores a search result, see :py:meth:`TranspositionTable.store`
+        """
+        words = self.words
+        index = (key & self.bucket_mask) * 2
+        data = _pack(depth, bound, move)
+
+        # Same replacement scheme as the private table, the stored key is recovered from the three words
+        slot = index
+        base = slot * 3
+        stored = words[base + 2]
+        storedKey = words[base] ^ words[base + 1] ^ stored
+        if stored & _USED and storedKey != key and (stored >> _DEPTH_BITS) > depth:
+            slot = index + 1
+            base = slot * 3
+            stored = words[base + 2]
+            storedKey = words[base] ^ words[base + 1] ^ stored
+
+        if stored & _USED and storedKey != key:
+            self.overwrites += 1
+
+        # The check word goes last, so a reader never takes a half written entry for a complete one
+        bits = _float_to_bits(score)
+        words[base + 1] = bits
+        words[base + 2] = data
+        words[base] = key ^ bits ^ data
+
+
+_DOUBLE = struct.Struct("<d")
+_WORD = struct.Struct("<Q")
+
+
+def _float_to_bits(value):
+    return _WORD.unpack(_DOUBLE.pack(value))[0]
+
+
+def _bits_to_float(bits):
+    return _DOUBLE.unpack(_WORD.pack(bits))[0]
+
+
+def _buckets(megabytes, entrySize):
+    # The largest power of two of buckets (with two entries each) fitting into the memory budget
+    buckets = 1
+    while buckets * 4 * entrySize <= megabytes * 1024 * 1024:
+        buckets *= 2
+    return buckets
+
+
+def _pack(depth, bound, move):
+    data = _USED | (bound << _BOUND_BITS) | (max(depth, 0) << _DEPTH_BITS)
+    if move is not None:
+        from_square, to_square = move
+        data |= _HAS_MOVE | (from_square << _FROM_BITS) | (to_square << _TO_BITS)
+    return data
+
+
+def _unpack(score, data):
+    move = None
+    if data & _HAS_MOVE:
+        move = ((data >> _FROM_BITS) & 63, (data >> _TO_BITS) & 63)
+    return TranspositionEntry(score, data >> _DEPTH_BITS, (data >> _BOUND_BITS) & 3, move)
@@ -0,0 +1,251 @@
+"""
+Headless engine speaking a UCI-like text protocol on stdin/stdout, e.g. for batch analysis on servers.
+Only the engine and the board are imported, never the pygame UI.
+
+Supported commands::
+
+    uci                                         -> id name ... / uciok
+    isready                                     -> readyok
+    ucinewgame                                  clears the transposition table
+    position startpos [moves e2e4 e7e5 ...]
+    position fen <placement> [w|b] [moves ...]  see BoardBase.to_fen, further FEN fields are ignored
+    position board <row 8>/<row 7>/.../<row 1> [w|b] [moves ...]
+                                                rows as 8 characters like "rnbqkbnr", "." for an empty cell
+    go [depth N] [movetime MS] [nodes N] [infinite]
+                                                -> info depth ... / bestmove e2e4
+    stop                                        plays the best move found so far
+    quit
+
+Moves are written as the cell moved from and the cell moved to, like "e2e4". While a search runs, ``info`` lines
+report every completed iteration. Scores are given in centipawns from the view of the side to move. Scores of a
+lost king or of a position without moves are given as ``mate N`` instead, see :py:func:`format_score`.
+Commands changing the position or starting a search wait for the running search to finish (send ``stop`` to end it
+early), so a whole batch of positions can be piped in at once.
+
+Usage::
+
+    python uci.py
+    printf "position startpos moves e2e4\\ngo depth 4\\n" | python uci.py
+"""
+import sys
+import threading
+import engine
+from bitboard import square_to_cell
+from board import Board
+from engine import BackgroundSearch
+from util import cell_to_string, string_to_cell
+
+NAME = "DAISY-Projekt-Schach"
+
+# Scores (in pawns) from this size on mean a lost king or no moves left, see engine.minMax
+MATE_SCORE = 5e5
+
+
+class UciEngine:
+    """
+    State of the protocol: the current position, the side to move and the running search, if any
+    """
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.lock = threading.Lock()
+        self.board = Board()
+        self.board.reset()
+        self.white = True
+        self.background = None
+
+    def send(self, line):
+        # Called from the reading thread as well as from the search thread
+        with self.lock:
+            print(line, file=self.out, flush=True)
+
+    def handle(self, line):
+        """
+        Executes one command line
+
+        :return: False after the quit command, True otherwise
+        """
+        words = line.split()
+        if not words:
+            return True
+
+        command, arguments = words[0], words[1:]
+        if command == "quit":
+            self.cancel()
+            return False
+
+        handler = getattr(self, "command_" + command, None)
+        if handler is None:
+            self.send(f"info string unknown command {command}")
+            return True
+
+        try:
+            handler(arguments)
+        except ValueError as error:
+            self.send(f"info string {error}")
+
+        return True
+
+    def command_uci(self, arguments):
+        self.send(f"id name {NAME}")
+        self.send("uciok")
+
+    def command_isready(self, arguments):
+        self.send("readyok")
+
+    def command_ucinewgame(self, arguments):
+        self.wait()
+        engine.transposition_table.clear()
+
+    def command_position(self, arguments):
+        self.wait()
+
+        if "moves" in arguments:
+            index = arguments.index("moves")
+            arguments, moves = arguments[:index], arguments[index + 1:]
+        else:
+            moves = []
+
+        board = Board()
+        white = True
+        if arguments[:1] == ["startpos"]:
+            board.reset()
+        elif arguments[:1] == ["fen"] and len(arguments) >= 2:
+            white = board.load_fen(" ".join(arguments[1:]))
+        elif arguments[:1] == ["board"] and len(arguments) in (2, 3):
+            board.load_from_memory(parse_rows(arguments[1]))
+            if len(arguments) == 3:
+                if arguments[2] not in ("w", "b"):
+                    raise ValueError(f"invalid side to move {arguments[2]}")
+                white = arguments[2] == "w"
+        else:
+            raise ValueError("expected position startpos, position fen <fen> or position board <rows> [w|b]")
+
+        for text in moves:
+            piece, cell = parse_move(board, text, white)
+            board.set_cell(cell, piece)
+            white = not white
+
+        self.board = board
+        self.white = white
+
+    def command_go(self, arguments):
+        self.wait()
+
+        options = {}
+        words = iter(arguments)
+        for word in words:
+            if word == "infinite":
+                options["maxDepth"] = engine.MAX_PLY
+                options["timeLimit"] = None
+            elif word in ("depth", "movetime", "nodes"):
+                value = next(words, None)
+                if value is None or not value.isdigit() or int(value) <= 0:
+                    raise ValueError(f"go {word} expects a positive number")
+                if word == "depth":
+                    options["maxDepth"] = int(value)
+                    options.setdefault("timeLimit", None)
+                elif word == "movetime":
+                    options["timeLimit"] = int(value) / 1000
+                    options.setdefault("maxDepth", engine.MAX_PLY)
+                else:
+                    options["nodeLimit"] = int(value)
+                    options.setdefault("maxDepth", engine.MAX_PLY)
+                    options.setdefault("timeLimit", None)
+            else:
+                raise ValueError(f"unknown go option {word}")
+
+        self.background = BackgroundSearch(self.board, self.white, callback=self.send_info, **options)
+        self.background.add_done_callback(self.send_bestmove)
+
+    def command_stop(self, arguments):
+        if self.background is not None:
+            self.background.hurry()
+
+    def send_info(self, depth, squares, score, text, search):
+        elapsed = search.elapsed()
+        nodesPerSecond = int(search.nodes / elapsed) if elapsed > 0 else 0
+        pv = f" pv {squares_to_string(squares)}" if squares is not None else ""
+        self.send(f"info depth {depth} score {format_score(score, self.white, depth)} nodes {search.nodes} nps {nodesPerSecond} "
+                  f"time {int(elapsed * 1000)}{pv}")
+
+    def send_bestmove(self, background):
+        if background.cancelled():
+            return
+        move, _ = background.result()
+        self.send(f"bestmove {move_to_string(move) if move.piece is not None else '0000'}")
+
+    def cancel(self):
+        """
+        Cancels the running search without reporting a best move
+        """
+        if self.background is not None:
+            self.background.cancel()
+            self.background = None
+
+    def wait(self):
+        """
+        Waits for the running search, if any
+        """
+        if self.background is not None:
+            # Joined rather than waiting for the result, so the bestmove line (sent from the thread) is out as well
+            self.background.thread.join()
+
+
+def parse_rows(text):
+    """
+    Turns "rnbqkbnr/pppppppp/..." (row 8 first) into the configuration string of
+    :py:meth:`load_from_memory <board.BoardBase.load_from_memory>`
+    """
+    rows = text.split("/")
+    if len(rows) != 8 or any(len(row) != 8 or any(c not in ".pnbrqkPNBRQK" for c in row) for row in rows):
+        raise ValueError(f"invalid board {text}")
+    return "\n".join(" ".join(row) for row in rows)
+
+
+def parse_move(board, text, white):
+    """
+    Turns a move like "e2e4" into the piece to move and its target cell. Raises ValueError for invalid moves.
+    """
+    fromCell, toCell = string_to_cell(text[:2]), string_to_cell(text[2:])
+    piece = board.get_cell(fromCell)
+    if piece is None or piece.white != white or toCell not in piece.get_valid_cells():
+        raise ValueError(f"illegal move {text}")
+    return piece, toCell
+
+
+def move_to_string(move):
+    return cell_to_string(move.piece.cell) + cell_to_string(move.cell)
+
+
+def format_score(score, white, depth):
+    """
+    Turns a score in pawns from WHITEs view into "cp N" from the view of the side to move, or into "mate N" for a
+    lost king or no moves left. The search does not know in how many moves that happens, so N is the most
+    the search depth allows, negative if the side to move is mated.
+    """
+    if not white:
+        score = -score
+    if score >= MATE_SCORE:
+        return f"mate {(depth + 1) // 2}"
+    if score <= -MATE_SCORE:
+        return f"mate {-(depth // 2)}"
+    return f"cp {round(score * 100)}"
+
+
+def squares_to_string(squares):
+    return cell_to_string(square_to_cell(squares[0])) + cell_to_string(square_to_cell(squares[1]))
+
+
+def main(input=sys.stdin, out=sys.stdout):
+    uci = UciEngine(out)
+    for line in input:
+        if not uci.handle(line):
+            return 0
+
+    # End of input: finish the last search, so piped commands get their result
+    uci.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
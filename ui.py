@@ -1,7 +1,13 @@
 import pygame
 import numpy as np
 from pieces import Piece, Pawn, Rook, Bishop, Queen, King, Knight
-from engine import suggest_move, suggest_random_move
+from engine import BackgroundSearch, suggest_random_move
+
+
+CAPTION = "Hello Pygame"
+
+# Frames per second of the game loop, limited so the search thread gets most of the processor time
+FPS = 30
 
 
 class UIState:
@@ -159,6 +165,22 @@ def get_cell_under_mouse(uiState):
     return uiState
 
 
+def show_search_progress(background):
+    """
+    Shows depth, best move and speed of a running :py:class:`engine.BackgroundSearch` in the window title
+    """
+    if background.progress is None:
+        pygame.display.set_caption(f"{CAPTION} - searching...")
+        return
+
+    depth, _, _, text, search = background.progress
+    elapsed = search.elapsed()
+    nodesPerSecond = search.nodes / elapsed if elapsed > 0 else 0.0
+    pygame.display.set_caption(
+        f"{CAPTION} - depth {depth}, best {text}, {nodesPerSecond:.0f} nodes/s (SPACE: play now, ESC: cancel)"
+    )
+
+
 def run_game(board, manual=False):
     # Initialize Pygame
     pygame.init()
@@ -168,18 +190,32 @@ def run_game(board, manual=False):
 
     sprites = load_sprites()
 
-    pygame.display.set_caption("Hello Pygame")
+    pygame.display.set_caption(CAPTION)
 
     # Game loop
     running = True
+    clock = pygame.time.Clock()
     uiState = UIState()
 
     nextMove = None
     whitesTurn = True
 
+    # The engine searches in a worker thread, so the window keeps repainting and responding meanwhile.
+    # SPACE makes the engine play the best move found so far, ESCAPE cancels the search and hands its color to the player
+    background = None
+
     while running:
-        if nextMove is None and not manual:
-            nextMove = suggest_move(board)
+        if nextMove is None and not manual and background is None:
+            background = BackgroundSearch(board)
+
+        if background is not None:
+            show_search_progress(background)
+
+        if background is not None and background.done():
+            nextMove, search = background.result()
+            background = None
+            pygame.display.set_caption(CAPTION)
+            print(f"Searched depth {search.depth} in {search.elapsed():.1f}s ({search.nodes} nodes)")
             # nextMove = suggest_random_move(board)
             print("Next Move is ", nextMove)
             board.set_cell(nextMove.cell, nextMove.piece)
@@ -191,6 +227,22 @@ def run_game(board, manual=False):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+                if background is not None:
+                    background.cancel()
+
+            if event.type == pygame.KEYDOWN and background is not None:
+                if event.key == pygame.K_SPACE:
+                    background.hurry()
+                elif event.key == pygame.K_ESCAPE:
+                    background.cancel()
+                    background = None
+                    manual = True
+                    pygame.display.set_caption(CAPTION)
+                    print("Search cancelled, the engine's moves are played manually from now on")
+
+            # The board belongs to the engine while it is searching
+            if background is not None:
+                continue
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 piece = board.get_cell(uiState.mouse_over_cell)
@@ -226,6 +278,7 @@ def run_game(board, manual=False):
 
         # Flip the display
         pygame.display.flip()
+        clock.tick(FPS)
 
     # Quit Pygame
     pygame.quit()
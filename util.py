@@ -49,6 +49,15 @@ def cell_to_string(cell):
     return files[cell[1]] + str(cell[0] + 1)
 
 
+def string_to_cell(text):
+    """
+    Inverse of :py:func:`cell_to_string`, turns e.g. "e2" into the cell (1, 4). Raises ValueError for invalid input.
+    """
+    if len(text) != 2 or text[0] not in "abcdefgh" or text[1] not in "12345678":
+        raise ValueError(f"invalid cell {text!r}")
+    return (int(text[1]) - 1, "abcdefgh".index(text[0]))
+
+
 class InvalidRowException(Exception):
     def __init__(self, cell):
         self.cell = cell
@@ -57,3 +66,10 @@ class InvalidRowException(Exception):
 class InvalidColumnException(Exception):
     def __init__(self, cell):
         self.cell = cell
+
+
+class MoveGenerationException(Exception):
+    def __init__(self, piece, expected, actual):
+        self.piece = piece
+        self.expected = expected
+        self.actual = actual
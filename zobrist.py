@@ -0,0 +1,19 @@
+"""
+Zobrist keys for hashing board configurations.
+
+Every combination of color, piece kind and square gets a random 64 bit number. The hash of a board
+configuration is the XOR of the numbers of all placed pieces, so placing or removing a single piece
+updates the hash with one XOR. A fixed seed keeps hashes identical across runs and processes.
+"""
+import random
+
+_random = random.Random(0x5C4AC4)
+
+# PIECE_KEYS[white][kind][square]
+PIECE_KEYS = [
+    [[_random.getrandbits(64) for _ in range(64)] for _ in range(6)]
+    for _ in range(2)
+]
+
+# Mixed into the hash if WHITE is to move
+WHITE_TO_MOVE_KEY = _random.getrandbits(64)